@@ -0,0 +1,346 @@
+"""
+Minimal tag readers for ingest fallback metadata:
+- ID3v2.2/2.3/2.4 (MP3, ADTS AAC)
+- Vorbis comments (FLAC metadata blocks, Ogg Vorbis/Opus comment headers)
+- MP4 ilst atoms (M4A/MP4)
+
+Only the header region of the object is read. read_tags() takes the first bytes of
+the file plus a read_range(start, end_inclusive) callback for anything past them
+(e.g. an S3 ranged GET), so large files are never downloaded.
+"""
+import base64
+import re
+import struct
+
+MAX_TAG_BYTES = 8 * 1024 * 1024  # refuse to fetch tag regions larger than this
+
+# ID3 frame id -> field (v2.3/2.4 and v2.2 ids)
+_ID3_TEXT_FRAMES = {
+    "TIT2": "title", "TT2": "title",
+    "TPE1": "artist", "TP1": "artist",
+    "TPE2": "album_artist", "TP2": "album_artist",
+    "TALB": "album", "TAL": "album",
+    "TRCK": "track_number", "TRK": "track_number",
+    "TDRC": "release_year", "TYER": "release_year", "TYE": "release_year",
+}
+
+_VORBIS_FIELDS = {
+    "TITLE": "title",
+    "ARTIST": "artist",
+    "ALBUMARTIST": "album_artist",
+    "ALBUM": "album",
+    "TRACKNUMBER": "track_number",
+    "DATE": "release_year",
+    "YEAR": "release_year",
+}
+
+_MP4_FIELDS = {
+    b"\xa9nam": "title",
+    b"\xa9ART": "artist",
+    b"aART": "album_artist",
+    b"\xa9alb": "album",
+    b"\xa9day": "release_year",
+}
+
+
+def read_tags(head: bytes, size: int, read_range) -> dict:
+    """
+    Returns a subset of {title, artist, album, track_number, release_year, picture}
+    where picture is {"mime": str, "data": bytes}. Unknown formats or broken tags -> {}.
+    """
+    try:
+        if head[:3] == b"ID3":
+            raw = _read_id3(head, size, read_range)
+        elif head[:4] == b"fLaC":
+            raw = _read_flac(head, size, read_range)
+        elif head[:4] == b"OggS":
+            raw = _read_ogg(head, size, read_range)
+        elif head[4:8] == b"ftyp":
+            raw = _read_mp4(head, size, read_range)
+        else:
+            return {}
+    except (ValueError, IndexError, struct.error, UnicodeDecodeError) as e:
+        print("Tag parse error:", str(e))
+        return {}
+    return _normalize(raw)
+
+
+def _normalize(raw: dict) -> dict:
+    tags = {}
+    for field in ("title", "artist", "album"):
+        value = (raw.get(field) or "").strip()
+        if value:
+            tags[field] = value
+    if "artist" not in tags and (raw.get("album_artist") or "").strip():
+        tags["artist"] = raw["album_artist"].strip()
+
+    m = re.match(r"\s*(\d+)", str(raw.get("track_number") or ""))
+    if m and int(m.group(1)) > 0:
+        tags["track_number"] = int(m.group(1))
+    m = re.match(r"\s*(\d{4})", str(raw.get("release_year") or ""))
+    if m:
+        tags["release_year"] = int(m.group(1))
+
+    if raw.get("picture") and raw["picture"].get("data"):
+        tags["picture"] = raw["picture"]
+    return tags
+
+
+def _ensure(head: bytes, end: int, size: int, read_range) -> bytes:
+    """head extended (via read_range) to cover bytes [0, end)."""
+    end = min(end, size)
+    if end > MAX_TAG_BYTES:
+        raise ValueError(f"Tag region too large ({end} bytes)")
+    if len(head) < end:
+        head += read_range(len(head), end - 1)
+    return head
+
+
+# -----------------------------
+# ID3v2
+# -----------------------------
+def _syncsafe(b: bytes) -> int:
+    return (b[0] << 21) | (b[1] << 14) | (b[2] << 7) | b[3]
+
+
+def _unsync(b: bytes) -> bytes:
+    return b.replace(b"\xff\x00", b"\xff")
+
+
+def _id3_text(enc: int, b: bytes) -> str:
+    if enc == 0:
+        s = b.decode("latin-1")
+    elif enc == 1:
+        s = b.decode("utf-16")
+    elif enc == 2:
+        s = b.decode("utf-16-be")
+    else:
+        s = b.decode("utf-8")
+    # v2.4 allows several null-separated values; the first is enough here
+    return s.split("\x00")[0]
+
+
+def _id3_split_terminated(enc: int, b: bytes):
+    """Splits an encoded null-terminated string off the front of b -> (str_bytes, rest)."""
+    if enc in (1, 2):
+        i = 0
+        while i + 1 < len(b):
+            if b[i] == 0 and b[i + 1] == 0:
+                return b[:i], b[i + 2:]
+            i += 2
+        return b, b""
+    i = b.find(b"\x00")
+    return (b, b"") if i < 0 else (b[:i], b[i + 1:])
+
+
+def _read_id3(head: bytes, size: int, read_range) -> dict:
+    major, flags = head[3], head[5]
+    tag_end = 10 + _syncsafe(head[6:10])
+    head = _ensure(head, tag_end, size, read_range)
+    body = head[10:tag_end]
+
+    if flags & 0x80 and major < 4:
+        body = _unsync(body)
+    pos = 0
+    if flags & 0x40 and major >= 3:
+        # Extended header: v2.4 size is syncsafe and includes itself; v2.3 excludes its 4 size bytes
+        pos = _syncsafe(body[:4]) if major == 4 else struct.unpack(">I", body[:4])[0] + 4
+
+    raw = {}
+    pictures = []
+    id_len, hdr_len = (3, 6) if major == 2 else (4, 10)
+    while pos + hdr_len <= len(body):
+        frame_id = body[pos:pos + id_len]
+        if not frame_id.strip(b"\x00"):
+            break  # padding
+        if major == 2:
+            frame_size = int.from_bytes(body[pos + 3:pos + 6], "big")
+            frame_flags = 0
+        elif major == 4:
+            frame_size = _syncsafe(body[pos + 4:pos + 8])
+            frame_flags = body[pos + 9]
+        else:
+            frame_size = struct.unpack(">I", body[pos + 4:pos + 8])[0]
+            frame_flags = 0
+        data = body[pos + hdr_len:pos + hdr_len + frame_size]
+        pos += hdr_len + frame_size
+        if major == 4 and frame_flags & 0x02:
+            data = _unsync(data)
+        if not data:
+            continue
+
+        fid = frame_id.decode("latin-1")
+        if fid in _ID3_TEXT_FRAMES:
+            raw.setdefault(_ID3_TEXT_FRAMES[fid], _id3_text(data[0], data[1:]))
+        elif fid == "APIC":
+            enc = data[0]
+            mime, rest = _id3_split_terminated(0, data[1:])
+            pic_type = rest[0]
+            _, img = _id3_split_terminated(enc, rest[1:])
+            pictures.append((pic_type, mime.decode("latin-1") or "image/jpeg", img))
+        elif fid == "PIC":
+            enc, fmt, pic_type = data[0], data[1:4].decode("latin-1").lower(), data[4]
+            _, img = _id3_split_terminated(enc, data[5:])
+            pictures.append((pic_type, "image/png" if fmt == "png" else "image/jpeg", img))
+
+    if pictures:
+        # Prefer the front cover (type 3)
+        pic_type, mime, img = sorted(pictures, key=lambda p: p[0] != 3)[0]
+        raw["picture"] = {"mime": mime, "data": img}
+    return raw
+
+
+# -----------------------------
+# Vorbis comments (FLAC / Ogg)
+# -----------------------------
+def _parse_vorbis_comment(b: bytes) -> dict:
+    raw = {}
+    vendor_len = struct.unpack("<I", b[:4])[0]
+    pos = 4 + vendor_len
+    count = struct.unpack("<I", b[pos:pos + 4])[0]
+    pos += 4
+    for _ in range(count):
+        n = struct.unpack("<I", b[pos:pos + 4])[0]
+        entry = b[pos + 4:pos + 4 + n].decode("utf-8", errors="replace")
+        pos += 4 + n
+        key, _, value = entry.partition("=")
+        key = key.upper()
+        if key in _VORBIS_FIELDS:
+            raw.setdefault(_VORBIS_FIELDS[key], value)
+        elif key == "METADATA_BLOCK_PICTURE" and "picture" not in raw:
+            raw["picture"] = _parse_flac_picture(base64.b64decode(value))
+    return raw
+
+
+def _parse_flac_picture(b: bytes) -> dict:
+    pos = 4  # picture type
+    mime_len = struct.unpack(">I", b[pos:pos + 4])[0]
+    mime = b[pos + 4:pos + 4 + mime_len].decode("latin-1")
+    pos += 4 + mime_len
+    desc_len = struct.unpack(">I", b[pos:pos + 4])[0]
+    pos += 4 + desc_len + 16  # width, height, depth, colors
+    data_len = struct.unpack(">I", b[pos:pos + 4])[0]
+    return {"mime": mime or "image/jpeg", "data": b[pos + 4:pos + 4 + data_len]}
+
+
+def _read_flac(head: bytes, size: int, read_range) -> dict:
+    raw = {}
+    pos = 4
+    while True:
+        head = _ensure(head, pos + 4, size, read_range)
+        block_type, is_last = head[pos] & 0x7F, head[pos] & 0x80
+        length = int.from_bytes(head[pos + 1:pos + 4], "big")
+        if block_type in (4, 6):
+            head = _ensure(head, pos + 4 + length, size, read_range)
+            block = head[pos + 4:pos + 4 + length]
+            if block_type == 4:
+                picture = raw.get("picture")
+                raw.update(_parse_vorbis_comment(block))
+                if picture:
+                    raw["picture"] = picture
+            elif "picture" not in raw or struct.unpack(">I", block[:4])[0] == 3:
+                raw["picture"] = _parse_flac_picture(block)
+        pos += 4 + length
+        if is_last:
+            return raw
+
+
+def _read_ogg(head: bytes, size: int, read_range) -> dict:
+    """Reassembles the second logical packet (comment header) from the first Ogg pages."""
+    packets = [b""]
+    pos = 0
+    while len(packets) < 3:
+        head = _ensure(head, pos + 27, size, read_range)
+        if head[pos:pos + 4] != b"OggS":
+            raise ValueError("Bad Ogg page")
+        nsegs = head[pos + 26]
+        head = _ensure(head, pos + 27 + nsegs, size, read_range)
+        lacing = head[pos + 27:pos + 27 + nsegs]
+        data_pos = pos + 27 + nsegs
+        head = _ensure(head, data_pos + sum(lacing), size, read_range)
+        for seg in lacing:
+            packets[-1] += head[data_pos:data_pos + seg]
+            data_pos += seg
+            if seg < 255:
+                packets.append(b"")
+        pos = data_pos
+        if pos >= size:
+            break
+
+    comment = packets[1] if len(packets) > 1 else b""
+    if comment.startswith(b"\x03vorbis"):
+        return _parse_vorbis_comment(comment[7:])
+    if comment.startswith(b"OpusTags"):
+        return _parse_vorbis_comment(comment[8:])
+    return {}
+
+
+# -----------------------------
+# MP4 (moov/udta/meta/ilst)
+# -----------------------------
+def _atoms(b: bytes, start: int, end: int):
+    pos = start
+    while pos + 8 <= end:
+        atom_size, atom_type = struct.unpack(">I4s", b[pos:pos + 8])
+        hdr = 8
+        if atom_size == 1:
+            atom_size = struct.unpack(">Q", b[pos + 8:pos + 16])[0]
+            hdr = 16
+        elif atom_size == 0:
+            atom_size = end - pos
+        if atom_size < hdr:
+            raise ValueError("Bad MP4 atom size")
+        yield atom_type, pos + hdr, min(pos + atom_size, end)
+        pos += atom_size
+
+
+def _child(b: bytes, start: int, end: int, atom_type: bytes):
+    for t, s, e in _atoms(b, start, end):
+        if t == atom_type:
+            return s, e
+    return None
+
+
+def _read_mp4(head: bytes, size: int, read_range) -> dict:
+    # Walk top-level atoms with small header reads until moov (it may sit after mdat)
+    pos = 0
+    moov = None
+    while pos + 8 <= size:
+        hdr = head[pos:pos + 16] if pos + 16 <= len(head) else read_range(pos, min(pos + 15, size - 1))
+        atom_size, atom_type = struct.unpack(">I4s", hdr[:8])
+        if atom_size == 1:
+            atom_size = struct.unpack(">Q", hdr[8:16])[0]
+        elif atom_size == 0:
+            atom_size = size - pos
+        if atom_size < 8:
+            raise ValueError("Bad MP4 atom size")
+        if atom_type == b"moov":
+            if atom_size > MAX_TAG_BYTES:
+                raise ValueError("moov too large")
+            moov = head[pos:pos + atom_size] if pos + atom_size <= len(head) else read_range(pos, pos + atom_size - 1)
+            break
+        pos += atom_size
+    if moov is None:
+        return {}
+
+    udta = _child(moov, 8, len(moov), b"udta")
+    meta = udta and _child(moov, udta[0], udta[1], b"meta")
+    # meta is a full atom: 4 bytes of version/flags before its children
+    ilst = meta and _child(moov, meta[0] + 4, meta[1], b"ilst")
+    if not ilst:
+        return {}
+
+    raw = {}
+    for item_type, s, e in _atoms(moov, ilst[0], ilst[1]):
+        data = _child(moov, s, e, b"data")
+        if not data:
+            continue
+        value_type = struct.unpack(">I", moov[data[0]:data[0] + 4])[0] & 0xFFFFFF
+        payload = moov[data[0] + 8:data[1]]
+        if item_type in _MP4_FIELDS:
+            raw.setdefault(_MP4_FIELDS[item_type], payload.decode("utf-8", errors="replace"))
+        elif item_type == b"trkn" and len(payload) >= 4:
+            raw["track_number"] = struct.unpack(">H", payload[2:4])[0]
+        elif item_type == b"covr" and "picture" not in raw:
+            raw["picture"] = {"mime": "image/png" if value_type == 14 else "image/jpeg", "data": payload}
+    return raw
@@ -0,0 +1,420 @@
+"""
+In-process stand-ins for the boto3 S3 client and DynamoDB Table the ingest module uses.
+
+- FakeS3 keeps objects as files under a store directory (outside /tmp, so /tmp usage
+  measures ingest only) and times every GET/PUT-side call.
+- FakeDynamo implements get/put/update/delete_item including the condition and update
+  expressions ingest relies on, and rejects floats like boto3 does.
+"""
+import copy
+import hashlib
+import os
+import re
+import shutil
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+
+class Timers:
+    """Thread-safe busy-time counters (seconds). Overlapping calls add up."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.seconds = {}
+        self.bytes = {}
+
+    def add(self, name: str, seconds: float, nbytes: int = 0):
+        with self._lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+            self.bytes[name] = self.bytes.get(name, 0) + nbytes
+
+
+def _client_error(code: str, op: str) -> ClientError:
+    return ClientError({"Error": {"Code": code, "Message": code}}, op)
+
+
+# -----------------------------
+# S3
+# -----------------------------
+class _Body:
+    def __init__(self, path: str, start: int, end: int, timers: Timers):
+        self._f = open(path, "rb")
+        self._f.seek(start)
+        self._left = end - start + 1
+        self._timers = timers
+
+    def read(self, n: int = -1) -> bytes:
+        started = time.perf_counter()
+        n = self._left if n is None or n < 0 else min(n, self._left)
+        data = self._f.read(n)
+        self._left -= len(data)
+        self._timers.add("s3_get", time.perf_counter() - started, len(data))
+        return data
+
+    def iter_chunks(self, chunk_size: int = 1024 * 1024):
+        while True:
+            data = self.read(chunk_size)
+            if not data:
+                return
+            yield data
+
+    def close(self):
+        self._f.close()
+
+
+class FakeS3:
+    def __init__(self, buckets: dict, timers: Timers):
+        """buckets: {bucket_name: directory}"""
+        self._buckets = buckets
+        self._timers = timers
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    def _path(self, bucket: str, key: str) -> str:
+        return os.path.join(self._buckets[bucket], key)
+
+    def _existing(self, bucket: str, key: str, op: str) -> str:
+        path = self._path(bucket, key)
+        if not os.path.isfile(path):
+            raise _client_error("NoSuchKey" if op != "HeadObject" else "404", op)
+        return path
+
+    def _write(self, bucket: str, key: str, data: bytes):
+        started = time.perf_counter()
+        path = self._path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        self._timers.add("s3_put", time.perf_counter() - started, len(data))
+
+    @staticmethod
+    def _etag(path: str) -> str:
+        st = os.stat(path)
+        return '"' + hashlib.md5(f"{path}:{st.st_size}:{st.st_mtime_ns}".encode()).hexdigest() + '"'
+
+    # --- reads ---
+    def get_object(self, Bucket, Key, Range=None, **_):
+        path = self._existing(Bucket, Key, "GetObject")
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        resp = {"ETag": self._etag(path)}
+        if Range:
+            m = re.match(r"bytes=(\d+)-(\d*)", Range)
+            start = int(m.group(1))
+            end = min(int(m.group(2)) if m.group(2) else size - 1, size - 1)
+            resp["ContentRange"] = f"bytes {start}-{end}/{size}"
+        resp["ContentLength"] = max(0, end - start + 1)
+        resp["Body"] = _Body(path, start, end, self._timers)
+        return resp
+
+    def head_object(self, Bucket, Key, **_):
+        path = self._existing(Bucket, Key, "HeadObject")
+        return {"ContentLength": os.path.getsize(path), "ETag": self._etag(path)}
+
+    def download_file(self, bucket, key, filename, **_):
+        started = time.perf_counter()
+        shutil.copyfile(self._existing(bucket, key, "GetObject"), filename)
+        self._timers.add("s3_get", time.perf_counter() - started, os.path.getsize(filename))
+
+    def generate_presigned_url(self, method, Params, ExpiresIn=None, **_):
+        # ffmpeg/ffprobe read the object straight from the store
+        return self._path(Params["Bucket"], Params["Key"])
+
+    def list_objects_v2(self, Bucket, Prefix="", MaxKeys=1000, **_):
+        root = self._buckets[Bucket]
+        keys = []
+        for dirpath, _, files in os.walk(root):
+            for name in files:
+                key = os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, "/")
+                if key.startswith(Prefix):
+                    keys.append(key)
+        keys = sorted(keys)[:MaxKeys]
+        return {"Contents": [{"Key": k, "ETag": self._etag(self._path(Bucket, k))} for k in keys]}
+
+    # --- writes ---
+    def put_object(self, Bucket, Key, Body=b"", **_):
+        if hasattr(Body, "read"):
+            Body = Body.read()
+        if isinstance(Body, str):
+            Body = Body.encode("utf-8")
+        self._write(Bucket, Key, Body)
+        return {"ETag": self._etag(self._path(Bucket, Key))}
+
+    def upload_file(self, filename, bucket, key, ExtraArgs=None, **_):
+        started = time.perf_counter()
+        path = self._path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(filename, path)
+        self._timers.add("s3_put", time.perf_counter() - started, os.path.getsize(path))
+
+    def copy_object(self, CopySource, Bucket, Key, **_):
+        started = time.perf_counter()
+        src = self._existing(CopySource["Bucket"], CopySource["Key"], "CopyObject")
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(src, path)
+        self._timers.add("s3_put", time.perf_counter() - started)
+        return {"CopyObjectResult": {"ETag": self._etag(path)}}
+
+    def delete_objects(self, Bucket, Delete, **_):
+        for obj in Delete.get("Objects", []):
+            try:
+                os.remove(self._path(Bucket, obj["Key"]))
+            except FileNotFoundError:
+                pass
+        return {}
+
+    # --- multipart ---
+    def create_multipart_upload(self, Bucket, Key, **_):
+        with self._lock:
+            upload_id = f"upload-{len(self._uploads) + 1}"
+            self._uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **_):
+        started = time.perf_counter()
+        data = Body.read() if hasattr(Body, "read") else Body
+        with self._lock:
+            self._uploads[UploadId][PartNumber] = data
+        self._timers.add("s3_put", time.perf_counter() - started, len(data))
+        return {"ETag": f'"{UploadId}-{PartNumber}"'}
+
+    def upload_part_copy(self, Bucket, Key, UploadId, PartNumber, CopySource, **_):
+        with open(self._existing(CopySource["Bucket"], CopySource["Key"], "UploadPartCopy"), "rb") as f:
+            data = f.read()
+        with self._lock:
+            self._uploads[UploadId][PartNumber] = data
+        return {"CopyPartResult": {"ETag": f'"{UploadId}-{PartNumber}"'}}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **_):
+        with self._lock:
+            parts = self._uploads.pop(UploadId)
+        self._write(Bucket, Key, b"".join(parts[p["PartNumber"]] for p in MultipartUpload["Parts"]))
+        return {}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **_):
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+        return {}
+
+
+# -----------------------------
+# DynamoDB
+# -----------------------------
+_TOKEN = re.compile(r"\s*(attribute_not_exists|attribute_exists|if_not_exists|AND|OR|NOT|<>|<=|>=|=|<|>|\(|\)|,|[#:]?[A-Za-z_][A-Za-z0-9_]*)")
+
+
+def _tokens(expr: str) -> list:
+    out, pos = [], 0
+    expr = expr.strip()
+    while pos < len(expr):
+        m = _TOKEN.match(expr, pos)
+        if not m:
+            raise ValueError(f"Unsupported expression near {expr[pos:]!r}")
+        out.append(m.group(1))
+        pos = m.end()
+    return out
+
+
+def _check_types(value):
+    if isinstance(value, float):
+        raise TypeError("Float types are not supported. Use Decimal types instead.")
+    if isinstance(value, dict):
+        for v in value.values():
+            _check_types(v)
+    elif isinstance(value, (list, tuple, set)):
+        for v in value:
+            _check_types(v)
+
+
+class _Condition:
+    """Recursive-descent evaluator: OR / AND / NOT / () / attribute_[not_]exists / comparisons."""
+
+    def __init__(self, expr: str, item: dict, names: dict, values: dict):
+        self.toks = _tokens(expr)
+        self.i = 0
+        self.item, self.names, self.values = item, names or {}, values or {}
+
+    def _peek(self):
+        return self.toks[self.i] if self.i < len(self.toks) else None
+
+    def _next(self):
+        tok = self.toks[self.i]
+        self.i += 1
+        return tok
+
+    def _name(self, tok: str) -> str:
+        return self.names[tok] if tok.startswith("#") else tok
+
+    def _operand(self, tok: str):
+        if tok.startswith(":"):
+            return True, self.values[tok]
+        name = self._name(tok)
+        return name in self.item, self.item.get(name)
+
+    def evaluate(self) -> bool:
+        result = self._or()
+        if self._peek() is not None:
+            raise ValueError(f"Trailing tokens: {self.toks[self.i:]}")
+        return result
+
+    def _or(self):
+        result = self._and()
+        while self._peek() == "OR":
+            self._next()
+            rhs = self._and()
+            result = result or rhs
+        return result
+
+    def _and(self):
+        result = self._factor()
+        while self._peek() == "AND":
+            self._next()
+            rhs = self._factor()
+            result = result and rhs
+        return result
+
+    def _factor(self):
+        tok = self._next()
+        if tok == "NOT":
+            return not self._factor()
+        if tok == "(":
+            result = self._or()
+            self._next()  # )
+            return result
+        if tok in ("attribute_exists", "attribute_not_exists"):
+            self._next()  # (
+            name = self._name(self._next())
+            self._next()  # )
+            return (name in self.item) == (tok == "attribute_exists")
+        op = self._next()
+        (lhs_ok, lhs), (rhs_ok, rhs) = self._operand(tok), self._operand(self._next())
+        if not (lhs_ok and rhs_ok):
+            return False
+        try:
+            return {
+                "=": lhs == rhs, "<>": lhs != rhs, "<": lhs < rhs,
+                "<=": lhs <= rhs, ">": lhs > rhs, ">=": lhs >= rhs,
+            }[op]
+        except TypeError:
+            return False
+
+
+def _split_top_level(s: str) -> list:
+    parts, depth, current = [], 0, ""
+    for ch in s:
+        if ch == "," and depth == 0:
+            parts.append(current.strip())
+            current = ""
+            continue
+        depth += ch == "("
+        depth -= ch == ")"
+        current += ch
+    if current.strip():
+        parts.append(current.strip())
+    return parts
+
+
+def _apply_update(item: dict, expr: str, names: dict, values: dict):
+    names, values = names or {}, values or {}
+
+    def name(tok):
+        return names[tok] if tok.startswith("#") else tok
+
+    for clause, body in re.findall(r"\b(SET|REMOVE|ADD)\b(.*?)(?=\bSET\b|\bREMOVE\b|\bADD\b|$)", expr, re.S):
+        for part in _split_top_level(body):
+            if clause == "REMOVE":
+                item.pop(name(part), None)
+                continue
+            if clause == "ADD":
+                target, value = part.split()
+                item[name(target)] = item.get(name(target), 0) + values[value]
+                continue
+            target, value = (p.strip() for p in part.split("=", 1))
+            m = re.match(r"if_not_exists\(\s*([#\w]+)\s*,\s*(:\w+)\s*\)", value)
+            if m:
+                existing = name(m.group(1))
+                item[name(target)] = item[existing] if existing in item else values[m.group(2)]
+            else:
+                item[name(target)] = values[value]
+
+
+class FakeTable:
+    def __init__(self, name: str, key_names: tuple, timers: Timers):
+        self.name = name
+        self._key_names = key_names
+        self._items = {}
+        self._lock = threading.Lock()
+        self._timers = timers
+
+    def _key(self, key: dict) -> tuple:
+        return tuple(key[k] for k in self._key_names)
+
+    def _timed(self, op: str, fn):
+        started = time.perf_counter()
+        try:
+            with self._lock:
+                return fn()
+        finally:
+            self._timers.add("ddb", time.perf_counter() - started)
+            self._timers.add(f"ddb_{op}", time.perf_counter() - started)
+
+    def _check(self, current: dict, condition, names, values, op: str):
+        if condition and not _Condition(condition, current or {}, names, values).evaluate():
+            raise _client_error("ConditionalCheckFailedException", op)
+
+    def get_item(self, Key, **_):
+        def _get():
+            item = self._items.get(self._key(Key))
+            return {"Item": copy.deepcopy(item)} if item is not None else {}
+        return self._timed("get_item", _get)
+
+    def put_item(self, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, ReturnValues=None, **_):
+        _check_types(Item)
+
+        def _put():
+            key = self._key(Item)
+            current = self._items.get(key)
+            self._check(current, ConditionExpression, ExpressionAttributeNames,
+                        ExpressionAttributeValues, "PutItem")
+            self._items[key] = copy.deepcopy(Item)
+            return {"Attributes": current} if ReturnValues == "ALL_OLD" and current else {}
+        return self._timed("put_item", _put)
+
+    def update_item(self, Key, UpdateExpression, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, ReturnValues=None, **_):
+        _check_types(ExpressionAttributeValues or {})
+
+        def _update():
+            key = self._key(Key)
+            current = self._items.get(key)
+            self._check(current, ConditionExpression, ExpressionAttributeNames,
+                        ExpressionAttributeValues, "UpdateItem")
+            item = copy.deepcopy(current) if current else dict(Key)
+            _apply_update(item, UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+            self._items[key] = item
+            # UPDATED_NEW returns the whole item too (callers only read what they updated)
+            return {"Attributes": copy.deepcopy(item)} if ReturnValues in ("ALL_NEW", "UPDATED_NEW") else {}
+        return self._timed("update_item", _update)
+
+    def delete_item(self, Key, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, **_):
+        def _delete():
+            self._check(self._items.get(self._key(Key)), ConditionExpression, ExpressionAttributeNames,
+                        ExpressionAttributeValues, "DeleteItem")
+            self._items.pop(self._key(Key), None)
+            return {}
+        return self._timed("delete_item", _delete)
+
+
+class FakeDynamo:
+    """Tables by name; key schema per table (default pk/sk, like the ingest state table)."""
+
+    def __init__(self, key_schemas: dict, timers: Timers):
+        self._tables = {name: FakeTable(name, keys, timers) for name, keys in key_schemas.items()}
+
+    def table(self, name: str) -> FakeTable:
+        return self._tables[name]
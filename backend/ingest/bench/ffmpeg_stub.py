@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Deterministic ffmpeg/ffprobe stand-in for the ingest benchmark (no codecs needed).
+
+- ffprobe mode (args contain -show_entries): JSON for the input path, duration from the
+  WAV header or the file size at a nominal bitrate per extension.
+- ffmpeg mode: reads the whole input (file or pipe:0), then writes every output in the
+  command line sized as the real encoder would (bitrate x duration): MP3/M4A/ADTS files
+  or pipe:1, the s16le analysis tap (a sine, so peaks are non-trivial), the HLS ladder,
+  image copies, and an ebur128 summary on stderr when the graph meters loudness.
+It does not emit decodable audio, so chunked mode must be disabled when it is used.
+"""
+import json
+import math
+import os
+import re
+import struct
+import sys
+
+NOMINAL_BPS = {".mp3": 320_000, ".flac": 900_000, ".m4a": 256_000, ".mp4": 256_000,
+               ".aac": 256_000, ".ogg": 192_000}
+CODECS = {".mp3": ("mp3", "mp3"), ".flac": ("flac", "flac"), ".wav": ("pcm_s16le", "wav"),
+          ".m4a": ("aac", "mov,mp4,m4a,3gp,3g2,mj2"), ".mp4": ("aac", "mov,mp4,m4a,3gp,3g2,mj2"),
+          ".aac": ("aac", "aac"), ".ogg": ("vorbis", "ogg")}
+FLAGS = {"-y", "-n", "-nostats", "-vn", "-hide_banner"}
+CHUNK = 1024 * 1024
+
+
+def wav_duration(head: bytes, size: int):
+    if head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+        return None
+    pos, rate, block = 12, None, None
+    while pos + 8 <= len(head):
+        chunk_id, chunk_size = head[pos:pos + 4], struct.unpack("<I", head[pos + 4:pos + 8])[0]
+        if chunk_id == b"fmt ":
+            _, channels, rate, _, block = struct.unpack("<HHIIH", head[pos + 8:pos + 22])
+        elif chunk_id == b"data":
+            return (size - pos - 8) / (rate * block) if rate and block else None
+        pos += 8 + chunk_size
+    return None
+
+
+def duration_of(head: bytes, size: int, ext: str) -> float:
+    return wav_duration(head, size) or size * 8 / NOMINAL_BPS.get(ext, 320_000)
+
+
+def probe(path: str):
+    ext = os.path.splitext(path)[1].lower()
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        head = f.read(4096)
+    duration = duration_of(head, size, ext)
+    codec, fmt = CODECS.get(ext, ("mp3", "mp3"))
+    bitrate = int(size * 8 / duration) if duration else 0
+    print(json.dumps({
+        "streams": [{"codec_name": codec, "bit_rate": str(bitrate), "sample_rate": "44100"}],
+        "format": {"format_name": fmt, "duration": f"{duration:.6f}", "bit_rate": str(bitrate)},
+    }))
+
+
+def read_input(src: str):
+    """Consumes the input like a decoder would; returns (head bytes, size)."""
+    f = sys.stdin.buffer if src == "pipe:0" else open(src, "rb")
+    head, size = b"", 0
+    while True:
+        data = f.read(CHUNK)
+        if not data:
+            break
+        if len(head) < 4096:
+            head += data[:4096]
+        size += len(data)
+    return head, size
+
+
+def parse_outputs(args: list):
+    """-> (input, [(target, {option: value}, [maps])])"""
+    src, outputs, opts, maps, i = None, [], {}, [], 0
+    while i < len(args):
+        tok = args[i]
+        if tok in FLAGS:
+            i += 1
+        elif tok.startswith("-") and tok != "-":
+            value = args[i + 1] if i + 1 < len(args) else ""
+            if tok == "-i":
+                src = value
+            elif tok == "-map":
+                maps.append(value)
+            else:
+                opts[tok] = value
+            i += 2
+        else:
+            outputs.append((tok, opts, maps))
+            opts, maps = {}, []
+            i += 1
+    return src, outputs
+
+
+def _bps(value: str, default: int) -> int:
+    m = re.match(r"(\d+)(k?)", value or "")
+    return int(m.group(1)) * (1000 if m.group(2) else 1) if m else default
+
+
+def write_bytes(target: str, nbytes: int, pattern: bytes = b"\x00"):
+    out = sys.stdout.buffer if target == "pipe:1" else open(target, "wb")
+    block = (pattern * (CHUNK // len(pattern) + 1))[:CHUNK]
+    while nbytes > 0:
+        out.write(block[:min(nbytes, CHUNK)])
+        nbytes -= CHUNK
+    out.flush()
+    if out is not sys.stdout.buffer:
+        out.close()
+
+
+def write_hls(target: str, opts: dict, duration: float):
+    hls_dir = os.path.dirname(target)
+    names = [m.group(1) for m in re.finditer(r"name:([^\s,]+)", opts.get("-var_stream_map", ""))] or ["0"]
+    seg = float(opts.get("-hls_time", "6"))
+    count = max(1, math.ceil(duration / seg))
+    master = ["#EXTM3U"]
+    for i, name in enumerate(names):
+        bps = _bps(opts.get(f"-b:a:{i}"), 128_000)
+        write_bytes(os.path.join(hls_dir, f"init_{name}.mp4"), 800)
+        playlist = ["#EXTM3U", "#EXT-X-PLAYLIST-TYPE:VOD", f"#EXT-X-TARGETDURATION:{int(seg)}",
+                    f'#EXT-X-MAP:URI="init_{name}.mp4"']
+        for n in range(count):
+            seg_name = f"seg_{name}_{n:05d}.m4s"
+            write_bytes(os.path.join(hls_dir, seg_name), int(bps * min(seg, duration - n * seg) / 8) or 1)
+            playlist += [f"#EXTINF:{seg:.3f},", seg_name]
+        playlist.append("#EXT-X-ENDLIST")
+        with open(os.path.join(hls_dir, target.rsplit("/", 1)[-1].replace("%v", name)), "w") as f:
+            f.write("\n".join(playlist) + "\n")
+        master += [f"#EXT-X-STREAM-INF:BANDWIDTH={bps}", target.rsplit("/", 1)[-1].replace("%v", name)]
+    with open(os.path.join(hls_dir, opts.get("-master_pl_name", "master.m3u8")), "w") as f:
+        f.write("\n".join(master) + "\n")
+
+
+def main(args: list) -> int:
+    if "-show_entries" in args:
+        probe(args[-1])
+        return 0
+
+    src, outputs = parse_outputs(args)
+    head, size = read_input(src)
+    ext = os.path.splitext(src or "")[1].lower()
+    duration = duration_of(head, size, ext)
+    graph = ""
+    sine = struct.pack("<160h", *(int(12000 * math.sin(2 * math.pi * n / 160)) for n in range(160)))
+
+    for target, opts, maps in outputs:
+        graph = opts.get("-filter_complex", graph)
+        fmt = opts.get("-f") or os.path.splitext(target)[1].lstrip(".").lower()
+        out_duration = min(duration, 30.0) if "[prev_out]" in maps else duration
+        if fmt == "null":
+            continue
+        if fmt == "hls":
+            write_hls(target, opts, duration)
+        elif fmt == "s16le":
+            write_bytes(target, int(out_duration * int(opts.get("-ar", "8000"))) * 2, sine)
+        elif fmt in ("jpg", "jpeg", "png", "webp"):
+            with open(src, "rb") as f_in, open(target, "wb") as f_out:
+                f_out.write(f_in.read())
+        else:
+            default = 192_000 if fmt == "mp3" else 160_000
+            bps = size * 8 / duration if opts.get("-codec:a") == "copy" else _bps(opts.get("-b:a"), default)
+            write_bytes(target, int(out_duration * bps / 8))
+
+    if "ebur128" in graph:
+        sys.stderr.write(
+            "[Parsed_ebur128_0 @ 0x0] Summary:\n\n"
+            "  Integrated loudness:\n    I:         -14.0 LUFS\n    Threshold: -24.0 LUFS\n\n"
+            "  True peak:\n    Peak:       -1.0 dBFS\n"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,341 @@
+"""
+Ingest replay benchmark: feeds a recorded S3 notification (events/s3_put_upload.json)
+into lambda_function.lambda_handler against the in-process fakes in fakes.py, once per
+fixture size, each in its own process so peak RSS is per fixture.
+
+Reports busy time per step (join/meta wait, S3 download, ffmpeg, S3 upload, cover,
+put_item), the checkpointed stage durations, peak RSS (handler + ffmpeg children) and
+peak /tmp usage, and flags runs over the Lambda timeout or one worker's /tmp share.
+
+    python backend/ingest/bench/run.py                       # deterministic ffmpeg stub
+    python backend/ingest/bench/run.py --ffmpeg real --fixtures mp3_3mb,wav_120mb
+
+Needs boto3 (for botocore errors and the module import) and, with --ffmpeg real, ffmpeg/
+ffprobe on PATH (or FFMPEG_BIN/FFPROBE_BIN). Generated fixtures are cached in --store.
+This directory is not part of ingest.zip.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+INGEST_DIR = os.path.dirname(BENCH_DIR)
+EVENT_FIXTURE = os.path.join(BENCH_DIR, "events", "s3_put_upload.json")
+STUB = os.path.join(BENCH_DIR, "ffmpeg_stub.py")
+
+RAW_BUCKET = "nicify-raw"
+AUDIO_BUCKET = "nicify-audio-bench"
+TRACKS_TABLE = "bench-tracks"
+STATE_TABLE = "bench-ingest-state"
+# terraform ingest function: timeout, and /tmp (ephemeral_storage) per concurrent record
+LAMBDA_TIMEOUT_SECONDS = 300
+LAMBDA_TMP_MB_PER_RECORD = 2048 // 4  # INGEST_MAX_WORKERS = 4
+
+# name -> (extension, size in MB)
+FIXTURES = {
+    "mp3_3mb": (".mp3", 3),
+    "mp3_12mb": (".mp3", 12),
+    "flac_40mb": (".flac", 40),
+    "wav_120mb": (".wav", 120),
+    "wav_500mb": (".wav", 500),
+}
+ENCODE_BPS = {".mp3": 320_000, ".flac": 900_000}  # real mode: duration that lands near the size
+TMP_PREFIXES = ("ingest_", "chunk_", "reprocess_")
+MB = 1024 * 1024
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+def _write_wav(path: str, nbytes: int):
+    """44.1kHz stereo s16 WAV of ~nbytes with seeded noise (encoders can't shortcut it)."""
+    data_len = max(0, nbytes - 44) // 4 * 4
+    header = b"RIFF" + struct.pack("<I", 36 + data_len) + b"WAVE" + b"fmt " + struct.pack(
+        "<IHHIIHH", 16, 1, 2, 44100, 44100 * 4, 4, 16) + b"data" + struct.pack("<I", data_len)
+    block = random.Random(1773512527).randbytes(MB)
+    with open(path, "wb") as f:
+        f.write(header)
+        left = data_len
+        while left > 0:
+            f.write(block[:min(left, MB)])
+            left -= MB
+
+
+def ensure_fixture(store: str, name: str, ffmpeg_mode: str) -> str:
+    ext, size_mb = FIXTURES[name]
+    path = os.path.join(store, "fixtures", ffmpeg_mode, name + ext)
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    print(f"Generating fixture {name} ({size_mb}MB {ext}, {ffmpeg_mode})...")
+    if ext == ".wav" or ffmpeg_mode == "stub":
+        # The stub sizes outputs from bytes (or the WAV header), so any content works
+        _write_wav(path + ".part", size_mb * MB)
+    else:
+        seconds = size_mb * MB * 8 / ENCODE_BPS[ext]
+        wav = path + ".src.wav"
+        _write_wav(wav, int(seconds * 44100 * 4) + 44)
+        codec = ["-codec:a", "libmp3lame", "-b:a", "320k"] if ext == ".mp3" else ["-codec:a", "flac"]
+        subprocess.run([os.environ.get("FFMPEG_BIN", "ffmpeg"), "-y", "-v", "error", "-i", wav, *codec,
+                        "-f", ext.lstrip("."), path + ".part"], check=True)
+        os.remove(wav)
+    os.replace(path + ".part", path)
+    return path
+
+
+def build_event(fixture_key_ext: str, audio_size: int, meta_size: int) -> dict:
+    with open(EVENT_FIXTURE, encoding="utf-8") as f:
+        event = json.load(f)
+    audio, meta = event["Records"]
+    obj = audio["s3"]["object"]
+    obj["key"] = obj["key"].rsplit(".", 1)[0] + fixture_key_ext
+    obj["size"] = audio_size
+    obj["eTag"] = f"bench{audio_size:x}"
+    meta["s3"]["object"]["size"] = meta_size
+    for rec in event["Records"]:
+        rec["s3"]["bucket"]["name"] = RAW_BUCKET
+    return event
+
+
+# -----------------------------
+# Measurement helpers
+# -----------------------------
+class TmpSampler(threading.Thread):
+    """Polls the ingest scratch dirs in /tmp and keeps the peak total size."""
+
+    def __init__(self, interval: float = 0.02):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = 0
+        self._done = threading.Event()
+
+    def _usage(self) -> int:
+        total = 0
+        for entry in os.scandir("/tmp"):
+            if entry.is_dir(follow_symlinks=False) and entry.name.startswith(TMP_PREFIXES):
+                for dirpath, _, files in os.walk(entry.path):
+                    for name in files:
+                        try:
+                            total += os.path.getsize(os.path.join(dirpath, name))
+                        except OSError:
+                            pass  # removed while walking
+        return total
+
+    def run(self):
+        while not self._done.is_set():
+            self.peak = max(self.peak, self._usage())
+            time.sleep(self.interval)
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.peak = max(self.peak, self._usage())
+
+
+class TimedSubprocess:
+    """Drop-in for the subprocess module inside ingest: ffmpeg/ffprobe wall time."""
+
+    PIPE = subprocess.PIPE
+    DEVNULL = subprocess.DEVNULL
+    CalledProcessError = subprocess.CalledProcessError
+
+    def __init__(self, timers):
+        self._timers = timers
+        timers_ = timers
+
+        class _Popen(subprocess.Popen):
+            def __init__(self, *args, **kwargs):
+                self._bench_started = time.perf_counter()
+                super().__init__(*args, **kwargs)
+
+            def wait(self, timeout=None):
+                first = self.returncode is None
+                rc = super().wait(timeout)
+                if first:
+                    timers_.add("ffmpeg", time.perf_counter() - self._bench_started)
+                return rc
+
+        self.Popen = _Popen
+
+    def run(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return subprocess.run(*args, **kwargs)
+        finally:
+            self._timers.add("ffmpeg", time.perf_counter() - started)
+
+
+# -----------------------------
+# One fixture (child process)
+# -----------------------------
+def run_one(name: str, store: str, ffmpeg_mode: str, streaming: bool, hls: bool) -> dict:
+    os.environ.update({
+        "TRACKS_TABLE": TRACKS_TABLE,
+        "AUDIO_BUCKET": AUDIO_BUCKET,
+        "STATE_TABLE": STATE_TABLE,
+        "AWS_DEFAULT_REGION": os.environ.get("AWS_DEFAULT_REGION", "us-east-1"),
+        "INGEST_STREAMING": "true" if streaming else "false",
+        "INGEST_HLS": "true" if hls else "false",
+        "INGEST_CHUNK_FANOUT": "false",
+    })
+    if ffmpeg_mode == "stub":
+        os.environ.update({"FFMPEG_BIN": STUB, "FFPROBE_BIN": STUB, "INGEST_CHUNKED_MIN_SECONDS": "inf"})
+    else:
+        os.environ.setdefault("FFMPEG_BIN", shutil.which("ffmpeg") or "ffmpeg")
+        os.environ.setdefault("FFPROBE_BIN", shutil.which("ffprobe") or "ffprobe")
+
+    sys.path.insert(0, os.path.join(INGEST_DIR, "..", "shared"))  # instrumentation.py, catalog_index.py
+    sys.path.insert(0, INGEST_DIR)
+    sys.path.insert(0, BENCH_DIR)
+    from fakes import FakeDynamo, FakeS3, Timers
+    import lambda_function as ingest
+
+    fixture = ensure_fixture(store, name, ffmpeg_mode)
+    ext = FIXTURES[name][0]
+    meta = json.dumps({"title": "Opening Track", "artist": "Bench Artist", "album": "Bench Album",
+                       "track_number": 1, "release_year": 2026}).encode("utf-8")
+    event = build_event(ext, os.path.getsize(fixture), len(meta))
+
+    # raw bucket: hardlink/copy of the cached fixture + meta; audio bucket: fresh dir per run
+    run_dir = os.path.join(store, "runs", f"{name}-{os.getpid()}")
+    raw_dir, audio_dir = os.path.join(run_dir, "raw"), os.path.join(run_dir, "audio")
+    audio_key, meta_key = (r["s3"]["object"]["key"] for r in event["Records"])
+    from urllib.parse import unquote_plus
+    for key, write in ((unquote_plus(audio_key), None), (unquote_plus(meta_key), meta)):
+        path = os.path.join(raw_dir, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if write is None:
+            try:
+                os.link(fixture, path)
+            except OSError:
+                shutil.copyfile(fixture, path)
+        else:
+            with open(path, "wb") as f:
+                f.write(write)
+    os.makedirs(audio_dir, exist_ok=True)
+
+    timers = Timers()
+    ingest.s3 = FakeS3({RAW_BUCKET: raw_dir, AUDIO_BUCKET: audio_dir}, timers)
+    db = FakeDynamo({TRACKS_TABLE: ("track_id",), STATE_TABLE: ("pk", "sk")}, timers)
+    ingest._table = db.table
+    ingest.subprocess = TimedSubprocess(timers)
+
+    handler_started = time.perf_counter()
+    ingest_started = []
+    real_ingest_track = ingest.ingest_track
+
+    def _timed_ingest_track(*args, **kwargs):
+        ingest_started.append(time.perf_counter())
+        return real_ingest_track(*args, **kwargs)
+
+    ingest.ingest_track = _timed_ingest_track
+
+    sampler = TmpSampler()
+    sampler.start()
+    error = None
+    summary = {}
+    try:
+        resp = ingest.lambda_handler(event, None)
+        summary = json.loads(resp["body"])
+    except Exception as e:
+        error = str(e)
+    total = time.perf_counter() - handler_started
+    sampler.stop()
+
+    ingested = (summary.get("ingested") or [{}])[0]
+    stage_ms = ingested.get("stage_ms", {})
+    output_bytes = sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(audio_dir) for f in fs)
+    shutil.rmtree(run_dir, ignore_errors=True)
+
+    return {
+        "fixture": name,
+        "input_mb": round(os.path.getsize(fixture) / MB, 1),
+        "status": "failed" if error else ingested.get("status", "unknown"),
+        "error": error,
+        "total_s": round(total, 3),
+        "join_s": round(ingest_started[0] - handler_started, 3) if ingest_started else None,
+        "s3_get_s": round(timers.seconds.get("s3_get", 0), 3),
+        "ffmpeg_s": round(timers.seconds.get("ffmpeg", 0), 3),
+        "s3_put_s": round(timers.seconds.get("s3_put", 0), 3),
+        "ddb_s": round(timers.seconds.get("ddb", 0), 3),
+        "cover_s": round(stage_ms.get("cover_done", 0) / 1000, 3),
+        "put_item_s": round(timers.seconds.get("ddb_put_item", 0), 3),
+        "stage_ms": stage_ms,
+        "output_mb": round(output_bytes / MB, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "peak_child_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024, 1),
+        "peak_tmp_mb": round(sampler.peak / MB, 1),
+    }
+
+
+# -----------------------------
+# Driver
+# -----------------------------
+COLUMNS = (
+    ("fixture", "{:<11}"), ("input_mb", "{:>8}"), ("total_s", "{:>8}"), ("join_s", "{:>7}"),
+    ("s3_get_s", "{:>8}"), ("ffmpeg_s", "{:>8}"), ("s3_put_s", "{:>8}"), ("cover_s", "{:>7}"),
+    ("put_item_s", "{:>10}"), ("peak_rss_mb", "{:>11}"), ("peak_child_rss_mb", "{:>17}"),
+    ("peak_tmp_mb", "{:>11}"), ("status", "{:<10}"),
+)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Replay S3 events through ingest against fakes.")
+    parser.add_argument("--fixtures", default=",".join(FIXTURES), help="comma-separated: " + ",".join(FIXTURES))
+    parser.add_argument("--ffmpeg", choices=("stub", "real"), default="stub")
+    parser.add_argument("--store", default=os.path.join(BENCH_DIR, ".store"), help="fixture cache + fake buckets (not /tmp)")
+    parser.add_argument("--no-streaming", action="store_true", help="download-to-/tmp path")
+    parser.add_argument("--no-hls", action="store_true")
+    parser.add_argument("--json", help="also write the results here")
+    parser.add_argument("--verbose", action="store_true", help="show the handler's own logs")
+    parser.add_argument("--one", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.one:
+        result = run_one(args.one, args.store, args.ffmpeg, not args.no_streaming, not args.no_hls)
+        print("BENCH_RESULT " + json.dumps(result))
+        return 0
+
+    results = []
+    for name in args.fixtures.split(","):
+        if name not in FIXTURES:
+            parser.error(f"unknown fixture {name}")
+        cmd = [sys.executable, os.path.abspath(__file__), "--one", name, "--ffmpeg", args.ffmpeg, "--store", args.store]
+        cmd += ["--no-streaming"] if args.no_streaming else []
+        cmd += ["--no-hls"] if args.no_hls else []
+        proc = subprocess.run(cmd, capture_output=True, text=True)
+        lines = proc.stdout.splitlines()
+        if args.verbose:
+            print("\n".join(line for line in lines if not line.startswith("BENCH_RESULT ")))
+        found = [line for line in lines if line.startswith("BENCH_RESULT ")]
+        if not found:
+            print(f"{name}: benchmark process failed (exit {proc.returncode})\n{proc.stderr[-2000:]}")
+            results.append({"fixture": name, "status": "crashed"})
+            continue
+        results.append(json.loads(found[-1][len("BENCH_RESULT "):]))
+
+    print(" ".join(fmt.format(key) for key, fmt in COLUMNS))
+    for r in results:
+        print(" ".join(fmt.format("-" if r.get(key) is None else r.get(key)) for key, fmt in COLUMNS))
+        if r.get("error"):
+            print(f"  error: {r['error']}")
+        if (r.get("total_s") or 0) > LAMBDA_TIMEOUT_SECONDS:
+            print(f"  OVER the {LAMBDA_TIMEOUT_SECONDS}s Lambda timeout")
+        if (r.get("peak_tmp_mb") or 0) > LAMBDA_TMP_MB_PER_RECORD:
+            print(f"  OVER the {LAMBDA_TMP_MB_PER_RECORD}MB /tmp share of one worker")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 1 if any(r.get("status") in ("failed", "crashed") for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
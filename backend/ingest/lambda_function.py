@@ -1,24 +1,178 @@
+import hashlib
+import io
 import json
+import math
 import os
-import uuid
 import boto3
 import re
+import shutil
 import subprocess
+import tempfile
+import threading
 import time
-from urllib.parse import unquote_plus
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from urllib.parse import quote_plus, unquote_plus
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
-dynamodb = boto3.resource("dynamodb")
-s3 = boto3.client("s3")
+try:
+    # Vendored into ingest.zip; without it covers fall back to the ffmpeg cover.jpg path
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+try:
+    # Vendored into ingest.zip alongside Pillow; without it peaks use the array fallback
+    import numpy as np
+except ImportError:
+    np = None
+
+import catalog_index
+import instrumentation
+from audio_tags import read_tags
+
+s3 = boto3.client("s3")  # clients are thread-safe; shared by all workers
+metrics = instrumentation.Metrics("ingest")
 
 TRACKS_TABLE = os.environ["TRACKS_TABLE"]
 AUDIO_BUCKET = os.environ["AUDIO_BUCKET"]
+# Single-table ingest bookkeeping (pk/sk), e.g. UPLOAD#raw/<artist>/<album>/<ts> | PENDING
+STATE_TABLE = os.environ["STATE_TABLE"]
+
+# Records in one invocation are processed concurrently (S3 batches album uploads)
+INGEST_MAX_WORKERS = int(os.environ.get("INGEST_MAX_WORKERS", "4"))
+
+# SQS mode: raw bucket -> intake queue (audio + meta.json keys only) -> this function as
+# router -> work queue (fair queue, MessageGroupId = artist folder) -> this function as worker
+INGEST_QUEUE_URL = os.environ.get("INGEST_QUEUE_URL", "")
+sqs = boto3.client("sqs") if INGEST_QUEUE_URL else None
+SQS_SEND_BATCH = 10  # SendMessageBatch maximum
+
+# Pending uploads whose other half never shows up are expired by DynamoDB TTL
+PENDING_TTL_SECONDS = 7 * 24 * 3600
+# A join claim older than this is assumed dead (crashed/timed-out invocation)
+CLAIM_LEASE_SECONDS = 15 * 60
+# SQS mode: audio whose meta.json hasn't arrived this long after it is ingested alone
+# (embedded tags), via a delayed work-queue message; a later meta.json re-indexes it
+META_WAIT_SECONDS = min(int(os.environ.get("INGEST_META_WAIT_SECONDS", "300")), 900)  # SQS max delay
+META_TIMEOUT_EVENT = "ingest:MetaTimeout"
+
+# Catalog change log entries (GET /tracks/changes) expire after this; older clients resync
+CHANGE_LOG_TTL_SECONDS = int(os.environ.get("CHANGE_LOG_TTL_DAYS", "30")) * 24 * 3600
+
+# Bump when presets/analysis change: everything ingested by an older pipeline becomes
+# stale (new source_version, no dedup reuse) and reprocess.py will re-run it
+PIPELINE_VERSION = 1
+
+# Checkpointed ingest stages, in order (see ingest_track)
+INGEST_STAGES = ("hashed", "uploaded", "analyzed", "cover_done", "indexed")
+# Rendition outputs that are persisted (checkpoint, dedup index, track item)
+RENDITION_FIELDS = (
+    "stream_path", "source_format", "aac_path", "preview_path", "manifest_path",
+    "duration", "source_codec", "source_bitrate", "loudness_lufs", "true_peak_dbtp",
+)
+
+# boto3 resources are NOT thread-safe, so each worker thread gets its own Table
+_thread_local = threading.local()
+
+
+def _table(name: str):
+    tables = getattr(_thread_local, "tables", None)
+    if tables is None:
+        tables = _thread_local.tables = {}
+    if name not in tables:
+        tables[name] = boto3.session.Session().resource("dynamodb").Table(name)
+    return tables[name]
+
+
+def _tracks_table():
+    return _table(TRACKS_TABLE)
+
+
+def _state_table():
+    return _table(STATE_TABLE)
 
-table = dynamodb.Table(TRACKS_TABLE)
 
 SUPPORTED_AUDIO_EXTS = (".mp3", ".flac", ".wav", ".mp4", ".m4a", ".aac", ".ogg")
 SUPPORTED_ART_EXTS = (".jpg", ".jpeg", ".png", ".webp")  # raw can include png; audio will be jpg
 
+# Fallback metadata/art from the file's own tags: first ranged GET; larger tags
+# (e.g. ID3 with embedded art, moov after mdat) fetch just the extra range they need
+TAG_HEAD_BYTES = 256 * 1024
+
+# Cover derivatives: decoded once in-process, emitted as JPEG + WebP at each width
+COVER_SIZES = (64, 256, 640)  # plus "original" (capped at COVER_MAX_PX)
+COVER_MAX_PX = 3000
+COVER_FORMATS = {"jpg": ("JPEG", "image/jpeg"), "webp": ("WEBP", "image/webp")}
+# Built once per album (a done ALBUM#... | COVER record is never rebuilt); deleting that record
+# rebuilds the cover on the next ingest under the same keys, so no immutable here
+COVER_CACHE_CONTROL = "public, max-age=86400"
+# A track whose album cover is being built by another worker waits for it this long, then
+# fails the record so the queue retries it (resuming at the cover stage)
+COVER_WAIT_SECONDS = 30
+COVER_POLL_SECONDS = 0.5
+
+# ffmpeg layer paths; overridable for local runs (reprocess.py)
+FFMPEG_BIN = os.environ.get("FFMPEG_BIN", "/opt/bin/ffmpeg")
+FFPROBE_BIN = os.environ.get("FFPROBE_BIN", "/opt/bin/ffprobe")
+
+# One decode feeds every rendition (see _rendition_args)
+MP3_ARGS = ["-codec:a", "libmp3lame", "-b:a", "192k"]
+AAC_BITRATE = "160k"
+AAC_ARGS = ["-codec:a", "aac", "-b:a", AAC_BITRATE, "-movflags", "+faststart"]
+PREVIEW_ARGS = ["-codec:a", "libmp3lame", "-b:a", "128k"]
+PREVIEW_SECONDS = 30
+# Sources already at/below these bitrates are copied instead of re-encoded
+MP3_TARGET_BPS = 192_000
+AAC_TARGET_BPS = 160_000
+BITRATE_TOLERANCE = 1.05  # VBR/container overhead shouldn't force a re-encode
+# Mono s16le tap kept in the workdir for analysis stages (never uploaded)
+ANALYSIS_SAMPLE_RATE = 8000
+# EBU R128 branch of the same decode (integrated loudness + 4x-oversampled true peak);
+# its summary is parsed from ffmpeg's stderr (see parse_loudness)
+# framelog=verbose: the per-100ms frame lines go below ffmpeg's info level (-loglevel info),
+# so stderr carries only the summary instead of ~36k lines per hour of audio
+LOUDNESS_FILTER = "ebur128=peak=true:framelog=verbose"
+# Waveform peaks (waveforms/<track_id>.bin): interleaved int8 [min, max] per window of the tap
+WAVEFORM_WINDOW_SAMPLES = 400  # 50ms at 8kHz -> 20 pairs/s, ~10KB for a 4-minute track
+WAVEFORM_CACHE_CONTROL = "public, max-age=86400"  # rewritten if the source is re-uploaded
+
+# HLS mode: AAC adaptive-bitrate ladder (fMP4 segments + master playlist) under hls/
+INGEST_HLS = os.environ.get("INGEST_HLS", "false").lower() == "true"
+HLS_LADDER = ("64k", "128k", "256k")
+HLS_SEGMENT_SECONDS = 6
+HLS_CONTENT_TYPES = {".m3u8": "application/vnd.apple.mpegurl", ".m4s": "video/iso.segment", ".mp4": "audio/mp4"}
+# HLS files live under a per-render prefix (content hash + PIPELINE_VERSION, see
+# hls_prefix): a re-ingest with new bytes or a new ladder writes new names, so cached
+# playlists never mix with newer segments
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Chunked mode for long-form sources (DJ mixes, podcasts): split into time ranges,
+# transcode chunks in parallel, join the encoded frames losslessly (see render_audio_chunked)
+INGEST_CHUNKED_MIN_SECONDS = float(os.environ.get("INGEST_CHUNKED_MIN_SECONDS", "1200"))
+INGEST_CHUNK_WORKERS = int(os.environ.get("INGEST_CHUNK_WORKERS", "4"))
+# true: each chunk is a synchronous self-invocation (real parallel CPU); false: local ffmpeg processes
+INGEST_CHUNK_FANOUT = os.environ.get("INGEST_CHUNK_FANOUT", "false").lower() == "true"
+CHUNK_SAMPLE_RATE = 44100
+MP3_FRAME_SAMPLES = 1152
+AAC_FRAME_SAMPLES = 1024
+CHUNK_GRID = 9216  # lcm(1152, 1024): chunk edges fall on MP3 *and* AAC frame edges
+CHUNK_SECONDS = 300  # ~7MB of 192k MP3 per chunk, above S3's 5MB minimum part size
+CHUNK_ROLL = CHUNK_GRID  # encoder warm-up before (and after) each chunk, trimmed from the output
+CHUNK_WORK_PREFIX = "_work"  # scratch in the AUDIO bucket (lifecycle-expired)
+
+lambda_client = boto3.client("lambda", config=Config(read_timeout=900)) if INGEST_CHUNK_FANOUT else None
+
+# Streaming mode: S3 body -> ffmpeg stdin, ffmpeg stdout -> multipart upload (no /tmp)
+INGEST_STREAMING = os.environ.get("INGEST_STREAMING", "true").lower() == "true"
+# MP4/M4A can keep the moov atom at the end of the file, so ffmpeg needs a seekable input
+SEEKABLE_INPUT_EXTS = (".mp4", ".m4a")
+STREAM_CHUNK_SIZE = 1024 * 1024
+MULTIPART_PART_SIZE = 8 * 1024 * 1024  # S3 minimum is 5MB (except the last part)
+MULTIPART_MAX_IN_FLIGHT = 3
+
 
 def normalize_filename(filename: str) -> str:
     name = (filename or "").replace(" ", "_")
@@ -58,7 +212,8 @@ def try_load_meta(src_bucket: str, folder_prefix: str, ts: str):
     try:
         obj = s3.get_object(Bucket=src_bucket, Key=meta_key)
         raw = obj["Body"].read().decode("utf-8")
-        return json.loads(raw), meta_key
+        # Decimal so the dict can be stored in DynamoDB as-is
+        return json.loads(raw, parse_float=Decimal), meta_key
     except ClientError as e:
         code = e.response.get("Error", {}).get("Code", "")
         if code in ("NoSuchKey", "404"):
@@ -66,19 +221,144 @@ def try_load_meta(src_bucket: str, folder_prefix: str, ts: str):
         raise
 
 
-def load_meta_with_retries(src_bucket: str, folder_prefix: str, ts: str, tries=6, delay=0.4):
+def upload_group_key(src_key: str):
     """
-    S3 events can arrive out of order (audio object created before meta.json).
-    This retries briefly to find meta before proceeding.
+    raw/<artist>/<album>/<ts>__<file> -> raw/<artist>/<album>/<ts>
+    All objects from one uploads/init call (audio, art, meta) share this key.
     """
-    meta = None
-    meta_key = f"{folder_prefix}/{ts}__meta.json"
-    for i in range(tries):
-        meta, meta_key = try_load_meta(src_bucket, folder_prefix, ts)
-        if isinstance(meta, dict):
-            return meta, meta_key
-        time.sleep(delay)
-    return None, meta_key
+    folder, _, filename = (src_key or "").rpartition("/")
+    ts = extract_ts_prefix(filename)
+    return f"{folder}/{ts}" if folder and ts else None
+
+
+def find_upload_art(src_bucket: str, group_key: str):
+    """
+    Art uploaded with <group_key> (raw/<artist>/<album>/<ts>__<file>). In SQS mode art
+    events are filtered out before invocation, so the join looks for it instead.
+    """
+    resp = s3.list_objects_v2(Bucket=src_bucket, Prefix=f"{group_key}__", MaxKeys=50)
+    for obj in resp.get("Contents", []):
+        if _is_image_key(obj["Key"]):
+            return obj["Key"]
+    return None
+
+
+def _is_meta_key(key: str) -> bool:
+    return (key or "").lower().endswith("__meta.json")
+
+
+def record_pending_half(group_key: str, updates: dict) -> dict:
+    """
+    Atomically records whichever half (audio / meta / art) just arrived and
+    returns the pending item as it is after the write. DynamoDB serializes
+    updates on one item, so exactly one writer observes both halves present.
+    """
+    names = {}
+    values = {":exp": int(time.time()) + PENDING_TTL_SECONDS}
+    sets = ["expires_at = if_not_exists(expires_at, :exp)"]
+    for i, (field, value) in enumerate(updates.items()):
+        names[f"#f{i}"] = field
+        values[f":v{i}"] = value
+        sets.append(f"#f{i} = :v{i}")
+
+    resp = _state_table().update_item(
+        Key={"pk": f"UPLOAD#{group_key}", "sk": "PENDING"},
+        UpdateExpression="SET " + ", ".join(sets),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values,
+        ReturnValues="ALL_NEW",
+    )
+    return resp.get("Attributes", {})
+
+
+def load_pending(group_key: str) -> dict:
+    resp = _state_table().get_item(Key={"pk": f"UPLOAD#{group_key}", "sk": "PENDING"})
+    return resp.get("Item") or {}
+
+
+def claim_pending(group_key: str, without_meta: bool = False) -> bool:
+    """
+    Claims a join for ingest. Guards against both halves' events being redelivered;
+    an upload is claimable again when its audio is overwritten (new etag) or when
+    meta.json arrives after the audio was ingested without it. Stale claims (crashed
+    invocations) can be re-taken. without_meta (the META_WAIT_SECONDS timeout) only
+    claims while meta.json is still missing.
+    """
+    now = int(time.time())
+    condition = (
+        "(attribute_not_exists(ingested_at) OR ingested_etag <> audio_etag"
+        " OR (ingested_without_meta = :true AND attribute_exists(meta)))"
+        " AND (attribute_not_exists(claimed_at) OR claimed_at < :stale)"
+    )
+    if without_meta:
+        condition += " AND attribute_not_exists(meta)"
+    try:
+        _state_table().update_item(
+            Key={"pk": f"UPLOAD#{group_key}", "sk": "PENDING"},
+            UpdateExpression="SET claimed_at = :now",
+            ConditionExpression=condition,
+            ExpressionAttributeValues={":now": now, ":stale": now - CLAIM_LEASE_SECONDS, ":true": True},
+        )
+        return True
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+            return False
+        raise
+
+
+def release_pending(group_key: str, ingested: bool, audio_etag=None, with_meta: bool = True):
+    """Marks the join done (for this audio etag), or drops the claim so a retry can pick it up."""
+    if ingested:
+        if with_meta:
+            expr = "SET ingested_at = :now, ingested_etag = :etag REMOVE claimed_at, ingested_without_meta"
+            values = {":now": int(time.time()), ":etag": audio_etag}
+        else:
+            expr = "SET ingested_at = :now, ingested_etag = :etag, ingested_without_meta = :true REMOVE claimed_at"
+            values = {":now": int(time.time()), ":etag": audio_etag, ":true": True}
+    else:
+        expr = "REMOVE claimed_at"
+        values = None
+    kwargs = {"Key": {"pk": f"UPLOAD#{group_key}", "sk": "PENDING"}, "UpdateExpression": expr}
+    if values:
+        kwargs["ExpressionAttributeValues"] = values
+    _state_table().update_item(**kwargs)
+
+
+def schedule_meta_timeout(src_bucket: str, audio_key: str):
+    """Delayed work-queue record: ingests audio_key alone if its meta.json is still missing."""
+    if sqs is None:
+        return  # direct S3 mode: no delayed delivery; the upload waits for its meta.json
+    artist_slug, _ = parse_artist_album_from_key(audio_key)
+    record = {
+        "eventName": META_TIMEOUT_EVENT,
+        "s3": {"bucket": {"name": src_bucket}, "object": {"key": quote_plus(audio_key, safe="/")}},
+    }
+    sqs.send_message(
+        QueueUrl=INGEST_QUEUE_URL, MessageBody=json.dumps(record),
+        MessageGroupId=artist_slug or "_unsorted", DelaySeconds=META_WAIT_SECONDS,
+    )
+
+
+def ingest_without_meta(src_bucket: str, audio_key: str, workdir: str) -> dict:
+    """META_TIMEOUT_EVENT: meta.json never came; ingest the audio half with its embedded tags."""
+    group_key = upload_group_key(audio_key)
+    pending = load_pending(group_key)
+    if pending.get("audio_key") != audio_key or isinstance(pending.get("meta"), dict):
+        return {"key": audio_key, "status": "skipped"}  # joined (or replaced) meanwhile
+    if not claim_pending(group_key, without_meta=True):
+        print(f"Upload {group_key} already claimed/ingested; skipping meta timeout")
+        return {"key": audio_key, "status": "skipped"}
+
+    print(f"No meta.json for {group_key} after {META_WAIT_SECONDS}s; ingesting from embedded tags")
+    metrics.count("meta_timeouts")
+    try:
+        art_key = pending.get("art_key") or find_upload_art(src_bucket, group_key)
+        result = ingest_track(src_bucket, audio_key, pending.get("audio_etag"), None, None, art_key, workdir)
+    except Exception:
+        release_pending(group_key, ingested=False)
+        raise
+    release_pending(group_key, ingested=True, audio_etag=pending.get("audio_etag"), with_meta=False)
+    return result
 
 
 def slug_for_audio_path(display: str, fallback: str) -> str:
@@ -107,11 +387,12 @@ def _head_exists(bucket: str, key: str) -> bool:
         raise
 
 
-def _copy_image_to_audio_as_jpg(src_bucket: str, src_key: str, dest_bucket: str, dest_key: str):
+def _copy_image_to_audio_as_jpg(src_bucket: str, src_key: str, dest_bucket: str, dest_key: str, workdir: str):
     """
     Copies raw image to audio bucket as a normalized JPG.
     - If src is already JPG/JPEG: do a direct copy_object to dest_key (cover.jpg)
     - If src is PNG/WEBP: download -> ffmpeg convert -> upload as JPG
+    Scratch files go in the caller's workdir so concurrent records don't collide.
     """
     lower = (src_key or "").lower()
 
@@ -130,8 +411,8 @@ def _copy_image_to_audio_as_jpg(src_bucket: str, src_key: str, dest_bucket: str,
     # Otherwise transcode with ffmpeg to jpg
     # Download raw
     src_name = normalize_filename(src_key.split("/")[-1])
-    local_in = f"/tmp/{src_name}"
-    local_out = f"/tmp/cover.jpg"
+    local_in = os.path.join(workdir, src_name)
+    local_out = os.path.join(workdir, "cover.jpg")
 
     s3.download_file(src_bucket, src_key, local_in)
 
@@ -139,7 +420,7 @@ def _copy_image_to_audio_as_jpg(src_bucket: str, src_key: str, dest_bucket: str,
     # -q:v controls jpeg quality (2 is high). scale keeps within 3000x3000 defensively.
     subprocess.run(
         [
-            "/opt/bin/ffmpeg",
+            FFMPEG_BIN,
             "-y",
             "-i", local_in,
             "-vf", "scale='min(3000,iw)':'min(3000,ih)':force_original_aspect_ratio=decrease",
@@ -157,150 +438,1418 @@ def _copy_image_to_audio_as_jpg(src_bucket: str, src_key: str, dest_bucket: str,
     )
 
 
-def lambda_handler(event, context):
-    print("Received event:", json.dumps(event))
+def _cover_variant_paths(prefix: str) -> dict:
+    """{"jpg": {"64": key, ..., "original": key}, "webp": {...}} under albums/<artist>/<album>."""
+    variants = {}
+    for ext in COVER_FORMATS:
+        variants[ext] = {str(size): f"{prefix}/cover_{size}.{ext}" for size in COVER_SIZES}
+        variants[ext]["original"] = f"{prefix}/cover.{ext}"
+    return variants
 
-    for record in event.get("Records", []):
-        event_name = record.get("eventName", "")
-        if not event_name.startswith("ObjectCreated:"):
-            continue
 
-        src_bucket = record["s3"]["bucket"]["name"]
-        raw_key = record["s3"]["object"]["key"]
-        src_key = unquote_plus(raw_key)
+def _upload_embedded_art_as_jpg(picture: dict, dest_key: str, workdir: str):
+    """Embedded tag art -> cover.jpg without Pillow (JPEG as-is, anything else via ffmpeg)."""
+    if picture["mime"] in ("image/jpeg", "image/jpg"):
+        s3.put_object(Bucket=AUDIO_BUCKET, Key=dest_key, Body=picture["data"], ContentType="image/jpeg")
+        return
+    local_in = os.path.join(workdir, "embedded_art")
+    local_out = os.path.join(workdir, "cover.jpg")
+    with open(local_in, "wb") as f:
+        f.write(picture["data"])
+    subprocess.run(
+        [
+            FFMPEG_BIN,
+            "-y",
+            "-i", local_in,
+            "-vf", "scale='min(3000,iw)':'min(3000,ih)':force_original_aspect_ratio=decrease",
+            "-q:v", "2",
+            local_out
+        ],
+        check=True
+    )
+    s3.upload_file(local_out, AUDIO_BUCKET, dest_key, ExtraArgs={"ContentType": "image/jpeg"})
+
+
+def build_cover_derivatives(data: bytes, prefix: str) -> dict:
+    """
+    Decodes the art once (Pillow, in-process) and uploads the whole size ladder in
+    JPEG and WebP. Smaller sizes are downscaled from the previous step, not the original.
+    Returns _cover_variant_paths(prefix).
+    """
+    img = Image.open(io.BytesIO(data))
+    # JPEG decoders can downscale by 1/2..1/8 during decode: far cheaper for huge art
+    img.draft("RGB", (COVER_MAX_PX, COVER_MAX_PX))
+    img = ImageOps.exif_transpose(img).convert("RGB")
+    img.thumbnail((COVER_MAX_PX, COVER_MAX_PX), Image.LANCZOS)
+
+    sized = {"original": img}
+    current = img
+    for size in sorted(COVER_SIZES, reverse=True):
+        current = current.copy()
+        current.thumbnail((size, size), Image.LANCZOS)
+        sized[str(size)] = current
+
+    variants = _cover_variant_paths(prefix)
+    uploads = []
+    for ext, (pil_format, content_type) in COVER_FORMATS.items():
+        for label, im in sized.items():
+            buf = io.BytesIO()
+            if pil_format == "JPEG":
+                im.save(buf, pil_format, quality=85, optimize=True, progressive=True)
+            else:
+                im.save(buf, pil_format, quality=80, method=4)
+            uploads.append((variants[ext][label], buf.getvalue(), content_type))
+
+    def _put(u):
+        key, body, content_type = u
+        s3.put_object(Bucket=AUDIO_BUCKET, Key=key, Body=body, ContentType=content_type,
+                      CacheControl=COVER_CACHE_CONTROL)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(_put, uploads))
+    return variants
+
+
+def _produce_cover(src_bucket: str, art_key, cover_prefix: str, workdir: str, embedded_art=None):
+    """
+    Builds the album cover from raw art, else from art embedded in the audio tags,
+    else (legacy albums) from an existing cover.jpg.
+    Returns (art_path, art_variants); (None, None) when there is nothing to build from.
+    """
+    cover_jpg = f"{cover_prefix}/cover.jpg"
+    has_art = bool(art_key and _is_image_key(art_key))
+
+    if Image is None:
+        # No Pillow in this build: single cover.jpg via copy/ffmpeg
+        if has_art:
+            print(f"Creating album cover in audio bucket: {cover_jpg} from raw {art_key}")
+            _copy_image_to_audio_as_jpg(src_bucket, art_key, AUDIO_BUCKET, cover_jpg, workdir)
+            return cover_jpg, None
+        if embedded_art:
+            print(f"Creating album cover in audio bucket: {cover_jpg} from embedded art")
+            _upload_embedded_art_as_jpg(embedded_art, cover_jpg, workdir)
+            return cover_jpg, None
+        return (cover_jpg, None) if _head_exists(AUDIO_BUCKET, cover_jpg) else (None, None)
+
+    if has_art:
+        print(f"Building album cover ladder in audio bucket: {cover_prefix}/ from raw {art_key}")
+        variants = build_cover_derivatives(s3.get_object(Bucket=src_bucket, Key=art_key)["Body"].read(), cover_prefix)
+    elif embedded_art:
+        print(f"Building album cover ladder in audio bucket: {cover_prefix}/ from embedded art")
+        variants = build_cover_derivatives(embedded_art["data"], cover_prefix)
+    elif _head_exists(AUDIO_BUCKET, cover_jpg):
+        # Album ingested before derivatives existed: build the ladder from its cover.jpg
+        variants = build_cover_derivatives(s3.get_object(Bucket=AUDIO_BUCKET, Key=cover_jpg)["Body"].read(), cover_prefix)
+    else:
+        return None, None
+    return variants["jpg"]["original"], variants
+
+
+class CoverPending(RuntimeError):
+    """Another worker still holds the album cover claim after COVER_WAIT_SECONDS."""
+
+
+def ensure_album_cover(src_bucket: str, art_key, cover_prefix: str, workdir: str, embedded_art=None):
+    """
+    Claim-once album cover (ALBUM#albums/<artist>/<album> | COVER):
+    - record done      -> reuse its paths (no S3 HEAD at all)
+    - claim succeeds   -> this worker builds the cover and records the paths
+    - claim held       -> another worker is building it; wait for the record to be done
+                          (or for a failed build to drop the claim, then take it), and
+                          raise CoverPending after COVER_WAIT_SECONDS. Paths are only
+                          returned once the cover objects exist.
+    Tracks without art never claim, so a claim always means a source exists.
+    `embedded_art` ({"mime", "data"} from the audio tags) is used when there is no raw art.
+    Returns (art_path, art_variants).
+    """
+    key = {"pk": f"ALBUM#{cover_prefix}", "sk": "COVER"}
+    record = _state_table().get_item(Key=key).get("Item")
+    if record and record.get("status") == "done":
+        return record.get("art_path"), record.get("art_variants")
+
+    has_art = bool(art_key and _is_image_key(art_key)) or bool(embedded_art)
+    if not has_art and not _head_exists(AUDIO_BUCKET, f"{cover_prefix}/cover.jpg"):
+        return None, None
+
+    deadline = time.monotonic() + COVER_WAIT_SECONDS
+    while True:
+        now = int(time.time())
+        try:
+            _state_table().update_item(
+                Key=key,
+                UpdateExpression="SET #s = :claimed, claimed_at = :now",
+                ConditionExpression="attribute_not_exists(pk) OR (#s = :claimed AND claimed_at < :stale)",
+                ExpressionAttributeNames={"#s": "status"},
+                ExpressionAttributeValues={":claimed": "claimed", ":now": now, ":stale": now - CLAIM_LEASE_SECONDS},
+            )
+            break
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+        if time.monotonic() > deadline:
+            raise CoverPending(f"Album cover {cover_prefix} still being built by another worker")
+        time.sleep(COVER_POLL_SECONDS)
+        record = _state_table().get_item(Key=key).get("Item")
+        if record and record.get("status") == "done":
+            print(f"Album cover {cover_prefix} built by another worker; reusing its paths")
+            return record.get("art_path"), record.get("art_variants")
+
+    try:
+        art_path, art_variants = _produce_cover(src_bucket, art_key, cover_prefix, workdir, embedded_art)
+    except Exception:
+        _state_table().delete_item(Key=key)  # let the next track retry the claim
+        raise
+
+    _state_table().put_item(Item={
+        **key,
+        "status": "done",
+        "art_path": art_path,
+        **({"art_variants": art_variants} if art_variants else {}),
+    })
+    return art_path, art_variants
+
+
+def read_source_tags(src_bucket: str, src_key: str) -> dict:
+    """
+    Title/artist/album/track/year (+ embedded picture) from the audio's own tags,
+    via ranged GETs of the header region only. {} when unreadable.
+    """
+    def read_range(start: int, end: int) -> bytes:
+        return s3.get_object(Bucket=src_bucket, Key=src_key, Range=f"bytes={start}-{end}")["Body"].read()
+
+    try:
+        resp = s3.get_object(Bucket=src_bucket, Key=src_key, Range=f"bytes=0-{TAG_HEAD_BYTES - 1}")
+        head = resp["Body"].read()
+        # "bytes 0-262143/<total>"; absent when the object is smaller than the range
+        size = int(resp.get("ContentRange", "").rsplit("/", 1)[-1] or len(head))
+        return read_tags(head, size, read_range)
+    except (ClientError, ValueError) as e:
+        print(f"Tag read error for {src_key}:", str(e))
+        return {}
+
+
+def track_id_for_key(src_key: str) -> str:
+    """Deterministic track id: a redelivered/retried event maps to the same row."""
+    return "trk_" + hashlib.sha256(src_key.encode("utf-8")).hexdigest()[:16]
+
+
+def source_version(src_bucket: str, src_key: str, src_etag) -> str:
+    """
+    raw_key@etag#p<PIPELINE_VERSION> identifies one version of a raw object (an overwrite
+    gets a new etag) as rendered by one version of this pipeline.
+    """
+    if not src_etag:
+        src_etag = s3.head_object(Bucket=src_bucket, Key=src_key)["ETag"]
+    etag = src_etag.strip('"')
+    return f"{src_key}@{etag}#p{PIPELINE_VERSION}"
+
+
+def load_checkpoint(src_key: str, version: str) -> dict:
+    """
+    Per-track stage checkpoint (RAW#<raw_key> | CHECKPOINT). A checkpoint for an
+    older object version is ignored, so an overwritten raw object starts over.
+    """
+    resp = _state_table().get_item(Key={"pk": f"RAW#{src_key}", "sk": "CHECKPOINT"})
+    item = resp.get("Item")
+    if item and item.get("source_version") == version:
+        item.setdefault("stages", {})
+        return item
+    return {"pk": f"RAW#{src_key}", "sk": "CHECKPOINT", "source_version": version, "stages": {}}
+
+
+def save_stage(ckpt: dict, stage: str, started: float, **outputs):
+    """Marks `stage` complete with its duration and persists the stage outputs needed to resume."""
+    ms = int((time.perf_counter() - started) * 1000)
+    ckpt["stages"][stage] = {"at": int(time.time()), "ms": ms}
+    ckpt.update({k: v for k, v in outputs.items() if v is not None})
+    metrics.timing(f"stage_{stage}", ms)
+    print(f"Stage {stage} done in {ms}ms ({ckpt['source_version']})")
+    _state_table().put_item(Item=ckpt)
+
+
+def hash_s3_object(bucket: str, key: str) -> str:
+    """Streaming SHA-256 of an S3 object (chunked GetObject; nothing buffered or written to /tmp)."""
+    h = hashlib.sha256()
+    body = s3.get_object(Bucket=bucket, Key=key)["Body"]
+    try:
+        for chunk in body.iter_chunks(STREAM_CHUNK_SIZE):
+            h.update(chunk)
+    finally:
+        body.close()
+    return h.hexdigest()
+
+
+def lookup_rendition(content_hash: str):
+    """hash -> {track_id, RENDITION_FIELDS...} for a source this pipeline version already rendered."""
+    resp = _state_table().get_item(Key={"pk": f"HASH#{content_hash}", "sk": "RENDITION"})
+    item = resp.get("Item")
+    return item if item and item.get("pipeline_version") == PIPELINE_VERSION else None
+
+
+def register_rendition(content_hash: str, track_id: str, rendition: dict):
+    _state_table().put_item(Item={
+        "pk": f"HASH#{content_hash}",
+        "sk": "RENDITION",
+        "track_id": track_id,
+        "pipeline_version": PIPELINE_VERSION,
+        **{k: v for k, v in rendition.items() if k in RENDITION_FIELDS and v is not None},
+    })
+
+
+def _pump_body_to_stdin(body, stdin, errors: list):
+    """
+    Feeds an S3 StreamingBody into ffmpeg's stdin in chunks.
+    Runs on its own thread so ffmpeg's stdout can be drained concurrently.
+    """
+    try:
+        for chunk in body.iter_chunks(STREAM_CHUNK_SIZE):
+            stdin.write(chunk)
+    except BrokenPipeError:
+        # ffmpeg exited early; its return code carries the real error
+        pass
+    except Exception as e:
+        errors.append(e)
+    finally:
+        try:
+            stdin.close()
+        except BrokenPipeError:
+            pass
+        body.close()
+
+
+def _read_part(stream, size: int) -> bytes:
+    """Reads up to `size` bytes, only returning short at EOF."""
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = stream.read(size - len(buf))
+        if not chunk:
+            break
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _stream_transcode_to_s3(src_bucket: str, src_key: str, dest_bucket: str, dest_key,
+                            ffmpeg_args: list, content_type: str):
+    """
+    Transcodes without staging the source in /tmp:
+    - S3 GetObject body is piped into ffmpeg stdin (feeder thread)
+    - ffmpeg stdout (the output mapped to pipe:1 in ffmpeg_args) is cut into parts and
+      uploaded as a multipart upload as parts fill
+    Download, transcode and upload overlap. Outputs smaller than one part use a plain put_object.
+    dest_key=None means nothing is mapped to stdout (file outputs only).
+    Returns ffmpeg's stderr (filter summaries such as the loudness meter).
+    """
+    obj = s3.get_object(Bucket=src_bucket, Key=src_key)
+    proc = subprocess.Popen(
+        [FFMPEG_BIN, "-y", "-nostats", "-loglevel", "info", "-i", "pipe:0", *ffmpeg_args],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE if dest_key else subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+
+    feed_errors = []
+    feeder = threading.Thread(target=_pump_body_to_stdin, args=(obj["Body"], proc.stdin, feed_errors), daemon=True)
+    feeder.start()
+    # Drained concurrently so a chatty stderr can't fill its pipe and stall ffmpeg
+    stderr_chunks = []
+    drainer = threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()), daemon=True)
+    drainer.start()
+
+    upload_id = None
+    single_part = None
+    parts = []
+    pending = []
+    pool = ThreadPoolExecutor(max_workers=MULTIPART_MAX_IN_FLIGHT)
+
+    def _upload_part(part_number: int, data: bytes):
+        resp = s3.upload_part(
+            Bucket=dest_bucket, Key=dest_key, UploadId=upload_id, PartNumber=part_number, Body=data
+        )
+        return {"PartNumber": part_number, "ETag": resp["ETag"]}
+
+    try:
+        part_number = 0
+        while dest_key:
+            data = _read_part(proc.stdout, MULTIPART_PART_SIZE)
+            if not data:
+                break
+            part_number += 1
+
+            if part_number == 1 and len(data) < MULTIPART_PART_SIZE:
+                # Whole output fits in one part: skip the multipart round-trips (put once
+                # ffmpeg has exited cleanly, like complete_multipart_upload below)
+                single_part = data
+                break
+
+            if upload_id is None:
+                upload_id = s3.create_multipart_upload(
+                    Bucket=dest_bucket, Key=dest_key, ContentType=content_type
+                )["UploadId"]
+
+            # Bound memory: at most MULTIPART_MAX_IN_FLIGHT parts buffered at once
+            if len(pending) >= MULTIPART_MAX_IN_FLIGHT:
+                parts.append(pending.pop(0).result())
+            pending.append(pool.submit(_upload_part, part_number, data))
+
+        parts.extend(f.result() for f in pending)
+        pending = []
+
+        rc = proc.wait()
+        feeder.join()
+        drainer.join()
+        stderr = b"".join(stderr_chunks).decode("utf-8", errors="replace")
+        if feed_errors:
+            raise feed_errors[0]
+        if rc != 0:
+            print("ffmpeg stderr (tail):", stderr[-2000:])
+            raise subprocess.CalledProcessError(rc, FFMPEG_BIN)
+
+        if single_part is not None:
+            s3.put_object(Bucket=dest_bucket, Key=dest_key, Body=single_part, ContentType=content_type)
+        if upload_id is not None:
+            s3.complete_multipart_upload(
+                Bucket=dest_bucket,
+                Key=dest_key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
+            )
+            upload_id = None
+    finally:
+        pool.shutdown(wait=True)
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        if upload_id is not None:
+            # Don't leave orphaned parts billing in the audio bucket
+            s3.abort_multipart_upload(Bucket=dest_bucket, Key=dest_key, UploadId=upload_id)
+    return stderr
+
+
+def parse_loudness(stderr: str) -> dict:
+    """
+    {loudness_lufs, true_peak_dbtp} (floats) from the ebur128 summary in ffmpeg's stderr.
+    Digital silence (-inf) or a missing summary leaves the field out.
+    """
+    out = {}
+    for field, pattern in (
+        ("loudness_lufs", r"Integrated loudness:\s*I:\s*(-?[\d.]+) LUFS"),
+        ("true_peak_dbtp", r"True peak:\s*Peak:\s*(-?[\d.]+) dBFS"),
+    ):
+        matches = re.findall(pattern, stderr or "")
+        if matches:
+            out[field] = float(matches[-1])
+    return out
+
+
+def pcm_duration(pcm_file: str):
+    """Exact decoded duration (seconds, ms precision) from the size of the s16le mono tap."""
+    samples = os.path.getsize(pcm_file) // 2
+    return Decimal(str(round(samples / ANALYSIS_SAMPLE_RATE, 3))) if samples else None
+
+
+def probe_audio(src_bucket: str, src_key: str):
+    """
+    ffprobe over a presigned URL (HTTP range reads; no download).
+    Returns {codec, format_name, bitrate, sample_rate, duration} or None if probing fails,
+    in which case callers fall back to deciding by file extension.
+    """
+    url = s3.generate_presigned_url("get_object", Params={"Bucket": src_bucket, "Key": src_key}, ExpiresIn=300)
+    try:
+        out = subprocess.run(
+            [FFPROBE_BIN, "-v", "error", "-select_streams", "a:0",
+             "-show_entries", "stream=codec_name,bit_rate,sample_rate:format=format_name,bit_rate,duration",
+             "-of", "json", url],
+            check=True, capture_output=True, timeout=30,
+        ).stdout
+        info = json.loads(out)
+    except Exception as e:
+        # str(e) would echo the presigned URL into the logs
+        print(f"ffprobe failed ({type(e).__name__}), deciding by extension")
+        return None
+
+    stream = (info.get("streams") or [{}])[0]
+    fmt = info.get("format") or {}
+
+    def _num(v, cast):
+        try:
+            return cast(v)
+        except (TypeError, ValueError):
+            return None
+
+    return {
+        "codec": stream.get("codec_name"),
+        "format_name": fmt.get("format_name") or "",
+        "bitrate": _num(stream.get("bit_rate"), int) or _num(fmt.get("bit_rate"), int),
+        "sample_rate": _num(stream.get("sample_rate"), int),
+        "duration": _num(fmt.get("duration"), float),
+    }
+
+
+def plan_audio(probe, lower_key: str) -> dict:
+    """
+    Cheapest valid path per output:
+      mp3: "copy" (server-side, MP3 at/below target) | "encode" | None (AAC source streams as M4A)
+      m4a: "copy" (remux AAC at/below target, no encode) | "encode"
+    Unknown bitrates are treated as over target; no probe means decide by extension.
+    """
+    if probe is None:
+        is_mp3 = lower_key.endswith(".mp3")
+        return {"mp3": "copy" if is_mp3 else "encode", "m4a": "encode"}
+
+    bitrate = probe.get("bitrate") or 10**9
+    if probe.get("codec") == "mp3":
+        return {"mp3": "copy" if bitrate <= MP3_TARGET_BPS * BITRATE_TOLERANCE else "encode", "m4a": "encode"}
+    if probe.get("codec") == "aac" and any(f in probe["format_name"] for f in ("mp4", "m4a", "mov", "aac")):
+        # Browsers play AAC/M4A natively, so the M4A is the stream rendition: no MP3 at all
+        return {"mp3": None, "m4a": "copy" if bitrate <= AAC_TARGET_BPS * BITRATE_TOLERANCE else "encode"}
+    return {"mp3": "encode", "m4a": "encode"}
 
-        lower_key = (src_key or "").lower()
 
-        # Only process audio file creates (not meta.json, not art)
+def _rendition_args(mp3_target, m4a_path: str, preview_path: str, pcm_path: str, hls_dir=None,
+                    m4a_copy: bool = False) -> list:
+    """
+    ffmpeg output args for a single decode fanned out (asplit) to every rendition:
+    MP3 192k, AAC/M4A with faststart, a PREVIEW_SECONDS clip, a mono PCM analysis tap and
+    an EBU R128 meter (null output), plus the HLS_LADDER variants when hls_dir is given.
+    mp3_target=None drops the MP3 branch (copied server-side, or not needed for AAC sources).
+    m4a_copy remuxes the source AAC stream into the M4A instead of encoding it.
+    """
+    hls_branches = [f"hls{i}" for i in range(len(HLS_LADDER))] if hls_dir else []
+    branches = (
+        ([] if m4a_copy else ["m4a"]) + ["prev", "pcm", "loud"] + (["mp3"] if mp3_target else []) + hls_branches
+    )
+    graph = (
+        f"[0:a]asplit={len(branches)}" + "".join(f"[{b}]" for b in branches) + ";"
+        f"[prev]atrim=duration={PREVIEW_SECONDS},asetpts=PTS-STARTPTS[prev_out];"
+        f"[pcm]aresample={ANALYSIS_SAMPLE_RATE},aformat=sample_fmts=s16:channel_layouts=mono[pcm_out];"
+        f"[loud]{LOUDNESS_FILTER}[loud_out]"
+    )
+    if m4a_copy:
+        m4a_args = ["-map", "0:a:0", "-codec:a", "copy", "-movflags", "+faststart", m4a_path]
+    else:
+        m4a_args = ["-map", "[m4a]", *AAC_ARGS, m4a_path]
+    args = [
+        "-filter_complex", graph,
+        *m4a_args,
+        "-map", "[prev_out]", *PREVIEW_ARGS, "-f", "mp3", preview_path,
+        "-map", "[pcm_out]", "-f", "s16le", pcm_path,
+        "-map", "[loud_out]", "-f", "null", "-",
+    ]
+    if mp3_target:
+        args += ["-map", "[mp3]", *MP3_ARGS, "-f", "mp3", mp3_target]
+    if hls_dir:
+        for b in hls_branches:
+            args += ["-map", f"[{b}]"]
+        args += ["-codec:a", "aac"]
+        for i, bitrate in enumerate(HLS_LADDER):
+            args += [f"-b:a:{i}", bitrate]
+        args += [
+            "-f", "hls",
+            "-hls_time", str(HLS_SEGMENT_SECONDS),
+            "-hls_playlist_type", "vod",
+            "-hls_segment_type", "fmp4",
+            "-hls_fmp4_init_filename", "init_%v.mp4",
+            "-hls_segment_filename", os.path.join(hls_dir, "seg_%v_%05d.m4s"),
+            "-master_pl_name", "master.m3u8",
+            "-var_stream_map", " ".join(f"a:{i},name:{bitrate}" for i, bitrate in enumerate(HLS_LADDER)),
+            os.path.join(hls_dir, "index_%v.m3u8"),
+        ]
+    return args
+
+
+def _upload_files_parallel(uploads: list, cache_control=None):
+    """uploads: [(local_path, dest_key, content_type)] -> AUDIO bucket, concurrently."""
+    def _upload(u):
+        local_path, dest_key, content_type = u
+        extra = {"ContentType": content_type}
+        if cache_control:
+            extra["CacheControl"] = cache_control
+        s3.upload_file(local_path, AUDIO_BUCKET, dest_key, ExtraArgs=extra)
+
+    metrics.verbose("Uploading", [f"{local_path} -> s3://{AUDIO_BUCKET}/{dest_key}" for local_path, dest_key, _ in uploads])
+    with metrics.timer("upload"), ThreadPoolExecutor(max_workers=max(1, min(8, len(uploads)))) as pool:
+        list(pool.map(_upload, uploads))
+
+
+def hls_prefix(artist_path: str, album_path: str, base_no_ext: str, content_hash) -> str:
+    """hls/<artist>/<album>/<track>/<hash>.p<PIPELINE_VERSION>: one immutable prefix per render."""
+    render = f"{(content_hash or 'nohash')[:16]}.p{PIPELINE_VERSION}"
+    return f"hls/{artist_path}/{album_path}/{base_no_ext}/{render}"
+
+
+def _hls_uploads(hls_dir: str, dest_prefix: str) -> list:
+    """Every playlist/init/segment file ffmpeg wrote -> upload tuples under dest_prefix."""
+    uploads = []
+    for name in sorted(os.listdir(hls_dir)):
+        ext = os.path.splitext(name)[1].lower()
+        uploads.append((os.path.join(hls_dir, name), f"{dest_prefix}/{name}",
+                        HLS_CONTENT_TYPES.get(ext, "application/octet-stream")))
+    return uploads
+
+
+def process_record(record: dict, workdir: str) -> dict:
+    """
+    Handles one S3 ObjectCreated/ObjectRemoved record. Returns a small status dict for the
+    batch summary. Audio and meta.json events are joined per upload; whichever completes the
+    pair ingests, and audio still alone after META_WAIT_SECONDS ingests without it
+    (META_TIMEOUT_EVENT). Removing a raw audio object removes its track.
+    `workdir` is a private /tmp directory for this record's scratch files.
+    """
+    event_name = record.get("eventName", "")
+    src_key = unquote_plus(record.get("s3", {}).get("object", {}).get("key", ""))
+    lower_key = (src_key or "").lower()
+    if event_name.startswith("ObjectRemoved:") and lower_key.endswith(SUPPORTED_AUDIO_EXTS):
+        return remove_track(src_key)
+    if event_name == META_TIMEOUT_EVENT:
+        return ingest_without_meta(record["s3"]["bucket"]["name"], src_key, workdir)
+    if not event_name.startswith("ObjectCreated:"):
+        return {"key": src_key, "status": "skipped"}
+
+    src_bucket = record["s3"]["bucket"]["name"]
+    src_etag = record["s3"]["object"].get("eTag")
+    group_key = upload_group_key(src_key)
+
+    # Legacy/manual drops without a <ts>__ prefix can never get meta: ingest straight away
+    if not group_key:
         if not lower_key.endswith(SUPPORTED_AUDIO_EXTS):
             print(f"Skipping non-audio object: {src_key}")
-            continue
+            return {"key": src_key, "status": "skipped"}
+        return ingest_track(src_bucket, src_key, src_etag, None, None, None, workdir)
 
-        folder_parts = src_key.split("/")
-        folder_prefix = "/".join(folder_parts[:-1])  # raw/<artist>/<album>
-        filename = folder_parts[-1]
-
-        ts = extract_ts_prefix(filename)
-
-        # Defaults
-        title = title_from_filename(filename)
-        artist_display = "Unknown Artist"
-        album_display = "Unknown Album"
-        track_number = None
-        release_year = None
-        art_key = None
-        meta = None
-        meta_key = None
-
-        # Load meta if we have ts
-        if ts:
-            try:
-                meta, meta_key = load_meta_with_retries(src_bucket, folder_prefix, ts)
-            except Exception as e:
-                print("Meta read error:", str(e))
-                meta = None
-                meta_key = f"{folder_prefix}/{ts}__meta.json"
-
-        # If meta exists, use exact casing + read art_key
-        if isinstance(meta, dict):
-            title = (meta.get("title") or title).strip()
-            artist_display = (meta.get("artist") or artist_display).strip()
-            album_display = (meta.get("album") or album_display).strip()
-            track_number = meta.get("track_number")
-            release_year = meta.get("release_year")
-            art_key = meta.get("art_key") or meta.get("art_path")
-
-        # Decide output paths in AUDIO bucket
-        artist_slug_from_key, album_slug_from_key = parse_artist_album_from_key(src_key)
-        artist_path = slug_for_audio_path(artist_display, artist_slug_from_key or "unknown_artist")
-        album_path = slug_for_audio_path(album_display, album_slug_from_key or "unknown_album")
-
-        track_id = f"trk_{uuid.uuid4().hex[:8]}"
-
-        # --- AUDIO: copy or transcode to MP3 ---
-        normalized_filename = normalize_filename(filename)
-
-        if lower_key.endswith(".mp3"):
-            dest_key = f"tracks/{artist_path}/{album_path}/{normalized_filename}"
-            print(f"Copying MP3 to audio bucket: s3://{src_bucket}/{src_key} -> s3://{AUDIO_BUCKET}/{dest_key}")
-
-            s3.copy_object(
-                CopySource={"Bucket": src_bucket, "Key": src_key},
-                Bucket=AUDIO_BUCKET,
-                Key=dest_key,
-                ContentType="audio/mpeg",
-                MetadataDirective="REPLACE",
+    # --- JOIN: audio + meta may arrive in either order; never sleep waiting on S3 ---
+    if _is_meta_key(src_key):
+        folder_prefix, _, filename = src_key.rpartition("/")
+        meta, meta_key = try_load_meta(src_bucket, folder_prefix, extract_ts_prefix(filename))
+        if not isinstance(meta, dict):
+            print(f"Meta object missing or invalid: {src_key}")
+            return {"key": src_key, "status": "skipped"}
+        pending = record_pending_half(group_key, {"meta": meta, "meta_key": meta_key})
+    elif lower_key.endswith(SUPPORTED_AUDIO_EXTS):
+        pending = record_pending_half(group_key, {"audio_key": src_key, "audio_etag": src_etag})
+    elif _is_image_key(src_key):
+        # Art isn't a join half; just remember where it is for the cover stage
+        record_pending_half(group_key, {"art_key": src_key})
+        return {"key": src_key, "status": "skipped"}
+    else:
+        print(f"Skipping unrecognized object: {src_key}")
+        return {"key": src_key, "status": "skipped"}
+
+    if not (pending.get("audio_key") and isinstance(pending.get("meta"), dict)):
+        print(f"Waiting for other half of {group_key}")
+        if src_key == pending.get("audio_key"):
+            schedule_meta_timeout(src_bucket, src_key)
+        return {"key": src_key, "status": "pending"}
+
+    if not claim_pending(group_key):
+        print(f"Join for {group_key} already claimed/ingested; skipping")
+        return {"key": src_key, "status": "skipped"}
+
+    try:
+        art_key = pending.get("art_key")
+        if not art_key and not pending["meta"].get("art_key"):
+            art_key = find_upload_art(src_bucket, group_key)
+        result = ingest_track(
+            src_bucket, pending["audio_key"], pending.get("audio_etag"), pending["meta"],
+            pending.get("meta_key"), art_key, workdir,
+            # meta.json after the timeout ingest: the row is rewritten with it
+            reindex=bool(pending.get("ingested_without_meta")),
+        )
+    except Exception:
+        release_pending(group_key, ingested=False)
+        raise
+    release_pending(group_key, ingested=True, audio_etag=pending.get("audio_etag"))
+    return result
+
+
+_MP3_BITRATES_KBPS = (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320)
+_MP3_SAMPLE_RATES = (44100, 48000, 32000)
+
+
+def _mp3_frame_len(data: bytes, pos: int) -> int:
+    """Byte length of the MPEG-1 Layer III frame at pos (what libmp3lame emits at 44.1k)."""
+    h = data[pos:pos + 4]
+    if len(h) < 4 or h[0] != 0xFF or (h[1] & 0xFE) != 0xFA:
+        raise ValueError(f"Bad MP3 frame header at byte {pos}")
+    bitrate = _MP3_BITRATES_KBPS[h[2] >> 4]
+    sample_rate = _MP3_SAMPLE_RATES[(h[2] >> 2) & 0x03]
+    return 144000 * bitrate // sample_rate + ((h[2] >> 1) & 0x01)
+
+
+def _adts_frame_len(data: bytes, pos: int) -> int:
+    """Byte length of the ADTS AAC frame at pos (one raw data block = 1024 samples)."""
+    h = data[pos:pos + 7]
+    if len(h) < 7 or h[0] != 0xFF or (h[1] & 0xF0) != 0xF0 or (h[6] & 0x03) != 0:
+        raise ValueError(f"Bad ADTS frame header at byte {pos}")
+    return ((h[3] & 0x03) << 11) | (h[4] << 3) | (h[5] >> 5)
+
+
+def _slice_frames(data: bytes, frame_len, skip: int, count):
+    """
+    Bytes of frames [skip, skip + count) (count=None: through the end) and the frame count.
+    Walks every header, so truncated or misaligned output raises instead of joining badly.
+    """
+    pos = n = 0
+    start = None
+    while pos < len(data):
+        if n == skip:
+            start = pos
+        if count is not None and n == skip + count:
+            return data[start:pos], count
+        pos += frame_len(data, pos)
+        n += 1
+    if pos != len(data):
+        raise ValueError("Trailing partial frame")
+    if count is not None and n == skip + count:
+        return data[start:], count
+    if start is None or count is not None:
+        raise ValueError(f"Chunk too short: {n} frames, wanted {skip}+{count}")
+    return data[start:], n - skip
+
+
+def plan_chunks(duration: float) -> list:
+    """Sample ranges (at CHUNK_SAMPLE_RATE) on the CHUNK_GRID, each with pre-roll for encoder warm-up."""
+    total = int(duration * CHUNK_SAMPLE_RATE)
+    size = (CHUNK_SECONDS * CHUNK_SAMPLE_RATE // CHUNK_GRID) * CHUNK_GRID
+    jobs = []
+    for start in range(0, total, size):
+        jobs.append({
+            "index": len(jobs),
+            "start": start,
+            "preroll": min(CHUNK_ROLL, start),
+            "keep": min(size, total - start),
+            "last": start + size >= total,
+        })
+    return jobs
+
+
+def transcode_chunk(job: dict) -> dict:
+    """
+    Encodes one time range of the source to MP3 (no bit reservoir, no Xing/ID3 frames) and
+    ADTS AAC, plus its slice of the PCM analysis tap and its loudness. Pre-roll/post-roll frames are cut at
+    exact frame boundaries so chunks concatenate without gaps or overlap. The trimmed
+    outputs go to scratch keys under job["work_prefix"] in the AUDIO bucket.
+    """
+    url = s3.generate_presigned_url(
+        "get_object", Params={"Bucket": job["src_bucket"], "Key": job["src_key"]}, ExpiresIn=900
+    )
+    preroll, keep, last = job["preroll"], job["keep"], job["last"]
+    seek = (job["start"] - preroll) / CHUNK_SAMPLE_RATE
+    window = "" if last else f"atrim=end_sample={preroll + keep + CHUNK_ROLL},"
+    graph = (
+        f"[0:a]aresample={CHUNK_SAMPLE_RATE},{window}asplit=3[mp3][aac][ana];"
+        f"[ana]atrim=start_sample={preroll}:end_sample={preroll + keep},asetpts=PTS-STARTPTS,asplit=2[pcm][loud];"
+        f"[pcm]aresample={ANALYSIS_SAMPLE_RATE},aformat=sample_fmts=s16:channel_layouts=mono[pcm_out];"
+        f"[loud]{LOUDNESS_FILTER}[loud_out]"
+    )
+
+    with tempfile.TemporaryDirectory(prefix="chunk_", dir="/tmp") as tmp:
+        out = {ext: os.path.join(tmp, f"out.{ext}") for ext in ("mp3", "aac", "pcm")}
+        stderr = subprocess.run(
+            [FFMPEG_BIN, "-y", "-nostats", "-loglevel", "info", "-ss", f"{seek:.6f}", "-i", url, "-filter_complex", graph,
+             "-map", "[mp3]", *MP3_ARGS, "-reservoir", "0", "-write_xing", "0", "-id3v2_version", "0",
+             "-f", "mp3", out["mp3"],
+             "-map", "[aac]", "-codec:a", "aac", "-b:a", AAC_BITRATE,
+             "-f", "adts", out["aac"],
+             "-map", "[pcm_out]", "-f", "s16le", out["pcm"],
+             "-map", "[loud_out]", "-f", "null", "-"],
+            check=True, stderr=subprocess.PIPE,
+        ).stderr.decode("utf-8", errors="replace")
+        with open(out["mp3"], "rb") as f:
+            mp3_bytes, mp3_frames = _slice_frames(
+                f.read(), _mp3_frame_len, preroll // MP3_FRAME_SAMPLES, None if last else keep // MP3_FRAME_SAMPLES
             )
-            stream_path = dest_key
-            source_format = "mp3"
-        else:
-            base_no_ext = normalized_filename.rsplit(".", 1)[0]
-            mp3_name = f"{base_no_ext}.mp3"
+        with open(out["aac"], "rb") as f:
+            aac_bytes, aac_frames = _slice_frames(
+                f.read(), _adts_frame_len, preroll // AAC_FRAME_SAMPLES, None if last else keep // AAC_FRAME_SAMPLES
+            )
+        with open(out["pcm"], "rb") as f:
+            pcm_bytes = f.read()
+
+    i = job["index"]
+    s3.put_object(Bucket=AUDIO_BUCKET, Key=f"{job['work_prefix']}/{i}.mp3", Body=mp3_bytes)
+    s3.put_object(Bucket=AUDIO_BUCKET, Key=f"{job['work_prefix']}/{i}.aac", Body=aac_bytes)
+    s3.put_object(Bucket=AUDIO_BUCKET, Key=f"{job['work_prefix']}/{i}.pcm", Body=pcm_bytes)
+
+    return {
+        "index": i,
+        "mp3_frames": mp3_frames,
+        "aac_frames": aac_frames,
+        "mp3_header": mp3_bytes[1:3].hex() if mp3_bytes else None,
+        **parse_loudness(stderr),
+    }
+
+
+def _dispatch_chunk(job: dict) -> dict:
+    if not INGEST_CHUNK_FANOUT:
+        return transcode_chunk(job)
+    resp = lambda_client.invoke(
+        FunctionName=os.environ["AWS_LAMBDA_FUNCTION_NAME"],
+        InvocationType="RequestResponse",
+        Payload=json.dumps({"chunk_job": job}).encode("utf-8"),
+    )
+    payload = json.loads(resp["Payload"].read() or b"{}")
+    if resp.get("FunctionError"):
+        raise RuntimeError(f"Chunk {job['index']} failed: {payload.get('errorMessage')}")
+    return payload
+
+
+def verify_chunk_joins(jobs: list, results: list):
+    """
+    Gapless check: every non-final chunk must contribute exactly its sample range in whole
+    frames of both codecs, with one MP3 stream format throughout, and the joined stream may only
+    exceed the source by encoder delay + padding.
+    """
+    total = sum(j["keep"] for j in jobs)
+    headers = set()
+    for job, res in zip(jobs, results):
+        if not job["last"]:
+            if res["mp3_frames"] * MP3_FRAME_SAMPLES != job["keep"] or res["aac_frames"] * AAC_FRAME_SAMPLES != job["keep"]:
+                raise ValueError(f"Chunk {job['index']} join is not gapless: {res}")
+        # Padding bit (0x02 of byte 2) legitimately varies frame to frame
+        if res.get("mp3_header"):
+            headers.add(int(res["mp3_header"], 16) & ~0x02)
+    if len(headers) > 1:
+        raise ValueError(f"Chunk MP3 formats differ: {headers}")
 
-            local_in = f"/tmp/{normalized_filename}"
-            local_mp3 = f"/tmp/{mp3_name}"
-            dest_key = f"tracks/{artist_path}/{album_path}/{mp3_name}"
+    for frames_key, frame in (("mp3_frames", MP3_FRAME_SAMPLES), ("aac_frames", AAC_FRAME_SAMPLES)):
+        extra = sum(r[frames_key] for r in results) * frame - total
+        if not 0 <= extra <= 3 * frame:
+            raise ValueError(f"Joined {frames_key} off by {extra} samples")
 
-            print(f"Downloading source: s3://{src_bucket}/{src_key} -> {local_in}")
-            s3.download_file(src_bucket, src_key, local_in)
 
-            print("Running ffmpeg transcoding to MP3...")
-            subprocess.run(
-                ["/opt/bin/ffmpeg", "-y", "-i", local_in, "-vn", "-codec:a", "libmp3lame", "-b:a", "192k", local_mp3],
-                check=True
+def combine_chunk_loudness(jobs: list, results: list) -> dict:
+    """
+    Whole-track loudness from per-chunk measurements: duration-weighted energy mean of the
+    chunks' integrated loudness, max of their true peaks. The R128 relative gate is applied
+    per chunk, so long quiet passages can shift this slightly from a single-pass measurement.
+    """
+    loudness = {}
+    measured = [(j["keep"], r["loudness_lufs"]) for j, r in zip(jobs, results) if "loudness_lufs" in r]
+    if measured:
+        energy = sum(n * 10 ** (lufs / 10) for n, lufs in measured) / sum(n for n, _ in measured)
+        loudness["loudness_lufs"] = 10 * math.log10(energy)
+    peaks = [r["true_peak_dbtp"] for r in results if "true_peak_dbtp" in r]
+    if peaks:
+        loudness["true_peak_dbtp"] = max(peaks)
+    return loudness
+
+
+def render_audio_chunked(src_bucket: str, src_key: str, rendition: dict, duration: float, workdir: str) -> dict:
+    """
+    Long-form AUDIO stage: chunks transcode in parallel (local processes or fan-out), then
+    - MP3: chunk objects are joined server-side as multipart parts (UploadPartCopy)
+    - M4A: ADTS chunks are streamed through ffmpeg -c copy into a faststart M4A
+    - preview: first PREVIEW_SECONDS of MP3 frames; PCM tap: chunk slices concatenated
+    No HLS ladder in this mode.
+    """
+    work_prefix = f"{CHUNK_WORK_PREFIX}/{hashlib.sha256(src_key.encode('utf-8')).hexdigest()[:16]}"
+    jobs = plan_chunks(duration)
+    for job in jobs:
+        job.update(src_bucket=src_bucket, src_key=src_key, work_prefix=work_prefix)
+    print(f"Chunked transcode of {src_key}: {len(jobs)} chunks ({'fan-out' if INGEST_CHUNK_FANOUT else 'local'})")
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(INGEST_CHUNK_WORKERS, len(jobs)))) as pool:
+            results = sorted(pool.map(_dispatch_chunk, jobs), key=lambda r: r["index"])
+        verify_chunk_joins(jobs, results)
+
+        # MP3: server-side concatenation, no bytes pass through this function
+        upload_id = s3.create_multipart_upload(
+            Bucket=AUDIO_BUCKET, Key=rendition["stream_path"], ContentType="audio/mpeg"
+        )["UploadId"]
+        try:
+            parts = []
+            for job in jobs:
+                resp = s3.upload_part_copy(
+                    Bucket=AUDIO_BUCKET, Key=rendition["stream_path"], UploadId=upload_id,
+                    PartNumber=job["index"] + 1,
+                    CopySource={"Bucket": AUDIO_BUCKET, "Key": f"{work_prefix}/{job['index']}.mp3"},
+                )
+                parts.append({"PartNumber": job["index"] + 1, "ETag": resp["CopyPartResult"]["ETag"]})
+            s3.complete_multipart_upload(
+                Bucket=AUDIO_BUCKET, Key=rendition["stream_path"], UploadId=upload_id,
+                MultipartUpload={"Parts": parts},
             )
+        except Exception:
+            s3.abort_multipart_upload(Bucket=AUDIO_BUCKET, Key=rendition["stream_path"], UploadId=upload_id)
+            raise
+
+        # M4A: remux the joined ADTS stream (stream copy, no re-encode)
+        local_m4a = os.path.join(workdir, "chunked.m4a")
+        proc = subprocess.Popen(
+            [FFMPEG_BIN, "-y", "-f", "adts", "-i", "pipe:0", "-codec:a", "copy", "-movflags", "+faststart", local_m4a],
+            stdin=subprocess.PIPE,
+        )
+        try:
+            for job in jobs:
+                body = s3.get_object(Bucket=AUDIO_BUCKET, Key=f"{work_prefix}/{job['index']}.aac")["Body"]
+                for chunk in body.iter_chunks(STREAM_CHUNK_SIZE):
+                    proc.stdin.write(chunk)
+        finally:
+            proc.stdin.close()
+            rc = proc.wait()
+        if rc != 0:
+            raise subprocess.CalledProcessError(rc, FFMPEG_BIN)
+
+        # Preview: leading frames of the first chunk (same 192k encode)
+        first = s3.get_object(Bucket=AUDIO_BUCKET, Key=f"{work_prefix}/0.mp3")["Body"].read()
+        preview_frames = -(-PREVIEW_SECONDS * CHUNK_SAMPLE_RATE // MP3_FRAME_SAMPLES)
+        preview, _ = _slice_frames(first, _mp3_frame_len, 0, min(preview_frames, results[0]["mp3_frames"]))
+        s3.put_object(Bucket=AUDIO_BUCKET, Key=rendition["preview_path"], Body=preview, ContentType="audio/mpeg")
+
+        with open(rendition["pcm_file"], "wb") as f:
+            for job in jobs:
+                f.write(s3.get_object(Bucket=AUDIO_BUCKET, Key=f"{work_prefix}/{job['index']}.pcm")["Body"].read())
+
+        _set_analysis(rendition, combine_chunk_loudness(jobs, results))
+
+        _upload_files_parallel([(local_m4a, rendition["aac_path"], "audio/mp4")])
+    finally:
+        scratch = [{"Key": f"{work_prefix}/{job['index']}.{ext}"} for job in jobs for ext in ("mp3", "aac", "pcm")]
+        for i in range(0, len(scratch), 1000):
+            s3.delete_objects(Bucket=AUDIO_BUCKET, Delete={"Objects": scratch[i:i + 1000], "Quiet": True})
+
+    return rendition
+
+
+def _set_analysis(rendition: dict, loudness: dict):
+    """Loudness + exact duration (from the PCM tap) onto the rendition, as DynamoDB Decimals."""
+    for field, value in loudness.items():
+        rendition[field] = Decimal(str(round(value, 2)))
+    duration = pcm_duration(rendition["pcm_file"])
+    if duration:
+        rendition["duration"] = duration  # replaces the container's (probe) estimate
+    print(f"Analysis: {loudness}, duration {duration}s")
+
+
+def render_audio(src_bucket: str, src_key: str, artist_path: str, album_path: str, workdir: str,
+                 content_hash=None) -> dict:
+    """
+    AUDIO stage: probe the source, then one ffmpeg run decodes it once and emits every
+    rendition (MP3, M4A, preview clip, PCM analysis tap, HLS ladder when INGEST_HLS) and
+    measures loudness/true peak/exact duration; file outputs are uploaded in parallel.
+    plan_audio picks copy/remux over encode where the source already fits the target;
+    long sources that need a full encode go through render_audio_chunked instead.
+    Returns the RENDITION_FIELDS plus "pcm_file" (local path, valid for this invocation only).
+    """
+    lower_key = (src_key or "").lower()
+    normalized_filename = normalize_filename(src_key.split("/")[-1])
+    base_no_ext = normalized_filename.rsplit(".", 1)[0]
+    prefix = f"tracks/{artist_path}/{album_path}"
+
+    with metrics.timer("probe"):
+        probe = probe_audio(src_bucket, src_key)
+    plan = plan_audio(probe, lower_key)
+    print(f"Probe {src_key}: {probe} -> plan {plan}")
+
+    aac_path = f"{prefix}/{base_no_ext}.m4a"
+    if plan["mp3"] == "copy":
+        stream_path = f"{prefix}/{normalized_filename}"
+    elif plan["mp3"] == "encode":
+        stream_path = f"{prefix}/{base_no_ext}.mp3"
+    else:
+        stream_path = aac_path
+
+    rendition = {
+        "stream_path": stream_path,
+        "source_format": normalized_filename.rsplit(".", 1)[-1].lower(),
+        "aac_path": aac_path,
+        "preview_path": f"{prefix}/{base_no_ext}.preview.mp3",
+        "pcm_file": os.path.join(workdir, "analysis.pcm"),
+    }
+    if probe:
+        rendition["source_codec"] = probe.get("codec")
+        rendition["source_bitrate"] = probe.get("bitrate")
+        if probe.get("duration"):
+            rendition["duration"] = Decimal(str(round(probe["duration"], 3)))
+
+    if (
+        probe and (probe.get("duration") or 0) >= INGEST_CHUNKED_MIN_SECONDS
+        and plan["mp3"] == "encode" and plan["m4a"] == "encode"
+    ):
+        return render_audio_chunked(src_bucket, src_key, rendition, probe["duration"], workdir)
+
+    hls_dir = None
+    if INGEST_HLS:
+        hls_dir = os.path.join(workdir, "hls")
+        os.makedirs(hls_dir, exist_ok=True)
+        rendition["manifest_path"] = f"{hls_prefix(artist_path, album_path, base_no_ext, content_hash)}/master.m3u8"
+    local_m4a = os.path.join(workdir, f"{base_no_ext}.m4a")
+    local_preview = os.path.join(workdir, f"{base_no_ext}.preview.mp3")
+    uploads = [
+        (local_m4a, rendition["aac_path"], "audio/mp4"),
+        (local_preview, rendition["preview_path"], "audio/mpeg"),
+    ]
+    m4a_copy = plan["m4a"] == "copy"
+
+    if plan["mp3"] == "copy":
+        print(f"Copying MP3 to audio bucket: s3://{src_bucket}/{src_key} -> s3://{AUDIO_BUCKET}/{stream_path}")
+        s3.copy_object(
+            CopySource={"Bucket": src_bucket, "Key": src_key},
+            Bucket=AUDIO_BUCKET,
+            Key=stream_path,
+            ContentType="audio/mpeg",
+            MetadataDirective="REPLACE",
+        )
+
+    if INGEST_STREAMING and not lower_key.endswith(SEEKABLE_INPUT_EXTS):
+        # MP3 rendition streams straight to S3 via stdout; the small outputs land in workdir
+        mp3_dest = stream_path if plan["mp3"] == "encode" else None
+        print(f"Streaming renditions: s3://{src_bucket}/{src_key} -> s3://{AUDIO_BUCKET}/{prefix}/")
+        stderr = _stream_transcode_to_s3(
+            src_bucket, src_key, AUDIO_BUCKET, mp3_dest,
+            _rendition_args("pipe:1" if mp3_dest else None, local_m4a, local_preview, rendition["pcm_file"],
+                            hls_dir, m4a_copy=m4a_copy),
+            "audio/mpeg",
+        )
+    else:
+        local_in = os.path.join(workdir, normalized_filename)
+        local_mp3 = os.path.join(workdir, f"{base_no_ext}.mp3") if plan["mp3"] == "encode" else None
+
+        print(f"Downloading source: s3://{src_bucket}/{src_key} -> {local_in}")
+        s3.download_file(src_bucket, src_key, local_in)
+        try:
+            print("Running ffmpeg renditions...")
+            stderr = subprocess.run(
+                [FFMPEG_BIN, "-y", "-nostats", "-loglevel", "info", "-i", local_in,
+                 *_rendition_args(local_mp3, local_m4a, local_preview, rendition["pcm_file"],
+                                  hls_dir, m4a_copy=m4a_copy)],
+                check=True, stderr=subprocess.PIPE,
+            ).stderr.decode("utf-8", errors="replace")
+        except subprocess.CalledProcessError as e:
+            print("ffmpeg stderr (tail):", (e.stderr or b"")[-2000:].decode("utf-8", errors="replace"))
+            raise
+        finally:
+            os.remove(local_in)
+        if local_mp3:
+            uploads.append((local_mp3, stream_path, "audio/mpeg"))
+
+    _set_analysis(rendition, parse_loudness(stderr))
+
+    _upload_files_parallel(uploads)
+    if hls_dir:
+        _upload_files_parallel(
+            _hls_uploads(hls_dir, rendition["manifest_path"].rsplit("/", 1)[0]),
+            cache_control=IMMUTABLE_CACHE_CONTROL,
+        )
+        shutil.rmtree(hls_dir, ignore_errors=True)  # the ladder is most of this record's /tmp
+    return rendition
+
+
+def decode_analysis_pcm(src_bucket: str, src_key: str, pcm_path: str):
+    """
+    Decodes only the mono PCM analysis tap (ffmpeg over a presigned URL). Used when the
+    render ran in an earlier invocation, so its pcm_file is gone.
+    """
+    url = s3.generate_presigned_url("get_object", Params={"Bucket": src_bucket, "Key": src_key}, ExpiresIn=900)
+    try:
+        subprocess.run(
+            [FFMPEG_BIN, "-y", "-v", "error", "-i", url, "-vn",
+             "-ac", "1", "-ar", str(ANALYSIS_SAMPLE_RATE), "-f", "s16le", pcm_path],
+            check=True, capture_output=True,
+        )
+    except subprocess.CalledProcessError as e:
+        # The exception's cmd holds the presigned URL; keep it out of the logs
+        raise RuntimeError(f"PCM decode failed for {src_key} (ffmpeg exit {e.returncode})") from None
+
+
+def compute_peaks(pcm_path: str) -> bytes:
+    """
+    Interleaved int8 [min0, max0, min1, max1, ...] over WAVEFORM_WINDOW_SAMPLES windows of
+    a mono s16le file (samples >> 8). The last partial window is kept as its own pair.
+    """
+    if np is not None:
+        samples = np.fromfile(pcm_path, dtype="<i2")
+        full = len(samples) // WAVEFORM_WINDOW_SAMPLES * WAVEFORM_WINDOW_SAMPLES
+        windows = [samples[:full].reshape(-1, WAVEFORM_WINDOW_SAMPLES)]
+        if full < len(samples):
+            windows.append(samples[full:].reshape(1, -1))
+        peaks = np.concatenate([
+            np.stack([w.min(axis=1), w.max(axis=1)], axis=1) for w in windows if w.size
+        ]) if len(samples) else np.empty((0, 2), dtype="<i2")
+        return (peaks >> 8).astype(np.int8).tobytes()
+
+    samples = array("h")
+    with open(pcm_path, "rb") as f:
+        data = f.read()
+    samples.frombytes(data[:len(data) // 2 * 2])
+    peaks = array("b")
+    for i in range(0, len(samples), WAVEFORM_WINDOW_SAMPLES):
+        window = samples[i:i + WAVEFORM_WINDOW_SAMPLES]
+        peaks.extend((min(window) >> 8, max(window) >> 8))
+    return peaks.tobytes()
+
+
+def build_waveform(src_bucket: str, src_key: str, track_id: str, pcm_file, workdir: str) -> str:
+    """
+    ANALYSIS stage: peaks from this invocation's PCM tap (or a fresh decode) uploaded to
+    waveforms/<track_id>.bin. Returns the waveform path.
+    """
+    waveform_path = f"waveforms/{track_id}.bin"
+    if not (pcm_file and os.path.exists(pcm_file)):
+        if _head_exists(AUDIO_BUCKET, waveform_path):
+            return waveform_path  # dedup hit: the rendition owner already has one
+        pcm_file = os.path.join(workdir, "analysis.pcm")
+        decode_analysis_pcm(src_bucket, src_key, pcm_file)
+
+    peaks = compute_peaks(pcm_file)
+    s3.put_object(
+        Bucket=AUDIO_BUCKET, Key=waveform_path, Body=peaks,
+        ContentType="application/octet-stream", CacheControl=WAVEFORM_CACHE_CONTROL,
+    )
+    print(f"Waveform {waveform_path}: {len(peaks) // 2} peak pairs")
+    return waveform_path
+
+
+def ingest_track(src_bucket: str, src_key: str, src_etag, meta, meta_key, pending_art_key, workdir: str,
+                 reindex: bool = False) -> dict:
+    """
+    Transcodes/copies one audio object, normalizes cover art and writes the track item.
+    `meta` is the parsed <ts>__meta.json (or None when the upload has no ts prefix, or its
+    meta.json didn't arrive within META_WAIT_SECONDS); fields it lacks (and the cover, when
+    no art was uploaded) come from the audio's tags.
+
+    Runs as checkpointed stages (INGEST_STAGES); a retry/replay resumes at the first
+    incomplete one, and a version of src_key that is fully indexed is a no-op before
+    any download. reindex re-runs the cover and index stages (late meta.json).
+    """
+    version = source_version(src_bucket, src_key, src_etag)
+    ckpt = load_checkpoint(src_key, version)
+    stages = ckpt["stages"]
+    if reindex:
+        for stage in ("cover_done", "indexed"):
+            stages.pop(stage, None)
+    if "indexed" in stages:
+        print(f"Already ingested {version} as {ckpt.get('track_id')}; skipping")
+        return {"key": src_key, "status": "duplicate", "track_id": ckpt.get("track_id")}
+    if stages:
+        resume_at = next(stage for stage in INGEST_STAGES if stage not in stages)
+        print(f"Resuming {version} at stage {resume_at}")
+
+    filename = src_key.split("/")[-1]
+
+    # Defaults
+    title = title_from_filename(filename)
+    artist_display = "Unknown Artist"
+    album_display = "Unknown Album"
+    art_key = pending_art_key
 
-            print(f"Uploading MP3: {local_mp3} -> s3://{AUDIO_BUCKET}/{dest_key}")
-            s3.upload_file(local_mp3, AUDIO_BUCKET, dest_key, ExtraArgs={"ContentType": "audio/mpeg"})
+    meta = meta if isinstance(meta, dict) else {}
+    art_key = meta.get("art_key") or meta.get("art_path") or art_key
 
-            stream_path = dest_key
-            source_format = normalized_filename.rsplit(".", 1)[-1].lower()
+    # Embedded tags fill whatever meta.json doesn't give us (no-ts uploads have no meta at all)
+    tags = {}
+    if not all(meta.get(k) for k in ("title", "artist", "album", "track_number", "release_year")) \
+            or not (art_key and _is_image_key(art_key)):
+        tags = read_source_tags(src_bucket, src_key)
 
-        # --- ALBUM ART: normalize to a single cover.jpg in AUDIO bucket ---
+    # meta.json (exact casing) > embedded tags > defaults
+    title = (meta.get("title") or tags.get("title") or title).strip()
+    artist_display = (meta.get("artist") or tags.get("artist") or artist_display).strip()
+    album_display = (meta.get("album") or tags.get("album") or album_display).strip()
+    track_number = meta.get("track_number") or tags.get("track_number")
+    release_year = meta.get("release_year") or tags.get("release_year")
+
+    # Decide output paths in AUDIO bucket
+    artist_slug_from_key, album_slug_from_key = parse_artist_album_from_key(src_key)
+    artist_path = slug_for_audio_path(artist_display, artist_slug_from_key or "unknown_artist")
+    album_path = slug_for_audio_path(album_display, album_slug_from_key or "unknown_album")
+
+    # --- STAGE hashed: streaming content hash of the raw object ---
+    if "hashed" in stages:
+        content_hash = ckpt["content_hash"]
+    else:
+        started = time.perf_counter()
+        content_hash = hash_s3_object(src_bucket, src_key)
+        save_stage(ckpt, "hashed", started, content_hash=content_hash)
+
+    # --- STAGE uploaded: rendition in the AUDIO bucket (dedup hit, copy or transcode) ---
+    # Transcode and upload are one step (streamed), so the upload is the durable checkpoint.
+    if "uploaded" in stages:
+        track_id = ckpt["track_id"]
+        rendition_track_id = ckpt.get("rendition_track_id", track_id)
+        rendition = {k: ckpt.get(k) for k in RENDITION_FIELDS}
+    else:
+        started = time.perf_counter()
+        track_id = track_id_for_key(src_key)
+        rendition_track_id = track_id
+        existing = lookup_rendition(content_hash)
+
+        # Identical source bytes reuse the existing rendition; the track stays this
+        # source's own (the same single on an album and a compilation is two tracks)
+        if existing and _head_exists(AUDIO_BUCKET, existing["stream_path"]):
+            print(f"Dedup hit for {src_key}: reusing {existing['stream_path']} ({existing['track_id']})")
+            metrics.count("dedup_hits")
+            rendition_track_id = existing["track_id"]
+            rendition = {k: existing.get(k) for k in RENDITION_FIELDS}
+        else:
+            with metrics.timer("transcode"):
+                rendition = render_audio(src_bucket, src_key, artist_path, album_path, workdir, content_hash)
+            register_rendition(content_hash, track_id, rendition)
+
+        save_stage(ckpt, "uploaded", started, track_id=track_id, rendition_track_id=rendition_track_id,
+                   **{k: rendition.get(k) for k in RENDITION_FIELDS})
+
+    # --- STAGE analyzed: waveform peaks from the PCM tap ---
+    if "analyzed" in stages:
+        waveform_path = ckpt.get("waveform_path")
+    else:
+        started = time.perf_counter()
+        try:
+            # Peaks depend only on the bytes: a dedup hit shares the rendition owner's waveform
+            waveform_path = build_waveform(src_bucket, src_key, rendition_track_id, rendition.get("pcm_file"), workdir)
+        except Exception as e:
+            # A missing waveform only costs the seek bar its shape; don't fail the track
+            print("Waveform error:", str(e))
+            waveform_path = None
+        save_stage(ckpt, "analyzed", started, waveform_path=waveform_path)
+
+    # --- STAGE cover_done: one cover (+ size ladder) per album, built by exactly one worker ---
+    if "cover_done" in stages:
+        art_path = ckpt.get("art_path")
+        art_variants = ckpt.get("art_variants")
+    else:
+        started = time.perf_counter()
         # Canonical cover location (one per album)
-        cover_dest_key = f"albums/{artist_path}/{album_path}/cover.jpg"
-        art_path = None
+        cover_prefix = f"albums/{artist_path}/{album_path}"
 
         try:
-            # If cover already exists, reuse it (dedupe)
-            if _head_exists(AUDIO_BUCKET, cover_dest_key):
-                art_path = cover_dest_key
-            else:
-                # If meta provided an art_key and it exists and is image, copy/convert it
-                if art_key and _is_image_key(art_key):
-                    print(f"Creating album cover in audio bucket: {cover_dest_key} from raw {art_key}")
-                    _copy_image_to_audio_as_jpg(src_bucket, art_key, AUDIO_BUCKET, cover_dest_key)
-                    art_path = cover_dest_key
-                else:
-                    # No art uploaded this time; leave art_path empty
-                    art_path = None
+            art_path, art_variants = ensure_album_cover(src_bucket, art_key, cover_prefix, workdir,
+                                                        tags.get("picture"))
+        except CoverPending:
+            raise  # retried by the queue; don't checkpoint a track without its album's cover
         except Exception as e:
             print("Album art processing error:", str(e))
             art_path = None
+            art_variants = None
 
-        # --- Write DynamoDB ---
-        item = {
-            "track_id": track_id,
-            "title": title,                 # exact casing (from meta)
-            "artist": artist_display,       # exact casing (from meta)
-            "album": album_display,         # exact casing (from meta)
-            "track_number": track_number,
-            "release_year": release_year,
-            "stream_path": stream_path,
-            "source_format": source_format,
+        save_stage(ckpt, "cover_done", started, art_path=art_path, art_variants=art_variants)
 
-            # NEW: canonical art path in AUDIO bucket (CloudFront will serve this)
-            "art_path": art_path,
+    # --- STAGE indexed: write DynamoDB ---
+    started = time.perf_counter()
+    item = {
+        "track_id": track_id,
+        "title": title,                 # exact casing (from meta, else tags)
+        "artist": artist_display,       # exact casing (from meta, else tags)
+        "album": album_display,         # exact casing (from meta, else tags)
+        "track_number": track_number,
+        "release_year": release_year,
+        "stream_path": rendition["stream_path"],
+        "source_format": rendition.get("source_format"),
+        "aac_path": rendition.get("aac_path"),
+        "preview_path": rendition.get("preview_path"),
+        "manifest_path": rendition.get("manifest_path"),
+        "duration": rendition.get("duration"),
+        "source_codec": rendition.get("source_codec"),
+        "source_bitrate": rendition.get("source_bitrate"),
+        "loudness_lufs": rendition.get("loudness_lufs"),    # EBU R128 integrated (for client-side gain)
+        "true_peak_dbtp": rendition.get("true_peak_dbtp"),
+        "content_hash": content_hash,
+        "waveform_path": waveform_path,  # int8 [min, max] pairs, WAVEFORM_WINDOW_SAMPLES at 8kHz
+
+        # NEW: canonical art path in AUDIO bucket (CloudFront will serve this)
+        "art_path": art_path,
+        "art_variants": art_variants,   # {"jpg"|"webp": {"64"|"256"|"640"|"original": path}}
+
+        # Debug
+        "raw_key": src_key,
+        "meta_key": meta_key,
+        "source_version": version,
+    }
+
+    # Remove null/empty values
+    item = {k: v for k, v in item.items() if v is not None and v != ""}
+    # Position in the sorted catalog-order index (paged /tracks)
+    item.update(catalog_index.catalog_keys(item))
+
+    metrics.verbose("Writing DynamoDB item", item)
+    # Same object version already written (racing redelivery) -> leave the row alone,
+    # unless this is the reindex with a late meta.json
+    condition = {} if reindex else {
+        "ConditionExpression": "attribute_not_exists(track_id) OR source_version <> :sv",
+        "ExpressionAttributeValues": {":sv": version},
+    }
+    try:
+        resp = _tracks_table().put_item(Item=item, ReturnValues="ALL_OLD", **condition)
+        change = "update" if resp.get("Attributes") else "insert"
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
+        print(f"Track {track_id} already written for {version}")
+        # Logged again: the earlier attempt may have died between the write and its log entry
+        change = "update"
+
+    record_catalog_change(track_id, change)
+    save_stage(ckpt, "indexed", started)
+    return {
+        "key": src_key,
+        "status": "ingested",
+        "track_id": track_id,
+        "stage_ms": {k: int(v["ms"]) for k, v in ckpt["stages"].items()},
+    }
+
+
+def record_catalog_change(track_id: str, op: str) -> int:
+    """
+    Appends op (insert/update/delete) on track_id to the catalog change log; returns its
+    version. Called after the tracks row is written, so every change <= a version read from
+    the counter is already visible in the table. The counter bump and the entry are two
+    writes: a lost entry leaves a version gap, which readers answer with a resync.
+    """
+    now = int(time.time())
+    resp = _state_table().update_item(
+        Key=catalog_index.CATALOG_VERSION_KEY,
+        UpdateExpression="ADD version :one SET updated_at = :now",
+        ExpressionAttributeValues={":one": 1, ":now": now},
+        ReturnValues="UPDATED_NEW",
+    )
+    version = int(resp["Attributes"]["version"])
+    _state_table().put_item(Item={
+        "pk": catalog_index.CHANGES_PK,
+        "sk": catalog_index.change_sk(version),
+        "version": version,
+        "track_id": track_id,
+        "op": op,
+        "at": now,
+        "expires_at": now + CHANGE_LOG_TTL_SECONDS,
+    })
+    print(f"Catalog change v{version}: {op} {track_id}")
+    return version
+
+
+def remove_track(src_key: str) -> dict:
+    """
+    ObjectRemoved on a raw audio key: deletes its track row and checkpoint and logs the
+    delete. The row is only deleted while this source still owns it; renditions (and the
+    waveform) stay, other tracks with the same bytes may share them.
+    """
+    ckpt_key = {"pk": f"RAW#{src_key}", "sk": "CHECKPOINT"}
+    ckpt = _state_table().get_item(Key=ckpt_key).get("Item") or {}
+    track_id = ckpt.get("track_id") or track_id_for_key(src_key)
+    try:
+        _tracks_table().delete_item(
+            Key={"track_id": track_id},
+            ConditionExpression="raw_key = :k",
+            ExpressionAttributeValues={":k": src_key},
+        )
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
+        print(f"Track {track_id} is not (or no longer) from {src_key}; nothing to remove")
+        return {"key": src_key, "status": "skipped", "track_id": track_id}
+
+    # Without the checkpoint, uploading the same object again ingests it again
+    _state_table().delete_item(Key=ckpt_key)
+    record_catalog_change(track_id, "delete")
+    return {"key": src_key, "status": "removed", "track_id": track_id}
+
+
+def _run_record(record: dict) -> dict:
+    """Worker entrypoint: private workspace + per-record error capture."""
+    workdir = tempfile.mkdtemp(prefix="ingest_", dir="/tmp")
+    try:
+        return process_record(record, workdir)
+    except Exception as e:
+        src_key = unquote_plus(record.get("s3", {}).get("object", {}).get("key", ""))
+        print(f"Ingest failed for {src_key}: {e!r}")
+        return {"key": src_key, "status": "failed", "error": str(e)}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def route_s3_events(messages: list) -> list:
+    """
+    Intake queue -> work queue: one message per S3 record, grouped by artist folder so
+    SQS fair queuing keeps one artist's bulk upload from starving everyone else.
+    Returns the intake messageIds that couldn't be forwarded (whole message is retried;
+    re-forwarded records are idempotent downstream).
+    """
+    entries = []
+    for message_id, body in messages:
+        for rec in body.get("Records", []):  # s3:TestEvent has no Records
+            key = unquote_plus(rec.get("s3", {}).get("object", {}).get("key", ""))
+            artist_slug, _ = parse_artist_album_from_key(key)
+            entries.append((message_id, {
+                "Id": str(len(entries) % SQS_SEND_BATCH),
+                "MessageBody": json.dumps(rec),
+                "MessageGroupId": artist_slug or "_unsorted",
+            }))
+
+    failed = set()
+    for i in range(0, len(entries), SQS_SEND_BATCH):
+        batch = entries[i:i + SQS_SEND_BATCH]
+        try:
+            resp = sqs.send_message_batch(QueueUrl=INGEST_QUEUE_URL, Entries=[e for _, e in batch])
+            failed_ids = {f["Id"] for f in resp.get("Failed", [])}
+        except ClientError as e:
+            print("Forwarding to work queue failed:", str(e))
+            failed_ids = {entry["Id"] for _, entry in batch}
+        failed.update(message_id for message_id, entry in batch if entry["Id"] in failed_ids)
+    print(f"Routed {len(entries)} S3 records from {len(messages)} intake messages ({len(failed)} failed)")
+    return sorted(failed)
+
+
+def _run_records(records: list):
+    """Runs S3 records concurrently; returns (per-record results, batch summary)."""
+    workers = max(1, min(INGEST_MAX_WORKERS, len(records)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(_run_record, records))
+
+    for r in results:
+        metrics.count(f"records_{r['status']}")
+    failed = [r for r in results if r["status"] == "failed"]
+    summary = {
+        "message": "Ingest complete" if not failed else "Ingest completed with failures",
+        "ingested": [r for r in results if r["status"] == "ingested"],
+        "failed": failed,
+    }
+    print("Ingest summary:", json.dumps(summary))
+    return results, summary
+
+
+def handle_sqs_batch(sqs_records: list) -> dict:
+    """
+    SQS event source (ReportBatchItemFailures): intake messages (S3 notifications) are
+    routed, work messages (one S3 record each) are ingested. Only the failed messages
+    are returned to the queue, so one corrupt file doesn't re-run the whole batch.
+    """
+    intake, work = [], []
+    for msg in sqs_records:
+        try:
+            body = json.loads(msg["body"])
+        except ValueError:
+            print(f"Dropping malformed message {msg.get('messageId')}")
+            continue
+        if "eventName" in body:
+            work.append((msg["messageId"], body))
+        else:
+            intake.append((msg["messageId"], body))
+
+    failures = route_s3_events(intake) if intake else []
+    if work:
+        results, _ = _run_records([body for _, body in work])
+        failures += [message_id for (message_id, _), r in zip(work, results) if r["status"] == "failed"]
+    return {"batchItemFailures": [{"itemIdentifier": message_id} for message_id in failures]}
+
+
+@metrics.handler
+def lambda_handler(event, context):
+    # Fan-out worker for chunked long-form transcodes (see _dispatch_chunk)
+    if "chunk_job" in event:
+        return transcode_chunk(event["chunk_job"])
 
-            # Debug
-            "raw_key": src_key,
-            "meta_key": meta_key,
-        }
+    records = event.get("Records", [])
+    if records and records[0].get("eventSource") == "aws:sqs":
+        print(f"Received {len(records)} SQS messages")
+        return handle_sqs_batch(records)
 
-        # Remove null/empty values
-        item = {k: v for k, v in item.items() if v is not None and v != ""}
+    metrics.verbose("Received event", event)
 
-        print("Writing DynamoDB item:", item)
-        table.put_item(Item=item)
+    # Direct S3 notification (pre-SQS wiring)
+    _, summary = _run_records(records)
+    failed = summary["failed"]
+    if failed:
+        # Surface the failure so Lambda's async retry still kicks in (as before)
+        raise RuntimeError(f"{len(failed)} of {len(records)} records failed: " + ", ".join(r["key"] for r in failed))
 
-    return {"statusCode": 200, "body": json.dumps({"message": "Ingest complete"})}
+    return {"statusCode": 200, "body": json.dumps(summary)}
@@ -0,0 +1,185 @@
+"""
+Backfill / reprocess: re-runs ingest over the existing raw/<artist>/<album>/ tree, e.g.
+after a preset or analysis change (bump PIPELINE_VERSION in lambda_function.py).
+
+- lists the raw prefix in parallel (one paginated listing per artist folder)
+- skips keys whose checkpoint is already indexed for the current source_version
+- transcodes in a process pool, calling the ingest module's ingest_track directly
+- appends every finished key to a JSONL checkpoint file, so an interrupted run resumes
+  where it stopped (failed keys are retried)
+
+Uses the same environment as the Lambda (TRACKS_TABLE, AUDIO_BUCKET, STATE_TABLE, and
+FFMPEG_BIN/FFPROBE_BIN for a local ffmpeg). --endpoint-url points S3 and DynamoDB at a
+local stand-in (MinIO/LocalStack/moto + DynamoDB Local):
+
+    python backend/ingest/reprocess.py --raw-bucket my-raw-bucket --workers 4 \
+        --checkpoint backfill.jsonl [--prefix raw/some_artist/] [--dry-run]
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+# backend/shared modules are zipped next to lambda_function.py in the Lambda; here they are imported
+# from the repo (module level, so spawned workers get it too)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "shared"))
+
+DONE_STATUSES = ("ingested", "duplicate")
+
+
+def _list_prefix(bucket: str, prefix: str) -> list:
+    """All objects under prefix: [(key, etag)]."""
+    import lambda_function as ingest
+
+    objects = []
+    for page in ingest.s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        objects.extend((obj["Key"], obj["ETag"]) for obj in page.get("Contents", []))
+    return objects
+
+
+def list_audio(bucket: str, prefix: str, list_workers: int) -> list:
+    """
+    Audio objects under prefix. Each child folder (artist) is listed by its own thread;
+    objects sitting directly under prefix come back with the delimiter listing.
+    """
+    import lambda_function as ingest
+
+    folders, objects = [], []
+    for page in ingest.s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix, Delimiter="/"):
+        folders.extend(p["Prefix"] for p in page.get("CommonPrefixes", []))
+        objects.extend((obj["Key"], obj["ETag"]) for obj in page.get("Contents", []))
+
+    with ThreadPoolExecutor(max_workers=list_workers) as pool:
+        for listed in pool.map(lambda folder: _list_prefix(bucket, folder), folders):
+            objects.extend(listed)
+
+    return sorted(
+        (key, etag) for key, etag in objects
+        if key.lower().endswith(ingest.SUPPORTED_AUDIO_EXTS)
+    )
+
+
+def _is_current(bucket: str, key: str, etag: str) -> bool:
+    import lambda_function as ingest
+
+    version = ingest.source_version(bucket, key, etag)
+    return "indexed" in ingest.load_checkpoint(key, version)["stages"]
+
+
+def load_done(checkpoint_path: str) -> set:
+    """source_versions finished by earlier runs (failed ones are retried)."""
+    done = set()
+    if not os.path.exists(checkpoint_path):
+        return done
+    with open(checkpoint_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue  # torn last line from a killed run
+            if entry.get("status") in DONE_STATUSES:
+                done.add(entry["version"])
+    return done
+
+
+def reprocess_one(task: tuple) -> dict:
+    """Process-pool worker: meta/art lookup as the join would, then ingest_track."""
+    import lambda_function as ingest
+
+    bucket, key, etag = task
+    version = ingest.source_version(bucket, key, etag)
+    workdir = tempfile.mkdtemp(prefix="reprocess_")
+    started = time.perf_counter()
+    try:
+        meta = meta_key = art_key = None
+        group_key = ingest.upload_group_key(key)
+        if group_key:
+            folder, _, filename = key.rpartition("/")
+            meta, meta_key = ingest.try_load_meta(bucket, folder, ingest.extract_ts_prefix(filename))
+            if not (isinstance(meta, dict) and meta.get("art_key")):
+                art_key = ingest.find_upload_art(bucket, group_key)
+        result = ingest.ingest_track(bucket, key, etag, meta, meta_key, art_key, workdir)
+    except Exception as e:
+        result = {"key": key, "status": "failed", "error": str(e)}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "key": key,
+        "version": version,
+        "status": result["status"],
+        "track_id": result.get("track_id"),
+        "error": result.get("error"),
+        "seconds": round(time.perf_counter() - started, 1),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Re-run ingest over the raw bucket.")
+    parser.add_argument("--raw-bucket", required=True)
+    parser.add_argument("--prefix", default="raw/")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="transcode processes")
+    parser.add_argument("--list-workers", type=int, default=16, help="listing / currency-check threads")
+    parser.add_argument("--checkpoint", default="reprocess_checkpoint.jsonl")
+    parser.add_argument("--endpoint-url", help="local S3/DynamoDB stand-in (sets AWS_ENDPOINT_URL)")
+    parser.add_argument("--limit", type=int, help="stop after this many keys are queued")
+    parser.add_argument("--dry-run", action="store_true", help="list stale keys only")
+    args = parser.parse_args(argv)
+
+    if args.endpoint_url:
+        # Read by boto3 when the ingest module creates its clients (here and in each worker)
+        os.environ["AWS_ENDPOINT_URL"] = args.endpoint_url
+    import lambda_function as ingest
+
+    started = time.perf_counter()
+    audio = list_audio(args.raw_bucket, args.prefix, args.list_workers)
+    done = load_done(args.checkpoint)
+    candidates = [
+        (key, etag) for key, etag in audio
+        if ingest.source_version(args.raw_bucket, key, etag) not in done
+    ]
+    with ThreadPoolExecutor(max_workers=args.list_workers) as pool:
+        current = list(pool.map(lambda o: _is_current(args.raw_bucket, *o), candidates))
+    stale = [o for o, is_current in zip(candidates, current) if not is_current]
+    if args.limit:
+        stale = stale[:args.limit]
+    print(f"{len(audio)} audio objects under s3://{args.raw_bucket}/{args.prefix}: "
+          f"{len(audio) - len(candidates)} done in {args.checkpoint}, "
+          f"{len(candidates) - len(stale)} current, {len(stale)} to process "
+          f"(pipeline v{ingest.PIPELINE_VERSION}, listed in {time.perf_counter() - started:.1f}s)")
+
+    if args.dry_run:
+        for key, _ in stale:
+            print(key)
+        return 0
+
+    counts = {}
+    # spawn: fresh boto3 clients per worker (they aren't fork-safe)
+    ctx = multiprocessing.get_context("spawn")
+    with open(args.checkpoint, "a", encoding="utf-8") as ckpt, \
+            ProcessPoolExecutor(max_workers=args.workers, mp_context=ctx) as pool:
+        futures = [pool.submit(reprocess_one, (args.raw_bucket, key, etag)) for key, etag in stale]
+        try:
+            for n, future in enumerate(as_completed(futures), 1):
+                entry = future.result()
+                ckpt.write(json.dumps(entry) + "\n")
+                ckpt.flush()
+                counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+                print(f"[{n}/{len(stale)}] {entry['status']} {entry['key']} ({entry['seconds']}s)"
+                      + (f": {entry['error']}" if entry.get("error") else ""))
+        except KeyboardInterrupt:
+            print("Interrupted; finished keys are in the checkpoint, rerun to resume")
+            for future in futures:
+                future.cancel()
+            return 130
+
+    print(f"Done in {time.perf_counter() - started:.1f}s: {counts}")
+    return 1 if counts.get("failed") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
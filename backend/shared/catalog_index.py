@@ -0,0 +1,66 @@
+"""
+Sparse "catalog order" GSI on the tracks table: every playable row (has a stream_path)
+carries catalog_pk = CATALOG_PARTITION and catalog_sk = the /tracks display order
+(artist, album, track number, title; case-insensitive), so one Query returns a sorted
+page with no in-memory sort.
+
+Written by ingest with each track row (and backfilled by the catalog publisher); zipped
+flat next to lambda_function.py like instrumentation.py (`import catalog_index`).
+
+Also the keys of the catalog change log (GET /tracks/changes) in the ingest state table:
+    CATALOG | VERSION          -> counter, bumped once per logged change
+    CHANGES | <version:012d>   -> {"version", "track_id", "op": insert|update|delete, "at"}
+"""
+
+CATALOG_INDEX = "catalog-order"
+CATALOG_PARTITION = "CATALOG"
+
+# Lower than any character in a display name, so "ab" sorts before "abc" (as tuples do)
+_SEP = "\x1f"
+_NO_TRACK_NUMBER = 10**9  # unnumbered tracks go last within their album
+# DynamoDB rejects index key values over 1024 bytes: each text part is capped so
+# 3 x 300 + track number + track_id + separators always fits
+_PART_MAX_BYTES = 300
+
+
+def _clip(text: str) -> str:
+    """text cut to _PART_MAX_BYTES of UTF-8, never inside a character."""
+    data = text.encode("utf-8")
+    if len(data) <= _PART_MAX_BYTES:
+        return text
+    return data[:_PART_MAX_BYTES].decode("utf-8", errors="ignore")
+
+
+def catalog_sort_key(item: dict) -> str:
+    """
+    catalog_sk for a tracks row. DynamoDB orders strings by UTF-8 bytes, which matches
+    code point order, so this sorts like tracks_api's (artist, album, number, title) tuple
+    (up to _PART_MAX_BYTES of each name); track_id breaks ties.
+    """
+    tn = item.get("track_number")
+    try:
+        tn_val = int(tn) if tn is not None else _NO_TRACK_NUMBER
+    except (TypeError, ValueError):
+        tn_val = _NO_TRACK_NUMBER
+    return _SEP.join([
+        _clip((item.get("artist") or "").lower()),
+        _clip((item.get("album") or "").lower()),
+        f"{max(tn_val, 0):010d}",
+        _clip((item.get("title") or item.get("song_title") or item.get("name") or "").lower()),
+        item.get("track_id") or "",
+    ])
+
+
+def catalog_keys(item: dict) -> dict:
+    """Index attributes for a tracks row ({} keeps rows without a stream out of the index)."""
+    if not (item.get("stream_path") or item.get("stream_key")):
+        return {}
+    return {"catalog_pk": CATALOG_PARTITION, "catalog_sk": catalog_sort_key(item)}
+
+
+CATALOG_VERSION_KEY = {"pk": "CATALOG", "sk": "VERSION"}
+CHANGES_PK = "CHANGES"
+
+
+def change_sk(version: int) -> str:
+    return f"{version:012d}"
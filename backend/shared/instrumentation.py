@@ -0,0 +1,204 @@
+"""
+Per-invocation metrics for the Python Lambdas, emitted as one CloudWatch Embedded Metric
+Format (EMF) line per invocation: stage timers (<name>_ms, Milliseconds), counters
+(Count) and cold_start, dimensioned by Function. CloudWatch extracts them into metrics
+(so p50/p99 per stage and handler), with no PutMetricData calls.
+
+Verbose payloads (events, items) are only serialized and logged for a sampled fraction
+of invocations (LOG_SAMPLE_RATE, default 1%).
+
+Profiling is opt-in: with PROFILE_SAMPLE_RATE > 0, that fraction of invocations runs under
+cProfile + tracemalloc and writes profile.pstats, profile.txt (top functions by cumulative
+time) and allocations.txt (top allocation sites) to PROFILE_S3_BUCKET (needs s3:PutObject)
+or /tmp, under profiles/<function>/<request id>/. When unset the handler is not wrapped at
+all. cProfile only sees the handler thread (ingest worker threads are not profiled;
+tracemalloc covers every thread).
+
+This file is zipped flat next to each lambda_function.py (`import instrumentation`):
+
+    metrics = instrumentation.Metrics("tracks_api")
+
+    @metrics.handler
+    def lambda_handler(event, context):
+        with metrics.timer("scan"):
+            ...
+        metrics.count("items_scanned", len(items))
+        metrics.verbose("Received event", event)
+"""
+import functools
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+NAMESPACE = os.environ.get("METRICS_NAMESPACE", "Nicify")
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "0.01"))
+EMF_MAX_VALUES = 100  # values per metric per EMF line
+
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_S3_BUCKET = os.environ.get("PROFILE_S3_BUCKET", "")
+PROFILE_TOP_N = int(os.environ.get("PROFILE_TOP_N", "40"))
+PROFILE_TRACE_FRAMES = 8  # tracemalloc stack depth per allocation site
+
+
+class Metrics:
+    """Thread-safe (ingest records run on a thread pool); state resets per invocation."""
+
+    def __init__(self, function: str):
+        # METRICS_FUNCTION names the function when one zip backs several (tracks_api)
+        self.function = os.environ.get("METRICS_FUNCTION", function)
+        self._lock = threading.Lock()
+        self._cold = True
+        self._reset(None)
+
+    def _reset(self, context):
+        self._timings = {}
+        self._counts = {}
+        self._props = {}
+        self.request_id = getattr(context, "aws_request_id", None)
+        self.sampled = random.random() < LOG_SAMPLE_RATE
+
+    @contextmanager
+    def timer(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timing(name, (time.perf_counter() - started) * 1000)
+
+    def timing(self, name: str, ms: float):
+        with self._lock:
+            self._timings.setdefault(name, []).append(round(ms, 3))
+
+    def count(self, name: str, n: int = 1):
+        with self._lock:
+            self._counts[name] = self._counts.get(name, 0) + n
+
+    def prop(self, name: str, value):
+        """Searchable (Logs Insights) field on this invocation's EMF line; not a metric."""
+        with self._lock:
+            self._props[name] = value
+
+    def verbose(self, label: str, payload):
+        """Full payload dump for sampled invocations only; unsampled ones skip the serialization."""
+        if self.sampled:
+            print(f"{label}:", json.dumps(payload, default=str))
+
+    def flush(self):
+        with self._lock:
+            timings, counts, props = self._timings, self._counts, self._props
+            self._timings, self._counts, self._props = {}, {}, {}
+        if not (timings or counts):
+            return
+
+        record = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": NAMESPACE,
+                    "Dimensions": [["Function"]],
+                    "Metrics": [{"Name": f"{name}_ms", "Unit": "Milliseconds"} for name in timings]
+                    + [{"Name": name, "Unit": "Count"} for name in counts],
+                }],
+            },
+            "Function": self.function,
+            **props,
+        }
+        if self.request_id:
+            record["RequestId"] = self.request_id
+        for name, values in timings.items():
+            record[f"{name}_ms"] = values[0] if len(values) == 1 else values[:EMF_MAX_VALUES]
+        record.update(counts)
+        print(json.dumps(record, default=str))
+
+    def handler(self, fn):
+        """Wraps lambda_handler: resets state, times the invocation, counts errors, flushes."""
+        run = self._profiling(fn) if PROFILE_SAMPLE_RATE > 0 else fn
+
+        @functools.wraps(fn)
+        def wrapper(event, context):
+            self._reset(context)
+            self.count("cold_start", 1 if self._cold else 0)
+            self.prop("ColdStart", self._cold)
+            self._cold = False
+            started = time.perf_counter()
+            try:
+                return run(event, context)
+            except Exception:
+                self.count("errors")
+                raise
+            finally:
+                self.timing("handler", (time.perf_counter() - started) * 1000)
+                self.flush()
+        return wrapper
+
+    def _profiling(self, fn):
+        """fn, run under cProfile + tracemalloc for PROFILE_SAMPLE_RATE of invocations."""
+        import cProfile
+        import tracemalloc
+
+        def run(event, context):
+            if random.random() >= PROFILE_SAMPLE_RATE:
+                return fn(event, context)
+            self.prop("Profiled", True)  # timings of this invocation include profiler overhead
+            profiler = cProfile.Profile()
+            tracemalloc.start(PROFILE_TRACE_FRAMES)
+            profiler.enable()
+            try:
+                return fn(event, context)
+            finally:
+                profiler.disable()
+                snapshot = tracemalloc.take_snapshot()
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                try:
+                    self._write_profile(profiler, snapshot, peak)
+                except Exception as e:
+                    print("Profile write failed:", repr(e))
+        return run
+
+    def _write_profile(self, profiler, snapshot, peak: int):
+        import io
+        import pstats
+        import tempfile
+
+        key_prefix = f"profiles/{self.function}/{self.request_id or int(time.time() * 1000)}"
+        out_dir = os.path.join(tempfile.gettempdir(), key_prefix)
+        os.makedirs(out_dir, exist_ok=True)
+
+        profiler.dump_stats(os.path.join(out_dir, "profile.pstats"))
+        text = io.StringIO()
+        pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+        with open(os.path.join(out_dir, "profile.txt"), "w", encoding="utf-8") as f:
+            f.write(text.getvalue())
+
+        snapshot = snapshot.filter_traces(_allocation_filters())
+        lines = [f"peak traced memory: {peak / 1024 / 1024:.1f} MiB", ""]
+        for stat in snapshot.statistics("traceback")[:PROFILE_TOP_N]:
+            lines.append(f"{stat.size / 1024:.1f} KiB in {stat.count} blocks")
+            lines.extend(f"    {line}" for line in stat.traceback.format(limit=PROFILE_TRACE_FRAMES))
+        with open(os.path.join(out_dir, "allocations.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+        if PROFILE_S3_BUCKET:
+            import boto3
+
+            s3 = boto3.client("s3")
+            for name in ("profile.pstats", "profile.txt", "allocations.txt"):
+                s3.upload_file(os.path.join(out_dir, name), PROFILE_S3_BUCKET, f"{key_prefix}/{name}")
+            print(f"Profile written to s3://{PROFILE_S3_BUCKET}/{key_prefix}/")
+        else:
+            print(f"Profile written to {out_dir}/")
+
+
+def _allocation_filters() -> list:
+    """Hide the profiler's own allocations from the allocation report."""
+    import tracemalloc
+
+    return [
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    ]
@@ -0,0 +1,26 @@
+import catalog_index
+
+
+def test_sort_key_fits_index_key_limit_with_oversized_tags():
+    item = {
+        "track_id": "trk_0123456789abcdef",
+        "artist": "Ö" * 2000,                      # 2-byte characters: cut between them
+        "album": "Symphonie fantastique " * 100,
+        "title": "€" * 1000,                       # 3-byte characters
+        "track_number": 7,
+    }
+    sk = catalog_index.catalog_sort_key(item)
+    artist, album, number, title, track_id = sk.split(catalog_index._SEP)
+
+    assert len(sk.encode("utf-8")) <= 1024
+    assert artist == "ö" * 150
+    assert len(album.encode("utf-8")) == 300
+    assert title == "€" * 100
+    assert number == "0000000007"
+    assert track_id == "trk_0123456789abcdef"
+
+
+def test_sort_key_keeps_short_names_intact():
+    item = {"track_id": "t1", "artist": "Ab", "album": "Cd", "title": "Ef"}
+    parts = catalog_index.catalog_sort_key(item).split(catalog_index._SEP)
+    assert parts == ["ab", "cd", f"{10**9:010d}", "ef", "t1"]
@@ -1,24 +1,89 @@
+import base64
+import gzip
+import hashlib
 import json
 import os
+import time
 import boto3
 from decimal import Decimal
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+import catalog_index
+import instrumentation
+
+try:
+    # Vendored into tracks_api.zip by CI; without it snapshots are published as gzip/identity only
+    import brotli
+except ImportError:
+    brotli = None
 
 dynamodb = boto3.resource("dynamodb")
+s3 = boto3.client("s3")
 
 TRACKS_TABLE = os.environ["TRACKS_TABLE"]
 AUDIO_CLOUDFRONT_DOMAIN = os.environ.get("AUDIO_CLOUDFRONT_DOMAIN", "").replace("https://", "").strip("/")
 
+# Materialized catalog (see publish_catalog): content-hashed snapshots + a tiny manifest in
+# the audio bucket, served by the audio CloudFront distribution
+CATALOG_BUCKET = os.environ.get("CATALOG_BUCKET", "")
+CATALOG_PREFIX = "catalog"
+CATALOG_MANIFEST_KEY = f"{CATALOG_PREFIX}/manifest.json"
+# How long a warm container trusts its copy of the manifest (seconds)
+CATALOG_MANIFEST_TTL = float(os.environ.get("CATALOG_MANIFEST_TTL", "5"))
+SNAPSHOT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+MANIFEST_CACHE_CONTROL = "public, max-age=10"
+# Content-Encoding -> snapshot key suffix, in preference order
+SNAPSHOT_ENCODINGS = (("br", ".json.br"), ("gzip", ".json.gz"), ("identity", ".json"))
+
+# ?limit=&cursor= pages (catalog-order GSI); without them /tracks returns the whole array
+PAGE_DEFAULT_LIMIT = 100
+PAGE_MAX_LIMIT = 500
+
+# Catalog change log written by ingest (GET /tracks/changes), in the ingest state table
+STATE_TABLE = os.environ.get("STATE_TABLE", "")
+CHANGES_PAGE_LIMIT = 1000  # log entries per response; has_more pages the rest
+# A version missing from the log for longer than this was lost, not still being written
+CHANGE_GAP_GRACE_SECONDS = 60
+
+# Conditional GET: the ETag is the change-log version (plus RESPONSE_SCHEMA), so a
+# revalidation is answered 304 from a cached counter without touching the tracks table
+CACHE_MAX_AGE = int(os.environ.get("CATALOG_CACHE_MAX_AGE", "30"))
+CACHE_SWR = int(os.environ.get("CATALOG_CACHE_SWR", "300"))
+# Bump when the response shape changes (new/renamed fields): cached copies must not be 304'd
+RESPONSE_SCHEMA = 1
+
+# Negotiated compression of API responses (API Gateway wants binary bodies base64'd).
+# Brotli at a per-request quality; the published snapshots use 11.
+COMPRESS_MIN_BYTES = 1024
+BROTLI_RESPONSE_QUALITY = 5
+GZIP_RESPONSE_LEVEL = 6
+# ?profile=compact drops the id alias, the raw paths the URLs already carry, and nulls
+RESPONSE_PROFILES = ("full", "compact")
+COMPACT_DROP_FIELDS = ("id", "stream_path", "art_path")
+
 table = dynamodb.Table(TRACKS_TABLE)
+state_table = dynamodb.Table(STATE_TABLE) if STATE_TABLE else None
+metrics = instrumentation.Metrics("tracks_api")
 
+_manifest_cache = {"at": float("-inf"), "manifest": None}
+_version_cache = {"at": float("-inf"), "version": None}
 
-def _headers():
-    return {
+
+def _headers(etag=None):
+    headers = {
         "Content-Type": "application/json",
         "Access-Control-Allow-Origin": "*",  # tighten later to your site domain
         "Access-Control-Allow-Methods": "GET,OPTIONS",
         "Access-Control-Allow-Headers": "Content-Type",
         "Cache-Control": "no-store",
     }
+    if etag:
+        # Catalog responses: reused for CACHE_MAX_AGE, then served stale while revalidating
+        headers["Cache-Control"] = f"public, max-age={CACHE_MAX_AGE}, stale-while-revalidate={CACHE_SWR}"
+        headers["ETag"] = etag
+        headers["Vary"] = "Accept-Encoding"
+    return headers
 
 
 def _json_default(o):
@@ -34,6 +99,13 @@ def _cf_url(path: str | None) -> str | None:
     return f"https://{AUDIO_CLOUDFRONT_DOMAIN}/{path.lstrip('/')}"
 
 
+def _cf_urls(variants) -> dict | None:
+    # {"jpg": {"64": path, ...}, "webp": {...}} -> same shape with CloudFront URLs
+    if not variants or not AUDIO_CLOUDFRONT_DOMAIN:
+        return None
+    return {fmt: {size: _cf_url(path) for size, path in sizes.items()} for fmt, sizes in variants.items()}
+
+
 def _to_track(item: dict) -> dict:
     track_id = item.get("track_id")
     stream_path = item.get("stream_path") or item.get("stream_key")
@@ -47,15 +119,515 @@ def _to_track(item: dict) -> dict:
         "track_number": item.get("track_number"),
         "release_year": item.get("release_year"),
         "duration": item.get("duration"),
+        "loudness_lufs": item.get("loudness_lufs"),  # EBU R128 integrated; gain = target - loudness
+        "true_peak_dbtp": item.get("true_peak_dbtp"),  # cap the gain so peaks stay below 0 dBTP
         "stream_path": stream_path,
         "stream_url": _cf_url(stream_path),
+        "aac_url": _cf_url(item.get("aac_path")),
+        "preview_url": _cf_url(item.get("preview_path")),
+        "manifest_url": _cf_url(item.get("manifest_path")),  # HLS master playlist (ABR)
+        "waveform_url": _cf_url(item.get("waveform_path")),  # int8 min/max pairs, 20 per second
         "art_path": item.get("art_path"),
         "art_url": _cf_url(item.get("art_path")),
+        "art_urls": _cf_urls(item.get("art_variants")),  # size ladder for small tiles
         "status": item.get("status"),
     }
 
 
+def _compact(track: dict) -> dict:
+    return {k: v for k, v in track.items() if v is not None and k not in COMPACT_DROP_FIELDS}
+
+
+def _profile(event) -> str:
+    """Requested response profile (ValueError for an unknown one)."""
+    profile = (event.get("queryStringParameters") or {}).get("profile") or "full"
+    if profile not in RESPONSE_PROFILES:
+        raise ValueError(f"profile must be one of: {', '.join(RESPONSE_PROFILES)}")
+    return profile
+
+
+def _shape(tracks: list, profile: str) -> list:
+    return [_compact(t) for t in tracks] if profile == "compact" else tracks
+
+
+def _sort_key(t):
+    artist = (t.get("artist") or "").lower()
+    album = (t.get("album") or "").lower()
+    tn = t.get("track_number")
+    try:
+        tn_val = int(tn) if tn is not None else 10**9
+    except Exception:
+        tn_val = 10**9
+    title = (t.get("title") or "").lower()
+    return (artist, album, tn_val, title)
+
+
+def scan_items() -> list:
+    # Scan with pagination (won't silently truncate at 1MB)
+    items = []
+    scan_kwargs = {}
+    with metrics.timer("scan"):
+        while True:
+            resp = table.scan(**scan_kwargs)
+            items.extend(resp.get("Items", []))
+            metrics.count("scan_pages")
+            lek = resp.get("LastEvaluatedKey")
+            if not lek:
+                break
+            scan_kwargs["ExclusiveStartKey"] = lek
+    metrics.count("items_scanned", len(items))
+    return items
+
+
+def build_catalog(items: list) -> list:
+    """Table rows -> the /tracks array (broken rows dropped, stable UI order)."""
+    with metrics.timer("transform"):
+        tracks = [_to_track(i) for i in items]
+
+        # Filter out broken rows so UI doesn't choke
+        tracks = [t for t in tracks if t.get("track_id") and t.get("stream_url")]
+
+    with metrics.timer("sort"):
+        tracks.sort(key=_sort_key)
+    return tracks
+
+
+def _encode_cursor(last_key: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(last_key, separators=(",", ":")).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> dict:
+    """Opaque cursor -> ExclusiveStartKey (ValueError if it isn't one of ours)."""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not (
+        isinstance(key, dict)
+        and set(key) == {"track_id", "catalog_pk", "catalog_sk"}
+        and all(isinstance(v, str) for v in key.values())
+        and key["catalog_pk"] == catalog_index.CATALOG_PARTITION
+    ):
+        raise ValueError("Invalid cursor")
+    return key
+
+
+def query_page(limit: int, cursor=None) -> dict:
+    """One sorted page from the catalog-order index: {"items", "next_cursor"}."""
+    query_kwargs = {
+        "IndexName": catalog_index.CATALOG_INDEX,
+        "KeyConditionExpression": Key("catalog_pk").eq(catalog_index.CATALOG_PARTITION),
+        "Limit": limit,
+    }
+    if cursor:
+        query_kwargs["ExclusiveStartKey"] = _decode_cursor(cursor)
+    with metrics.timer("query"):
+        resp = table.query(**query_kwargs)
+    items = resp.get("Items", [])
+    metrics.count("items_queried", len(items))
+
+    with metrics.timer("transform"):
+        tracks = [_to_track(i) for i in items]
+        tracks = [t for t in tracks if t.get("track_id") and t.get("stream_url")]
+    lek = resp.get("LastEvaluatedKey")
+    return {"items": tracks, "next_cursor": _encode_cursor(lek) if lek else None}
+
+
+def _page_request(event):
+    """(limit, cursor) when the request asks for a page, else None (whole-catalog mode)."""
+    params = event.get("queryStringParameters") or {}
+    if "limit" not in params and "cursor" not in params:
+        return None
+    try:
+        limit = int(params.get("limit") or PAGE_DEFAULT_LIMIT)
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if limit < 1:
+        raise ValueError("limit must be positive")
+    return min(limit, PAGE_MAX_LIMIT), params.get("cursor") or None
+
+
+def catalog_counter() -> dict:
+    """The change log's CATALOG|VERSION item ({} before the first logged change)."""
+    return state_table.get_item(Key=catalog_index.CATALOG_VERSION_KEY).get("Item") or {}
+
+
+def _batch_get_tracks(track_ids: list) -> dict:
+    rows = {}
+    for i in range(0, len(track_ids), 100):  # BatchGetItem maximum
+        request = {TRACKS_TABLE: {"Keys": [{"track_id": t} for t in track_ids[i:i + 100]]}}
+        while request:
+            resp = dynamodb.batch_get_item(RequestItems=request)
+            rows.update((row["track_id"], row) for row in resp["Responses"].get(TRACKS_TABLE, []))
+            request = resp.get("UnprocessedKeys")
+            if request:
+                time.sleep(0.05)
+    return rows
+
+
+def current_catalog_version():
+    """Change-log counter, cached per container like the manifest (None without a change log)."""
+    if state_table is None:
+        return None
+    now = time.monotonic()
+    if now - _version_cache["at"] > CATALOG_MANIFEST_TTL:
+        with metrics.timer("version"):
+            _version_cache["version"] = int(catalog_counter().get("version", 0))
+        _version_cache["at"] = now
+    return _version_cache["version"]
+
+
+def _version_etag(version: int) -> str:
+    return f'"v{version}.s{RESPONSE_SCHEMA}"'
+
+
+def catalog_etag():
+    """
+    Strong ETag for responses read from the live table (pages, scan fallback, changes);
+    changes whenever ingest logs a change. Ingest writes the row before bumping the
+    counter, so the content is never older than the tag.
+    """
+    try:
+        version = current_catalog_version()
+    except Exception as e:
+        print("tracks_api version error:", repr(e))
+        return None
+    return _version_etag(version) if version is not None else None
+
+
+def _snapshot_etag(manifest: dict) -> str:
+    """ETag for the snapshot redirect: the counter moves before the snapshot is republished."""
+    return f'"c{manifest["hash"]}.s{RESPONSE_SCHEMA}"'
+
+
+def _not_modified(event, etag):
+    """
+    The current tag an If-None-Match names (None when nothing matches), so the 304 echoes
+    the exact representation the client cached: compressed copies carry the coding in
+    their tag (see _compressed). If-None-Match uses weak comparison: W/"x" matches "x".
+    """
+    if not etag:
+        return None
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    tags = [t.strip() for t in (headers.get("if-none-match") or "").split(",")]
+    current = {etag} | {_encoded_etag(etag, e) for e in ("br", "gzip")}
+    for tag in tags:
+        if tag == "*":
+            return etag
+        if tag.removeprefix("W/") in current:
+            return tag.removeprefix("W/")
+    return None
+
+
+def _not_modified_response(etag: str) -> dict:
+    metrics.count("not_modified")
+    return {"statusCode": 304, "headers": _headers(etag), "body": ""}  # keeps Vary: Accept-Encoding
+
+
+def _encoded_etag(etag: str, encoding: str) -> str:
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def _compressed(response: dict, event) -> dict:
+    """A 200 JSON response in the best Content-Encoding the client accepts (br, gzip)."""
+    body = response.get("body") or ""
+    if response.get("statusCode") != 200 or response.get("isBase64Encoded") or len(body) < COMPRESS_MIN_BYTES:
+        return response
+    accepted = accepted_encodings(event)
+    data = body.encode("utf-8")
+    with metrics.timer("compress"):
+        if brotli and "br" in accepted:
+            encoding, data = "br", brotli.compress(data, quality=BROTLI_RESPONSE_QUALITY)
+        elif "gzip" in accepted:
+            encoding, data = "gzip", gzip.compress(data, compresslevel=GZIP_RESPONSE_LEVEL)
+        else:
+            return response
+    metrics.count("response_bytes_compressed", len(data))
+
+    # Vary on every negotiated body, not only the ETag'd ones: shared caches must not hand a
+    # br/gzip body to a client that didn't ask for it
+    headers = {**response["headers"], "Content-Encoding": encoding, "Vary": "Accept-Encoding"}
+    if "ETag" in headers:
+        headers["ETag"] = _encoded_etag(headers["ETag"], encoding)  # strong ETags differ per coding
+    return {**response, "headers": headers, "body": base64.b64encode(data).decode("ascii"), "isBase64Encoded": True}
+
+
+def list_changes(since: int, profile: str = "full"):
+    """
+    The catalog delta after change-log version `since`, one entry per track in its current
+    state: {"version", "changes": [{"op": "upsert", "track"} | {"op": "delete", "track_id"}],
+    "has_more"}. None means the log can't bring `since` up to date (expired or lost entries,
+    or a client ahead of the log): the client refetches /tracks instead.
+    """
+    with metrics.timer("changes_query"):
+        resp = state_table.query(
+            KeyConditionExpression=Key("pk").eq(catalog_index.CHANGES_PK)
+            & Key("sk").gt(catalog_index.change_sk(since)),
+            Limit=CHANGES_PAGE_LIMIT,
+        )
+    entries = resp.get("Items", [])
+
+    # Only the contiguous run after `since`: a hole is a change still being logged (wait)
+    # or one whose entry was lost/expired (resync once the grace period has passed)
+    run = []
+    for entry in entries:
+        if int(entry["version"]) != since + len(run) + 1:
+            break
+        run.append(entry)
+
+    if not run:
+        counter = catalog_counter()
+        current = int(counter.get("version", 0))
+        if current == since:
+            return {"version": since, "changes": [], "has_more": False}
+        if current < since:
+            return None
+        missing_since = int(entries[0]["at"]) if entries else int(counter.get("updated_at", 0))
+        if time.time() - missing_since > CHANGE_GAP_GRACE_SECONDS:
+            return None
+        return {"version": since, "changes": [], "has_more": False}
+
+    latest = {}
+    for entry in run:
+        latest.pop(entry["track_id"], None)  # keep log order of each track's last change
+        latest[entry["track_id"]] = entry["op"]
+    with metrics.timer("changes_fetch"):
+        rows = _batch_get_tracks([t for t, op in latest.items() if op != "delete"])
+
+    changes = []
+    for track_id in latest:
+        track = _to_track(rows[track_id]) if track_id in rows else None
+        if track and track.get("stream_url"):
+            changes.append({"op": "upsert", "track": _compact(track) if profile == "compact" else track})
+        else:
+            changes.append({"op": "delete", "track_id": track_id})
+    metrics.count("changes_returned", len(changes))
+    return {
+        "version": int(run[-1]["version"]),
+        "changes": changes,
+        "has_more": len(run) < len(entries) or "LastEvaluatedKey" in resp,
+    }
+
+
+def baseline_version() -> int:
+    """
+    Change-log version of the currently published snapshot (it contains every change up
+    to it), else the live counter. Read uncached, but still a separate request from the
+    /tracks load: clients should take the baseline from the /tracks response itself
+    (the snapshot URL's cv, or X-Catalog-Change-Version on the scan fallback).
+    """
+    manifest = None
+    if CATALOG_BUCKET:
+        try:
+            manifest = read_manifest()
+        except Exception as e:
+            print("tracks_api manifest error:", repr(e))
+    if manifest and manifest.get("change_version") is not None:
+        return int(manifest["change_version"])
+    return int(catalog_counter().get("version", 0))
+
+
+def _changes_response(event) -> dict:
+    if state_table is None:
+        return {"statusCode": 404, "headers": _headers(), "body": json.dumps({"error": "Change log not configured"})}
+
+    since = (event.get("queryStringParameters") or {}).get("since")
+    if since is None:
+        # Never cached: a stale baseline paired with a newer snapshot would skip changes
+        return {"statusCode": 200, "headers": _headers(), "body": json.dumps({"version": baseline_version()})}
+
+    # Every tag served here is for a response complete up to its version (see below), so a
+    # tag equal to the counter's is still current: no log reads
+    etag = catalog_etag()
+    matched = _not_modified(event, etag)
+    if matched:
+        return _not_modified_response(matched)
+
+    try:
+        profile = _profile(event)
+    except ValueError as e:
+        return {"statusCode": 400, "headers": _headers(), "body": json.dumps({"error": str(e)})}
+    try:
+        since = int(since)
+        if since < 0:
+            raise ValueError
+    except ValueError:
+        return {"statusCode": 400, "headers": _headers(), "body": json.dumps({"error": "since must be a non-negative integer"})}
+
+    delta = list_changes(since, profile)
+    if delta is None:
+        metrics.count("changes_resync")
+        return {
+            "statusCode": 410,
+            "headers": _headers(),
+            "body": json.dumps({"error": "Change log no longer covers this version; reload /tracks", "resync": True}),
+        }
+    with metrics.timer("serialize"):
+        body = json.dumps(delta, default=_json_default)
+    # Only a delta that reaches the counter is cacheable (tagged with its own version): one
+    # stopped short by a log gap or has_more is refetched, not revalidated against a tag
+    # that already counts the changes it lacks
+    delta_etag = _version_etag(delta["version"])
+    if delta_etag != etag:
+        return {"statusCode": 200, "headers": _headers(), "body": body}
+    return {"statusCode": 200, "headers": _headers(delta_etag), "body": body}
+
+
+def accepted_encodings(event) -> set:
+    """Content codings the client accepts (Accept-Encoding, q=0 excluded); identity always."""
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    accepted = {"identity"}
+    for part in (headers.get("accept-encoding") or "").split(","):
+        coding, *params = [p.strip() for p in part.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    pass
+        if coding and q > 0:
+            accepted.add(coding.lower())
+    if "*" in accepted:
+        accepted.update(encoding for encoding, _ in SNAPSHOT_ENCODINGS)
+    return accepted
+
+
+def read_manifest():
+    """Current catalog manifest from S3, or None before the first publish."""
+    try:
+        obj = s3.get_object(Bucket=CATALOG_BUCKET, Key=CATALOG_MANIFEST_KEY)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return None
+        raise
+    return json.loads(obj["Body"].read())
+
+
+def current_manifest():
+    """read_manifest, cached per container for CATALOG_MANIFEST_TTL seconds."""
+    now = time.monotonic()
+    if now - _manifest_cache["at"] > CATALOG_MANIFEST_TTL:
+        with metrics.timer("manifest"):
+            _manifest_cache["manifest"] = read_manifest()
+        _manifest_cache["at"] = now
+    return _manifest_cache["manifest"]
+
+
+def _backfill_catalog_keys(items: list):
+    """Rows written before the catalog-order index (or since re-sorted) get their keys."""
+    stale = [
+        (item, keys) for item, keys in ((i, catalog_index.catalog_keys(i)) for i in items)
+        if keys and any(item.get(k) != v for k, v in keys.items())
+    ]
+    with metrics.timer("backfill"):
+        for item, keys in stale:
+            try:
+                table.update_item(
+                    Key={"track_id": item["track_id"]},
+                    UpdateExpression="SET catalog_pk = :pk, catalog_sk = :sk",
+                    ConditionExpression="attribute_exists(track_id)",
+                    ExpressionAttributeValues={":pk": keys["catalog_pk"], ":sk": keys["catalog_sk"]},
+                )
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                    raise
+    if stale:
+        metrics.count("catalog_keys_backfilled", len(stale))
+        print(f"Backfilled catalog-order keys on {len(stale)} rows")
+
+
+def _encode_snapshot(body: bytes) -> dict:
+    # gzip without a timestamp, so an unchanged catalog compresses to identical bytes
+    variants = {"identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli:
+        variants["br"] = brotli.compress(body, quality=11)
+    return variants
+
+
+def publish_catalog() -> dict:
+    """
+    Materializes the /tracks array once per catalog change instead of once per page load:
+    content-hashed snapshot (identity, gzip, br) under catalog/, then the manifest pointing
+    at it with a version one above the previous one. Snapshots are written first, so the
+    manifest never points at a missing object. An unchanged catalog is not republished.
+    """
+    # Read before the scan: every change up to this version is already in the table
+    change_version = int(catalog_counter().get("version", 0)) if state_table else None
+    items = scan_items()
+    _backfill_catalog_keys(items)
+    tracks = build_catalog(items)
+    with metrics.timer("serialize"):
+        bodies = {
+            profile: json.dumps(_shape(tracks, profile), default=_json_default, separators=(",", ":")).encode("utf-8")
+            for profile in RESPONSE_PROFILES
+        }
+    digest = hashlib.sha256(b"\n".join(bodies[p] for p in RESPONSE_PROFILES)).hexdigest()[:16]
+
+    previous = read_manifest()
+    if previous and previous.get("hash") == digest:
+        print(f"Catalog unchanged (v{previous['version']}, {digest})")
+        return previous
+
+    with metrics.timer("compress"):
+        variants = {profile: _encode_snapshot(body) for profile, body in bodies.items()}
+
+    paths = {profile: {} for profile in RESPONSE_PROFILES}
+    with metrics.timer("upload"):
+        for profile in RESPONSE_PROFILES:
+            name = "tracks" if profile == "full" else f"tracks.{profile}"
+            for encoding, suffix in SNAPSHOT_ENCODINGS:
+                if encoding not in variants[profile]:
+                    continue
+                key = f"{CATALOG_PREFIX}/{name}.{digest}{suffix}"
+                extra = {} if encoding == "identity" else {"ContentEncoding": encoding}
+                s3.put_object(
+                    Bucket=CATALOG_BUCKET, Key=key, Body=variants[profile][encoding],
+                    ContentType="application/json", CacheControl=SNAPSHOT_CACHE_CONTROL, **extra,
+                )
+                paths[profile][encoding] = key
+
+        manifest = {
+            "version": (previous or {}).get("version", 0) + 1,
+            "hash": digest,
+            "count": len(tracks),
+            "change_version": change_version,  # GET /tracks/changes baseline for this snapshot
+            "paths": paths["full"],
+            "bytes": {encoding: len(data) for encoding, data in variants["full"].items()},
+            "profiles": {
+                profile: {"paths": paths[profile], "bytes": {e: len(d) for e, d in variants[profile].items()}}
+                for profile in RESPONSE_PROFILES if profile != "full"
+            },
+            "published_at": int(time.time()),
+        }
+        s3.put_object(
+            Bucket=CATALOG_BUCKET, Key=CATALOG_MANIFEST_KEY, Body=json.dumps(manifest).encode("utf-8"),
+            ContentType="application/json", CacheControl=MANIFEST_CACHE_CONTROL,
+        )
+    print(f"Published catalog v{manifest['version']}: {len(tracks)} tracks, {manifest['bytes']}")
+    return manifest
+
+
+def _snapshot_location(manifest: dict, event, profile: str = "full") -> str:
+    accepted = accepted_encodings(event)
+    # Manifests from before a profile existed only have the full snapshot (a superset)
+    paths = manifest.get("profiles", {}).get(profile, {}).get("paths") or manifest["paths"]
+    encoding = next(e for e, _ in SNAPSHOT_ENCODINGS if e in paths and e in accepted)
+    url = _cf_url(paths[encoding])
+    # The client's /tracks/changes baseline, read off the final URL of the same load
+    # (ignored by S3; the object is still the content-hashed snapshot)
+    if manifest.get("change_version") is not None:
+        url += f"?cv={manifest['change_version']}"
+    return url
+
+
+@metrics.handler
 def lambda_handler(event, context):
+    return _compressed(_route(event), event)
+
+
+def _route(event) -> dict:
     # HTTP API v2 preflight support
     method = (
         event.get("requestContext", {}).get("http", {}).get("method")
@@ -66,48 +638,113 @@ def lambda_handler(event, context):
     if method == "OPTIONS":
         return {"statusCode": 204, "headers": _headers(), "body": ""}
 
+    path = event.get("rawPath") or event.get("path") or ""
+    if path.rstrip("/").endswith("/tracks/changes"):
+        return _changes_response(event)
+
     try:
-        # Scan with pagination (won't silently truncate at 1MB)
-        items = []
-        scan_kwargs = {}
-        while True:
-            resp = table.scan(**scan_kwargs)
-            items.extend(resp.get("Items", []))
-            lek = resp.get("LastEvaluatedKey")
-            if not lek:
-                break
-            scan_kwargs["ExclusiveStartKey"] = lek
+        profile = _profile(event)
+        page_request = _page_request(event)
+    except ValueError as e:
+        return {"statusCode": 400, "headers": _headers(), "body": json.dumps({"error": str(e)})}
+
+    if page_request:
+        # Revalidation of a page already served for this catalog version: no table reads
+        etag = catalog_etag()
+        matched = _not_modified(event, etag)
+        if matched:
+            return _not_modified_response(matched)
+        try:
+            page = query_page(*page_request)
+        except ValueError as e:  # bad cursor
+            return {"statusCode": 400, "headers": _headers(), "body": json.dumps({"error": str(e)})}
+        except Exception as e:
+            print("tracks_api query error:", repr(e))
+            metrics.count("query_errors")
+            return {
+                "statusCode": 500,
+                "headers": _headers(),
+                "body": json.dumps({"error": "Failed to query tracks index", "detail": str(e)}),
+            }
+        page["items"] = _shape(page["items"], profile)
+        with metrics.timer("serialize"):
+            body = json.dumps(page, default=_json_default)
+        metrics.count("tracks_returned", len(page["items"]))
+        return {"statusCode": 200, "headers": _headers(etag), "body": body}
 
+    # Compatibility mode (fetchCatalog): the whole sorted array.
+    # Published snapshot on the CDN: the table isn't touched
+    manifest = None
+    if CATALOG_BUCKET and AUDIO_CLOUDFRONT_DOMAIN:
+        try:
+            manifest = current_manifest()
+        except Exception as e:
+            print("tracks_api manifest error:", repr(e))
+            metrics.count("manifest_errors")
+    if manifest:
+        etag = _snapshot_etag(manifest)
+        matched = _not_modified(event, etag)
+        if matched:
+            return _not_modified_response(matched)
+        metrics.count("snapshot_redirects")
+        return {
+            "statusCode": 302,
+            "headers": {
+                **_headers(etag),
+                "Location": _snapshot_location(manifest, event, profile),
+                "X-Catalog-Version": str(manifest["version"]),
+            },
+            "body": "",
+        }
+
+    # Not published yet (or manifest unreadable): build it from the table. The counter is
+    # read before the scan, so the rows hold every change up to it: sent as the client's
+    # /tracks/changes baseline (X-Catalog-Change-Version)
+    try:
+        change_version = current_catalog_version()
+    except Exception as e:
+        print("tracks_api version error:", repr(e))
+        change_version = None
+    etag = _version_etag(change_version) if change_version is not None else None
+    matched = _not_modified(event, etag)
+    if matched:
+        return _not_modified_response(matched)
+    try:
+        items = scan_items()
     except Exception as e:
         print("tracks_api scan error:", repr(e))
+        metrics.count("scan_errors")
         return {
             "statusCode": 500,
             "headers": _headers(),
             "body": json.dumps({"error": "Failed to scan tracks table", "detail": str(e)}),
         }
 
-    tracks = [_to_track(i) for i in items]
-
-    # Filter out broken rows so UI doesn't choke
-    tracks = [t for t in tracks if t.get("track_id") and t.get("stream_url")]
-
-    # Optional: stable sort for UI
-    def sort_key(t):
-        artist = (t.get("artist") or "").lower()
-        album = (t.get("album") or "").lower()
-        tn = t.get("track_number")
-        try:
-            tn_val = int(tn) if tn is not None else 10**9
-        except Exception:
-            tn_val = 10**9
-        title = (t.get("title") or "").lower()
-        return (artist, album, tn_val, title)
+    tracks = build_catalog(items)
 
-    tracks.sort(key=sort_key)
+    with metrics.timer("serialize"):
+        # returns an array (as your frontend expects)
+        body = json.dumps(_shape(tracks, profile), default=_json_default)
+    metrics.count("tracks_returned", len(tracks))
+    metrics.count("response_bytes", len(body))
 
+    headers = _headers(etag)
+    if change_version is not None:
+        headers["X-Catalog-Change-Version"] = str(change_version)
+        headers["Access-Control-Expose-Headers"] = "X-Catalog-Change-Version"
     return {
         "statusCode": 200,
-        "headers": _headers(),
-        # returns an array (as your frontend expects)
-        "body": json.dumps(tracks, default=_json_default),
+        "headers": headers,
+        "body": body,
     }
+
+
+@metrics.handler
+def catalog_publish_handler(event, context):
+    """
+    Catalog publisher (same zip, separate function): DynamoDB stream batches from the tracks
+    table, or a manual invoke, republish the snapshot. Runs with reserved concurrency 1, so
+    manifest versions stay monotonic.
+    """
+    manifest = publish_catalog()
+    return {"version": manifest["version"], "hash": manifest["hash"], "count": manifest["count"]}
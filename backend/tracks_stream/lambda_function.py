@@ -2,12 +2,15 @@ import os
 import json
 import boto3
 
+import instrumentation
+
 dynamodb = boto3.resource("dynamodb")
 
 TRACKS_TABLE = os.environ["TRACKS_TABLE"]
 AUDIO_CLOUDFRONT_DOMAIN = os.environ["AUDIO_CLOUDFRONT_DOMAIN"]  # domain only, no https://
 
 table = dynamodb.Table(TRACKS_TABLE)
+metrics = instrumentation.Metrics("tracks_stream")
 
 def _headers():
     return {
@@ -18,6 +21,7 @@ def _headers():
         "Cache-Control": "no-store",
     }
 
+@metrics.handler
 def lambda_handler(event, context):
     if event.get("requestContext", {}).get("http", {}).get("method") == "OPTIONS" or event.get("httpMethod") == "OPTIONS":
         return {"statusCode": 204, "headers": _headers(), "body": ""}
@@ -27,7 +31,8 @@ def lambda_handler(event, context):
     if not track_id:
         return {"statusCode": 400, "headers": _headers(), "body": json.dumps({"error": "Missing track_id"})}
 
-    resp = table.get_item(Key={"track_id": track_id})
+    with metrics.timer("get_item"):
+        resp = table.get_item(Key={"track_id": track_id})
     item = resp.get("Item")
     if not item:
         return {"statusCode": 404, "headers": _headers(), "body": json.dumps({"error": "Track not found"})}
@@ -38,8 +43,14 @@ def lambda_handler(event, context):
 
     url = f"https://{AUDIO_CLOUDFRONT_DOMAIN}/{stream_path.lstrip('/')}"
 
+    body = {"track_id": track_id, "stream_url": url}
+
+    manifest_path = item.get("manifest_path")  # HLS master playlist, when ingested with INGEST_HLS
+    if manifest_path:
+        body["manifest_url"] = f"https://{AUDIO_CLOUDFRONT_DOMAIN}/{manifest_path.lstrip('/')}"
+
     return {
         "statusCode": 200,
         "headers": _headers(),
-        "body": json.dumps({"track_id": track_id, "stream_url": url}),
+        "body": json.dumps(body),
     }
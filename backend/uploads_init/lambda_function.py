@@ -8,11 +8,14 @@ import time
 import boto3
 from botocore.config import Config
 
+import instrumentation
+
 INGEST_BUCKET = os.environ["INGEST_BUCKET"]
 JWT_SECRET = os.environ.get("JWT_SECRET", "")
 
 # Force SigV4 and pin region (good)
 s3 = boto3.client("s3", config=Config(signature_version="s3v4", region_name="us-east-1"))
+metrics = instrumentation.Metrics("uploads_init")
 
 def _headers():
     return {
@@ -92,6 +95,7 @@ def _slug_key(s: str) -> str:
     s = re.sub(r"_+", "_", s).strip("_")
     return s or "unknown"
 
+@metrics.handler
 def lambda_handler(event, context):
     method = (
         event.get("requestContext", {}).get("http", {}).get("method")
@@ -104,8 +108,10 @@ def lambda_handler(event, context):
 
     # --- REAL ENFORCEMENT: only artist/admin can init uploads ---
     try:
-        _require_artist_or_admin(event)
+        with metrics.timer("auth"):
+            _require_artist_or_admin(event)
     except Exception as e:
+        metrics.count("forbidden")
         return {
             "statusCode": 403,
             "headers": _headers(),
@@ -147,28 +153,29 @@ def lambda_handler(event, context):
     meta_key = f"raw/{artist_key}/{album_key}/{ts}__meta.json"
 
     # Presign PUT URLs
-    audio_put_url = s3.generate_presigned_url(
-        ClientMethod="put_object",
-        Params={"Bucket": INGEST_BUCKET, "Key": audio_key},
-        ExpiresIn=900,
-        HttpMethod="PUT",
-    )
-
-    art_put_url = None
-    if art_key:
-        art_put_url = s3.generate_presigned_url(
+    with metrics.timer("presign"):
+        audio_put_url = s3.generate_presigned_url(
             ClientMethod="put_object",
-            Params={"Bucket": INGEST_BUCKET, "Key": art_key},
+            Params={"Bucket": INGEST_BUCKET, "Key": audio_key},
             ExpiresIn=900,
             HttpMethod="PUT",
         )
 
-    meta_put_url = s3.generate_presigned_url(
-        ClientMethod="put_object",
-        Params={"Bucket": INGEST_BUCKET, "Key": meta_key, "ContentType": "application/json"},
-        ExpiresIn=900,
-        HttpMethod="PUT",
-    )
+        art_put_url = None
+        if art_key:
+            art_put_url = s3.generate_presigned_url(
+                ClientMethod="put_object",
+                Params={"Bucket": INGEST_BUCKET, "Key": art_key},
+                ExpiresIn=900,
+                HttpMethod="PUT",
+            )
+
+        meta_put_url = s3.generate_presigned_url(
+            ClientMethod="put_object",
+            Params={"Bucket": INGEST_BUCKET, "Key": meta_key, "ContentType": "application/json"},
+            ExpiresIn=900,
+            HttpMethod="PUT",
+        )
 
     return {
         "statusCode": 200,
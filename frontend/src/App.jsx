@@ -3,7 +3,7 @@ import "./styles.css";
 import { ToastHost, toast } from "./ui/toast.jsx";
 import { Modal } from "./ui/modal.jsx";
 import { state } from "./state";
-import { fetchCatalog } from "./features/catalog.js";
+import { syncCatalog } from "./features/catalog.js";
 import { loadMe, signOut, mountGoogleButton } from "./features/auth.js";
 import { submitArtistApply } from "./features/artistApply.js";
 import { approveArtist, fetchPendingApplications, rejectArtist } from "./features/admin.js";
@@ -41,6 +41,7 @@ function pushRecent(prev, track) {
     artist: track?.artist || "",
     album: track?.album || "",
     art: track?.art || "",
+    artThumb: track?.artThumb || "",
     stream: track?.stream || "",
     ts: Date.now(),
   };
@@ -226,7 +227,7 @@ function TrackRow({ t, onPlay }) {
   return (
     <div className="trackRow" onClick={() => onPlay(t)} role="button" tabIndex={0}>
       <div className="cover">
-        {t.art ? <img src={t.art} alt="" /> : <div className="coverPlaceholder" aria-hidden="true" />}
+        {t.art ? <img src={t.artThumb || t.art} alt="" /> : <div className="coverPlaceholder" aria-hidden="true" />}
       </div>
       <div style={{ minWidth: 0 }}>
         <div className="title" style={{ whiteSpace: "nowrap", overflow: "hidden", textOverflow: "ellipsis" }}>{t.title}</div>
@@ -301,7 +302,7 @@ function PlayerBar({ track, audioRef, volume, setVolume, isPlaying, onPlayPause,
       {track ? (
         <div style={{ display: "flex", gap: 10, alignItems: "center", minWidth: 220 }}>
           <div className="cover" style={{ width: 38, height: 38, borderRadius: 10, overflow: "hidden" }}>
-            {track?.art ? <img src={track.art} alt="" onError={(e) => { e.currentTarget.remove(); }} /> : null}
+            {track?.art ? <img src={track.artThumb || track.art} alt="" onError={(e) => { e.currentTarget.remove(); }} /> : null}
           </div>
           <div style={{ minWidth: 0 }}>
             <div className="title" style={{ fontSize: 14, whiteSpace: "nowrap", overflow: "hidden", textOverflow: "ellipsis" }}>
@@ -585,7 +586,7 @@ export default function App() {
     (async () => {
       try {
         setLoading(true);
-        const c = await fetchCatalog();
+        const c = await syncCatalog();
         setTracks(c.map((t, i) => ({ ...t, __catalogIndex: i })));
       } catch (e) {
         console.error(e);
@@ -911,7 +912,7 @@ export default function App() {
       setUploadArt(null);
       setUploadProg(null);
 
-      const c = await fetchCatalog();
+      const c = await syncCatalog();
       setTracks(c.map((t, i) => ({ ...t, __catalogIndex: i })));
       toast("Upload complete");
     } catch (e) {
@@ -957,7 +958,7 @@ export default function App() {
                     title={`${t.title} — ${t.artist}`}
                   >
                     <div className="libraryArt">
-                      {t.art ? <img src={t.art} alt="" /> : <div className="coverPlaceholder" aria-hidden="true" />}
+                      {t.art ? <img src={t.artThumb || t.art} alt="" /> : <div className="coverPlaceholder" aria-hidden="true" />}
                     </div>
                     <div className="libraryMeta">
                       <div className="libraryName">{t.title}</div>
@@ -1214,7 +1215,7 @@ export default function App() {
 
           <div className="nowPlayingBody">
             {current?.art ? (
-              <div className="nowPlayingArt"><img src={current.art} alt="" /></div>
+              <div className="nowPlayingArt"><img src={current.artFull || current.art} alt="" /></div>
             ) : (
               <div className="nowPlayingArtPlaceholder" aria-hidden="true" />
             )}
@@ -1,13 +1,22 @@
-import { apiJson } from "../api";
+import { apiFetch, apiJson } from "../api";
+
+// Cover ladder (art_urls: { webp|jpg: { "64"|"256"|"640"|"original": url } }), WebP first
+function artSize(t, size){
+  const urls = t.art_urls || {};
+  return urls.webp?.[size] || urls.jpg?.[size] || "";
+}
 
 export function normalizeTrack(t){
   const id = t.track_id || t.id || t.pk || t.sk || t.key || "";
   const title = t.title || t.name || t.track_title || "Untitled";
   const artist = t.artist || t.artist_name || t.artistName || "Unknown Artist";
   const album = t.album || t.album_name || t.albumName || "";
-  const art = t.art_url || t.artUrl || t.image || t.cover || "";
+  const artFull = t.art_url || t.artUrl || t.image || t.cover || "";
+  // art: tile size; artThumb: list rows / player bar; artFull: now playing
+  const art = artSize(t, "256") || artFull;
+  const artThumb = artSize(t, "64") || art;
   const stream = t.stream_url || t.streamUrl || (id ? `/tracks/${encodeURIComponent(id)}/stream` : "");
-  return { raw: t, id, title, artist, album, art, stream };
+  return { raw: t, id, title, artist, album, art, artThumb, artFull, stream };
 }
 
 export async function fetchCatalog(){
@@ -15,3 +24,91 @@ export async function fetchCatalog(){
   const items = Array.isArray(data) ? data : (data.items || data.tracks || []);
   return items.map(normalizeTrack);
 }
+
+const CATALOG_CACHE_KEY = "catalog_cache";
+
+// Same order as the API's /tracks (artist, album, track number, title)
+function compareTracks(a, b){
+  const key = (t) => {
+    const tn = Number.parseInt(t.track_number, 10);
+    return [(t.artist || "").toLowerCase(), (t.album || "").toLowerCase(), Number.isFinite(tn) ? tn : 1e9, (t.title || "").toLowerCase()];
+  };
+  const ka = key(a), kb = key(b);
+  for (let i = 0; i < ka.length; i++){
+    if (ka[i] < kb[i]) return -1;
+    if (ka[i] > kb[i]) return 1;
+  }
+  return 0;
+}
+
+function readCatalogCache(){
+  try {
+    const c = JSON.parse(localStorage.getItem(CATALOG_CACHE_KEY) || "null");
+    return c && Number.isInteger(c.version) && Array.isArray(c.items) ? c : null;
+  } catch {
+    return null;
+  }
+}
+
+function writeCatalogCache(cache){
+  try {
+    localStorage.setItem(CATALOG_CACHE_KEY, JSON.stringify(cache));
+  } catch {
+    localStorage.removeItem(CATALOG_CACHE_KEY); // over quota: full load next time
+  }
+}
+
+// Applies /tracks/changes pages after cache.version; throws when the server says resync (410)
+async function applyChanges(cache){
+  const byId = new Map(cache.items.map((t) => [t.track_id, t]));
+  let version = cache.version;
+  for (;;){
+    const delta = await apiJson(`/tracks/changes?since=${version}&profile=compact`);
+    for (const c of delta.changes || []){
+      if (c.op === "delete") byId.delete(c.track_id);
+      else byId.set(c.track.track_id, c.track);
+    }
+    if (!delta.has_more || delta.version === version) {
+      version = delta.version;
+      break;
+    }
+    version = delta.version;
+  }
+  return { version, items: [...byId.values()].sort(compareTracks) };
+}
+
+/**
+ * Catalog with delta sync: a returning visitor applies GET /tracks/changes to the copy
+ * cached in localStorage (one small request); first visits, expired change logs and
+ * errors fall back to the full /tracks load. Same result shape as fetchCatalog.
+ */
+// Change-log version the catalog we just loaded is complete up to, taken from that same
+// response so the delta baseline can't run ahead of it: the snapshot redirect's ?cv= or the
+// scan fallback's X-Catalog-Change-Version. null = don't cache (next load is a full one)
+function servedVersion(res){
+  const raw = new URL(res.url).searchParams.get("cv") ?? res.headers.get("X-Catalog-Change-Version");
+  const version = raw ? Number(raw) : NaN;
+  return Number.isInteger(version) ? version : null;
+}
+
+export async function syncCatalog(){
+  const cached = readCatalogCache();
+  if (cached){
+    try {
+      const cache = await applyChanges(cached);
+      writeCatalogCache(cache);
+      return cache.items.map(normalizeTrack);
+    } catch (e){
+      console.warn("Catalog delta sync failed; reloading", e);
+    }
+  }
+
+  // Compact profile: no id alias / raw paths / nulls (normalizeTrack doesn't need them)
+  const res = await apiFetch("/tracks?profile=compact");
+  const data = await res.json().catch(() => ({}));
+  if (!res.ok) throw new Error(data?.error || `Request failed (${res.status})`);
+  const items = Array.isArray(data) ? data : (data.items || data.tracks || []);
+  const version = servedVersion(res);
+  if (version !== null) writeCatalogCache({ version, items });
+  return items.map(normalizeTrack);
+}
@@ -48,6 +48,8 @@ export async function uploadAlbum({ artist, album, year, artFile, tracks, onProg
       album,
       track_number: trackNo,
       release_year: year || null,
+      // lets ingest skip looking for the art next to the upload
+      art_key: (artFile && init.art_put_url) ? init.art_key : null,
       // keep whatever else backend expects later
     };
     await putPresigned(init.meta_put_url, new Blob([JSON.stringify(meta)], { type:"application/json" }), "application/json");
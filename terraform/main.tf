@@ -83,6 +83,28 @@ resource "aws_s3_bucket_public_access_block" "audio" {
   restrict_public_buckets = true
 }
 
+# Scratch objects from chunked long-form ingest are deleted by the Lambda; this is the safety net
+resource "aws_s3_bucket_lifecycle_configuration" "audio_work" {
+  bucket = aws_s3_bucket.audio.id
+
+  rule {
+    id     = "expire-ingest-scratch"
+    status = "Enabled"
+
+    filter {
+      prefix = "_work/"
+    }
+
+    expiration {
+      days = 1
+    }
+
+    abort_incomplete_multipart_upload {
+      days_after_initiation = 1
+    }
+  }
+}
+
 # -----------------------------
 # CloudFront OAC
 # -----------------------------
@@ -279,10 +301,63 @@ resource "aws_dynamodb_table" "tracks" {
   billing_mode = "PAY_PER_REQUEST"
   hash_key     = "track_id"
 
+  # Any change republishes the catalog snapshot (catalog_publish)
+  stream_enabled   = true
+  stream_view_type = "KEYS_ONLY"
+
   attribute {
     name = "track_id"
     type = "S"
   }
+
+  attribute {
+    name = "catalog_pk"
+    type = "S"
+  }
+
+  attribute {
+    name = "catalog_sk"
+    type = "S"
+  }
+
+  # Sparse, pre-sorted catalog (see backend/shared/catalog_index.py): paged GET /tracks
+  global_secondary_index {
+    name            = "catalog-order"
+    hash_key        = "catalog_pk"
+    range_key       = "catalog_sk"
+    projection_type = "ALL"
+  }
+}
+
+# -----------------------------
+# DynamoDB table for ingest bookkeeping (single-table, pk/sk)
+#   UPLOAD#raw/<artist>/<album>/<ts> | PENDING  -> audio/meta join
+#   HASH#<sha256>                    | RENDITION -> content dedup index
+#   RAW#<raw_key>                    | CHECKPOINT -> per-stage ingest progress + durations
+#   ALBUM#albums/<artist>/<album>    | COVER     -> claim-once album cover + its paths
+#   CATALOG                          | VERSION   -> catalog change-log counter
+#   CHANGES                          | <version> -> change-log entry (GET /tracks/changes)
+# -----------------------------
+resource "aws_dynamodb_table" "ingest_state" {
+  name         = "${local.project_name}-ingest-state"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "pk"
+  range_key    = "sk"
+
+  attribute {
+    name = "pk"
+    type = "S"
+  }
+
+  attribute {
+    name = "sk"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
 }
 
 # -----------------------------
@@ -352,9 +427,11 @@ resource "aws_iam_role_policy" "lambda_policy" {
       },
       {
         Effect = "Allow"
-        Action = ["dynamodb:Scan", "dynamodb:Query", "dynamodb:GetItem", "dynamodb:PutItem", "dynamodb:UpdateItem"]
+        Action = ["dynamodb:Scan", "dynamodb:Query", "dynamodb:GetItem", "dynamodb:BatchGetItem", "dynamodb:PutItem", "dynamodb:UpdateItem", "dynamodb:DeleteItem"]
         Resource = [
           aws_dynamodb_table.tracks.arn,
+          "${aws_dynamodb_table.tracks.arn}/index/*",
+          aws_dynamodb_table.ingest_state.arn,
           aws_dynamodb_table.users.arn,
           "${aws_dynamodb_table.users.arn}/index/*"
         ]
@@ -366,7 +443,7 @@ resource "aws_iam_role_policy" "lambda_policy" {
       },
       {
         Effect   = "Allow"
-        Action   = ["s3:PutObject", "s3:CopyObject", "s3:ListBucket", "s3:GetObject"]
+        Action   = ["s3:PutObject", "s3:CopyObject", "s3:ListBucket", "s3:GetObject", "s3:AbortMultipartUpload", "s3:DeleteObject"]
         Resource = [aws_s3_bucket.audio.arn, "${aws_s3_bucket.audio.arn}/*"]
       },
       # Allow uploads_init to PUT into raw bucket under raw/*
@@ -407,10 +484,66 @@ resource "aws_lambda_function" "tracks_api" {
     variables = {
       TRACKS_TABLE            = aws_dynamodb_table.tracks.name
       AUDIO_CLOUDFRONT_DOMAIN = aws_cloudfront_distribution.audio.domain_name
+      CATALOG_BUCKET          = aws_s3_bucket.audio.bucket
+      STATE_TABLE             = aws_dynamodb_table.ingest_state.name
     }
   }
 }
 
+# -----------------------------
+# Lambda: catalog snapshot publisher (tracks_api zip, catalog_publish_handler)
+#   tracks table stream --> publish catalog/tracks.<hash>.json[.gz|.br] + catalog/manifest.json
+# -----------------------------
+resource "aws_lambda_function" "catalog_publish" {
+  function_name = "${local.project_name}-catalog-publish"
+  role          = aws_iam_role.lambda_exec.arn
+  handler       = "lambda_function.catalog_publish_handler"
+  runtime       = "python3.11"
+
+  filename         = "${path.module}/../backend/tracks_api/tracks_api.zip"
+  source_code_hash = filebase64sha256("${path.module}/../backend/tracks_api/tracks_api.zip")
+
+  timeout     = 120
+  memory_size = 512
+
+  # One publisher at a time keeps manifest versions monotonic
+  reserved_concurrent_executions = 1
+
+  environment {
+    variables = {
+      TRACKS_TABLE            = aws_dynamodb_table.tracks.name
+      AUDIO_CLOUDFRONT_DOMAIN = aws_cloudfront_distribution.audio.domain_name
+      CATALOG_BUCKET          = aws_s3_bucket.audio.bucket
+      STATE_TABLE             = aws_dynamodb_table.ingest_state.name
+      METRICS_FUNCTION        = "catalog_publish"
+    }
+  }
+}
+
+resource "aws_iam_role_policy" "catalog_publish_stream" {
+  role = aws_iam_role.lambda_exec.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [{
+      Effect   = "Allow"
+      Action   = ["dynamodb:DescribeStream", "dynamodb:GetRecords", "dynamodb:GetShardIterator", "dynamodb:ListStreams"]
+      Resource = ["${aws_dynamodb_table.tracks.arn}/stream/*"]
+    }]
+  })
+}
+
+# Batching window coalesces an album upload into one publish
+resource "aws_lambda_event_source_mapping" "catalog_publish" {
+  event_source_arn                   = aws_dynamodb_table.tracks.stream_arn
+  function_name                      = aws_lambda_function.catalog_publish.arn
+  starting_position                  = "LATEST"
+  batch_size                         = 1000
+  maximum_batching_window_in_seconds = 30
+
+  depends_on = [aws_iam_role_policy.catalog_publish_stream]
+}
+
 # -----------------------------
 # Lambda: GET /tracks/{track_id}/stream
 # -----------------------------
@@ -478,34 +611,156 @@ resource "aws_lambda_function" "ingest" {
   filename         = "${path.module}/../backend/ingest/ingest.zip"
   source_code_hash = filebase64sha256("${path.module}/../backend/ingest/ingest.zip")
   layers           = [aws_lambda_layer_version.ffmpeg.arn]
-  timeout          = 120
+  timeout          = 300 # one decode -> every rendition + HLS ladder, INGEST_MAX_WORKERS records at once
   memory_size      = 1024
 
+  # /tmp holds each record's M4A, preview, PCM tap and HLS ladder until upload: ~260MB for a
+  # 47-minute source (bench wav_500mb), x INGEST_MAX_WORKERS = 4, with ~2x headroom
+  ephemeral_storage {
+    size = 2048
+  }
+
   environment {
     variables = {
-      TRACKS_TABLE = aws_dynamodb_table.tracks.name
-      AUDIO_BUCKET = aws_s3_bucket.audio.bucket
+      TRACKS_TABLE       = aws_dynamodb_table.tracks.name
+      AUDIO_BUCKET       = aws_s3_bucket.audio.bucket
+      STATE_TABLE        = aws_dynamodb_table.ingest_state.name
+      INGEST_QUEUE_URL   = aws_sqs_queue.ingest_work.url
+      INGEST_STREAMING   = "true"
+      INGEST_MAX_WORKERS = "4"
+      INGEST_HLS         = "true"
+
+      # Long-form (>= 20 min) sources transcode as parallel chunks via self-invocation
+      INGEST_CHUNKED_MIN_SECONDS = "1200"
+      INGEST_CHUNK_FANOUT        = "true"
+      INGEST_CHUNK_WORKERS       = "16"
     }
   }
 }
 
-resource "aws_lambda_permission" "s3_invoke_ingest" {
-  statement_id  = "AllowS3InvokeIngest"
-  action        = "lambda:InvokeFunction"
-  function_name = aws_lambda_function.ingest.function_name
-  principal     = "s3.amazonaws.com"
-  source_arn    = data.aws_s3_bucket.raw.arn
+# Chunked long-form ingest fans chunks out to synchronous self-invocations
+resource "aws_iam_role_policy" "ingest_chunk_fanout" {
+  role = aws_iam_role.lambda_exec.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [{
+      Effect   = "Allow"
+      Action   = ["lambda:InvokeFunction"]
+      Resource = [aws_lambda_function.ingest.arn]
+    }]
+  })
+}
+
+# -----------------------------
+# SQS: buffered ingest
+#   raw bucket --(audio + meta.json keys only)--> ingest_intake --> ingest (router)
+#   --> ingest_work (fair queue: MessageGroupId = artist folder) --> ingest (worker)
+# Art keys are never delivered; the join lists the upload's folder for them.
+# -----------------------------
+locals {
+  # S3 suffix filters are case-sensitive
+  ingest_audio_exts = [".mp3", ".flac", ".wav", ".mp4", ".m4a", ".aac", ".ogg"]
+  ingest_suffixes   = concat(local.ingest_audio_exts, [for ext in local.ingest_audio_exts : upper(ext)], ["__meta.json"])
+}
+
+resource "aws_sqs_queue" "ingest_dlq" {
+  name                      = "${local.project_name}-ingest-dlq"
+  message_retention_seconds = 1209600
+}
+
+resource "aws_sqs_queue" "ingest_intake" {
+  name                       = "${local.project_name}-ingest-intake"
+  visibility_timeout_seconds = 1800 # >= 6x the ingest timeout (AWS guidance for Lambda sources)
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.ingest_dlq.arn
+    maxReceiveCount     = 5
+  })
+}
+
+resource "aws_sqs_queue" "ingest_work" {
+  name                       = "${local.project_name}-ingest-work"
+  visibility_timeout_seconds = 1800
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.ingest_dlq.arn
+    maxReceiveCount     = 5
+  })
+}
+
+resource "aws_sqs_queue_policy" "ingest_intake" {
+  queue_url = aws_sqs_queue.ingest_intake.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [{
+      Effect    = "Allow"
+      Principal = { Service = "s3.amazonaws.com" }
+      Action    = "sqs:SendMessage"
+      Resource  = aws_sqs_queue.ingest_intake.arn
+      Condition = {
+        ArnEquals = { "aws:SourceArn" = data.aws_s3_bucket.raw.arn }
+      }
+    }]
+  })
+}
+
+resource "aws_iam_role_policy" "ingest_queues" {
+  role = aws_iam_role.lambda_exec.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = ["sqs:ReceiveMessage", "sqs:DeleteMessage", "sqs:GetQueueAttributes"]
+        Resource = [aws_sqs_queue.ingest_intake.arn, aws_sqs_queue.ingest_work.arn]
+      },
+      {
+        Effect   = "Allow"
+        Action   = ["sqs:SendMessage"]
+        Resource = [aws_sqs_queue.ingest_work.arn]
+      }
+    ]
+  })
 }
 
 resource "aws_s3_bucket_notification" "raw_bucket_notification" {
   bucket = data.aws_s3_bucket.raw.id
 
-  lambda_function {
-    lambda_function_arn = aws_lambda_function.ingest.arn
-    events              = ["s3:ObjectCreated:*"]
+  dynamic "queue" {
+    for_each = local.ingest_suffixes
+    content {
+      queue_arn     = aws_sqs_queue.ingest_intake.arn
+      events        = ["s3:ObjectCreated:*", "s3:ObjectRemoved:*"] # removed audio -> track deleted
+      filter_suffix = queue.value
+    }
   }
 
-  depends_on = [aws_lambda_permission.s3_invoke_ingest]
+  depends_on = [aws_sqs_queue_policy.ingest_intake]
+}
+
+# Router: big batches, cheap (re-sends each S3 record with its artist group)
+resource "aws_lambda_event_source_mapping" "ingest_intake" {
+  event_source_arn                   = aws_sqs_queue.ingest_intake.arn
+  function_name                      = aws_lambda_function.ingest.arn
+  batch_size                         = 100
+  maximum_batching_window_in_seconds = 5
+  function_response_types            = ["ReportBatchItemFailures"]
+}
+
+# Worker: small batches (INGEST_MAX_WORKERS run concurrently), bounded fleet size
+resource "aws_lambda_event_source_mapping" "ingest_work" {
+  event_source_arn                   = aws_sqs_queue.ingest_work.arn
+  function_name                      = aws_lambda_function.ingest.arn
+  batch_size                         = 4
+  maximum_batching_window_in_seconds = 10
+  function_response_types            = ["ReportBatchItemFailures"]
+
+  scaling_config {
+    maximum_concurrency = 10
+  }
 }
 
 # -----------------------------
@@ -569,6 +824,12 @@ resource "aws_apigatewayv2_route" "tracks_route" {
   target    = "integrations/${aws_apigatewayv2_integration.tracks_integration.id}"
 }
 
+resource "aws_apigatewayv2_route" "tracks_changes_route" {
+  api_id    = aws_apigatewayv2_api.api.id
+  route_key = "GET /tracks/changes"
+  target    = "integrations/${aws_apigatewayv2_integration.tracks_integration.id}"
+}
+
 resource "aws_lambda_permission" "api_invoke_tracks" {
   statement_id  = "AllowAPIGatewayInvokeTracks"
   action        = "lambda:InvokeFunction"